@@ -0,0 +1,233 @@
+"""Backtester benchmark suite.
+
+Generates synthetic OHLCV series, times load_data, run_backtest, save_results and
+optimize_strategy, and writes throughput and peak memory to a JSON file:
+
+    python -m benchmarks.bench_backtester --sizes 1000 100000 1000000 --output bench.json
+    python -m benchmarks.bench_backtester --compare bench_old.json bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from backtesting import Strategy
+from backtesting.lib import crossover
+
+sys.path.append('/app')
+
+from src import backtest_engine
+from src.backtest_engine import load_data, load_strategy, run_backtest, save_results
+from src.strategy_optimizer import optimize_strategy
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+OPTIMIZER_GRID = {'n1': [5, 10, 15], 'n2': [20, 40]}
+
+
+def generate_ohlcv(n_bars, freq='1min', seed=0, start='2000-01-01', price=100.0, volatility=0.0005):
+    """Geometric Brownian motion close prices with consistent OHLC and integer volume."""
+    rng = np.random.default_rng(seed)
+    log_returns = rng.normal(0, volatility, n_bars)
+    close = price * np.exp(np.cumsum(log_returns))
+    open_ = np.r_[price, close[:-1]]
+    spread = np.abs(rng.normal(0, volatility, (2, n_bars)))
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * (1 + spread[0]),
+        'Low': np.minimum(open_, close) * (1 - spread[1]),
+        'Close': close,
+        'Volume': rng.integers(100, 10_000, n_bars),
+    }, index=pd.date_range(start, periods=n_bars, freq=freq, name='Date'))
+
+
+def SMA(values, n):
+    return pd.Series(values).rolling(n).mean().values
+
+
+class SmaCross(Strategy):
+    n1 = 10
+    n2 = 40
+
+    def init(self):
+        self.ma1 = self.I(SMA, self.data.Close, self.n1)
+        self.ma2 = self.I(SMA, self.data.Close, self.n2)
+
+    def next(self):
+        if crossover(self.ma1, self.ma2):
+            self.buy()
+        elif crossover(self.ma2, self.ma1):
+            self.position.close()
+
+    @classmethod
+    def generate_signals(cls, data):
+        ma1 = data['Close'].rolling(cls.n1).mean()
+        ma2 = data['Close'].rolling(cls.n2).mean()
+        above = ma1 > ma2
+        return above & ~above.shift(1, fill_value=False), ~above & above.shift(1, fill_value=False)
+
+
+def write_dataset(df, data_dir, asset):
+    """Write `df` in the datahub file layout and return the asset name to pass to load_data."""
+    start, end = df.index[0].strftime('%Y%m%d'), df.index[-1].strftime('%Y%m%d')
+    file_name = f"CRYPTO_{asset}_1MIN_OHLCV_{start}_{end}.parquet"
+    out = df.reset_index()
+    out.columns = [col.lower() for col in out.columns]
+    out.to_parquet(os.path.join(data_dir, file_name), index=False, row_group_size=20000)
+    return asset
+
+
+def measure(fn, track_memory):
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    peak = None
+    if track_memory:
+        # 单独再跑一遍统计内存，避免 tracemalloc 的开销影响计时
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def _record(benchmark, strategy, engine, bars, seconds, peak, backtests=None):
+    record = {
+        'benchmark': benchmark,
+        'strategy': strategy,
+        'engine': engine,
+        'bars': bars,
+        'seconds': seconds,
+        'bars_per_sec': bars * (backtests or 1) / seconds if seconds else None,
+        'backtests_per_sec': backtests / seconds if backtests and seconds else None,
+        'peak_memory_mb': peak / 1024 ** 2 if peak is not None else None,
+    }
+    print(f"{benchmark:<18} {strategy:<20} {engine or '-':<12} {bars:>10} bars  {seconds:9.3f}s"
+          + (f"  {record['peak_memory_mb']:9.1f} MB" if peak is not None else ''))
+    return record
+
+
+def run_suite(sizes, strategies, work_dir, event_max_bars=100_000, optimizer_max_bars=1_000_000,
+              track_memory=True):
+    records = []
+    results_dir = os.path.join(work_dir, 'results')
+    data_dir = backtest_engine.DATA_DIR
+    backtest_engine.DATA_DIR = work_dir
+    try:
+        for n_bars in sizes:
+            data = generate_ohlcv(n_bars)
+            asset = write_dataset(data, work_dir, f"SYNTH{n_bars}")
+            start, end = data.index[0], data.index[-1]
+            del data
+
+            data, seconds, peak = measure(lambda: load_data(asset, '1min', start, end), track_memory)
+            records.append(_record('load_data', '-', None, n_bars, seconds, peak))
+
+            for name, strategy_class in strategies.items():
+                engines = ['vectorized'] if hasattr(strategy_class, 'generate_signals') else []
+                if n_bars <= event_max_bars:
+                    engines.insert(0, 'backtesting')
+                for engine in engines:
+                    (bt, results), seconds, peak = measure(
+                        lambda: run_backtest(strategy_class, data, 100_000, 0.001, engine=engine), track_memory)
+                    records.append(_record('run_backtest', name, engine, n_bars, seconds, peak, backtests=1))
+
+                    _, seconds, peak = measure(lambda: save_results(results, bt, results_dir), track_memory)
+                    records.append(_record('save_results', name, engine, n_bars, seconds, peak))
+
+                    if n_bars <= optimizer_max_bars and (engine == 'vectorized' or n_bars <= event_max_bars // 10):
+                        n_runs = int(np.prod([len(v) for v in OPTIMIZER_GRID.values()]))
+                        _, seconds, peak = measure(
+                            lambda: optimize_strategy(data, strategy_class, OPTIMIZER_GRID, 100_000, 0.001, {},
+                                                      engine=engine), track_memory)
+                        records.append(_record('optimize_strategy', name, engine, n_bars, seconds, peak,
+                                               backtests=n_runs))
+            del data
+    finally:
+        backtest_engine.DATA_DIR = data_dir
+    return records
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path, threshold=0.1):
+    """Print per-benchmark time ratios; return the number of regressions above `threshold`."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    def key(r):
+        return r['benchmark'], r['strategy'], r['engine'], r['bars']
+
+    old_records = {key(r): r for r in old['results']}
+    regressions = 0
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    for record in new['results']:
+        base = old_records.get(key(record))
+        if base is None or not base['seconds']:
+            continue
+        ratio = record['seconds'] / base['seconds']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{record['benchmark']:<18} {record['strategy']:<20} {record['engine'] or '-':<12} "
+              f"{record['bars']:>10} bars  {base['seconds']:9.3f}s -> {record['seconds']:9.3f}s  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtester benchmark suite")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="number of bars per dataset")
+    parser.add_argument('--strategy-file', action='append', default=[],
+                        help="also benchmark a strategy file (e.g. /app/strategies/example_strategy_1.py)")
+    parser.add_argument('--event-max-bars', type=int, default=100_000,
+                        help="largest dataset run through the backtesting.py event loop")
+    parser.add_argument('--optimizer-max-bars', type=int, default=1_000_000)
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc peak memory pass")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two result files and exit")
+    parser.add_argument('--threshold', type=float, default=0.1, help="relative slowdown reported as regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+
+    strategies = {'SmaCross': SmaCross}
+    for strategy_file in args.strategy_file:
+        strategies[os.path.basename(strategy_file)] = load_strategy(strategy_file)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        records = run_suite(sorted(args.sizes), strategies, work_dir, args.event_max_bars,
+                            args.optimizer_max_bars, track_memory=not args.no_memory)
+
+    report = {
+        'commit': _git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'packages': {name: __import__(name).__version__ for name in ('numpy', 'pandas', 'backtesting')},
+        'results': records,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
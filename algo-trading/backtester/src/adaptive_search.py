@@ -0,0 +1,96 @@
+import math
+import time
+from itertools import product
+import numpy as np
+import pandas as pd
+
+from src.strategy_optimizer import evaluate_param_sets
+
+# 自适应参数搜索（successive halving）：
+# 先在一小段数据上评估全部候选参数，只保留表现最好的 1/eta 进入下一轮，
+# 每轮数据窗口扩大 eta 倍，最后一轮使用完整数据并应用 filter_conditions。
+# 与穷举网格相比，只有少数参数会跑完整数据，run_backtest 调用次数大幅减少。
+
+
+def _rung_fractions(n_candidates, eta, min_fraction):
+    n_rungs = max(1, int(math.log(max(n_candidates, 1), eta)) + 1)
+    fractions = [max(min_fraction, eta ** -(n_rungs - 1 - i)) for i in range(n_rungs)]
+    # 去掉被 min_fraction 截断后重复的窗口
+    return sorted(set(fractions))
+
+
+def _rank(rows, metric):
+    scores = np.array([row[metric] for row in rows], dtype=float)
+    scores = np.where(np.isnan(scores), -np.inf, scores)
+    return np.argsort(-scores, kind='stable')
+
+
+def successive_halving(data, strategy_class, param_grid, initial_capital, commission, filter_conditions,
+                       metric='total_return', eta=3, min_fraction=0.1, min_bars=100,
+                       max_evals=None, max_seconds=None, seed=0, n_jobs=1, engine='backtesting',
+                       cache=None):
+    """Search `param_grid` by successive halving over growing data windows.
+
+    Returns a DataFrame with the same columns as `optimize_strategy`, containing the
+    candidates that reached the full data range and passed `filter_conditions`.
+    The budget is limited by `max_evals` backtests and/or `max_seconds` wall-clock; when it runs
+    out, the current leaders are promoted to the full data only as far as the remaining budget
+    allows (the time of a full-data backtest is estimated from the last rung).
+    """
+    candidates = [dict(zip(param_grid.keys(), params)) for params in product(*param_grid.values())]
+    if not candidates:
+        return pd.DataFrame()
+
+    rng = np.random.default_rng(seed)
+    if max_evals is not None:
+        # 总成本约为 n * (1 + 1/eta + 1/eta^2 + ...) < n * eta / (eta - 1)
+        affordable = max(1, int(max_evals * (eta - 1) / eta))
+        if len(candidates) > affordable:
+            keep = np.sort(rng.choice(len(candidates), affordable, replace=False))
+            candidates = [candidates[i] for i in keep]
+
+    fractions = _rung_fractions(len(candidates), eta, min_fraction)
+    start_time = time.time()
+    evals = 0
+    survivors = candidates
+    # 上一轮每个候选每根 K 线的平均耗时，用来估计下一轮和完整数据回测的耗时
+    seconds_per_bar = None
+
+    def time_left():
+        return max_seconds - (time.time() - start_time) if max_seconds is not None else math.inf
+
+    for fraction in fractions:
+        n_bars = max(min_bars, int(len(data) * fraction))
+        remaining = max_evals - evals if max_evals is not None else math.inf
+        rung_seconds = seconds_per_bar * n_bars * len(survivors) if seconds_per_bar is not None else 0
+        out_of_time = time_left() <= 0 or rung_seconds > time_left()
+        if n_bars >= len(data) or out_of_time or remaining < len(survivors) * (1 + 1 / eta):
+            break
+
+        rung_start = time.time()
+        rows = evaluate_param_sets(data.iloc[:n_bars], strategy_class, survivors, initial_capital, commission, {},
+                                   n_jobs=n_jobs, engine=engine, cache=cache)
+        seconds_per_bar = (time.time() - rung_start) / (len(survivors) * n_bars)
+        evals += len(survivors)
+        order = _rank(rows, metric)
+        survivors = [survivors[i] for i in order[:max(1, math.ceil(len(survivors) / eta))]]
+        print(f"Halving rung: {n_bars} bars, kept {len(survivors)} of {len(rows)} candidates")
+
+    # 预算用完时不再提升：次数按剩余的回测数截断，时间按上一轮估计的完整数据单次耗时截断
+    limit = len(survivors)
+    if max_evals is not None:
+        limit = min(limit, max(0, max_evals - evals))
+    if max_seconds is not None:
+        full_seconds = seconds_per_bar * len(data) if seconds_per_bar is not None else 0
+        if time_left() <= 0:
+            limit = 0
+        elif full_seconds > 0:
+            limit = min(limit, int(time_left() // full_seconds))
+    survivors = survivors[:limit]
+
+    results = evaluate_param_sets(data, strategy_class, survivors, initial_capital, commission, filter_conditions,
+                                  n_jobs=n_jobs, engine=engine, cache=cache) if survivors else []
+    evals += len(survivors)
+    grid_size = math.prod(len(values) for values in param_grid.values())
+    print(f"Successive halving finished with {evals} backtests ({grid_size} grid combinations)")
+    return pd.DataFrame(results)
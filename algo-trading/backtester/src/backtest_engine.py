@@ -1,5 +1,7 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 from backtesting import Backtest, Strategy
 import importlib.util
 import os
@@ -7,9 +9,12 @@ import glob
 from datetime import datetime
 import re
 import json
-from bokeh.io import output_file, save
-from bokeh.resources import CDN
-from bokeh.embed import file_html
+from src.vector_engine import run_vectorized_backtest
+from src.profiler import BacktestProfiler, format_profile
+from src.result_cache import ResultCache
+from src.report_data import save_report_data
+from src.data_catalog import find_data_file, dataset_files
+from src.bar_store import read_bars
 
 def load_strategy(strategy_file):
     strategy_name = os.path.splitext(os.path.basename(strategy_file))[0]
@@ -22,8 +27,10 @@ def load_strategy(strategy_file):
         if not isinstance(strategy_class, type):
             strategy_class = type(strategy_class)
     else:
+        # 只取本文件定义的策略类，跳过 import 进来的 Strategy 基类
         strategy_classes = [obj for name, obj in module.__dict__.items()
-                            if isinstance(obj, type) and issubclass(obj, Strategy)]
+                            if isinstance(obj, type) and issubclass(obj, Strategy) and obj is not Strategy
+                            and obj.__module__ == module.__name__]
         if not strategy_classes:
             raise ValueError(f"No valid Strategy subclass found in {strategy_file}")
         strategy_class = strategy_classes[0]
@@ -31,30 +38,109 @@ def load_strategy(strategy_file):
     if not issubclass(strategy_class, Strategy):
         raise TypeError(f"{strategy_class.__name__} is not a subclass of Strategy")
     
+    # 记录源文件，供多进程优化时在子进程中重新加载
+    strategy_class._source_file = os.path.abspath(strategy_file)
     return strategy_class
 
-def load_data(asset, interval, start_date, end_date):
-    data_dir = "/app/data" 
-    print(f"Searching for data files in: {data_dir}")
-    data_files = glob.glob(os.path.join(data_dir, f"*_{asset.upper()}_{interval.upper()}_*.parquet"))
-    
-    if not data_files:
-        print(f"No files found matching pattern: {os.path.join(data_dir, f'*_{asset.upper()}_{interval.upper()}_*.parquet')}")
-        print("Available files in data directory:")
-        print("\n".join(os.listdir(data_dir)))
-        raise FileNotFoundError(f"No data file found for {asset} with {interval} interval")
-    
-    print(f"Found data file: {data_files[0]}")
-    data_path = data_files[0]  # Use the first matching file
-    df = pd.read_parquet(data_path)
+DATA_DIR = "/app/data"
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+
+def _common_type(types):
+    if all(t == types[0] for t in types):
+        return types[0]
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+        return pa.float64()
+    if all(pa.types.is_timestamp(t) for t in types):
+        return pa.timestamp('ns', tz=types[0].tz)
+    return pa.string()
+
+def _concat_tables(tables):
+    """Concatenate tables whose column types may differ between fragments (e.g. float32 vs float64)."""
+    if len(tables) == 1:
+        return tables[0]
+    names = tables[0].schema.names
+    schema = pa.schema([(name, _common_type([t.schema.field(name).type for t in tables])) for name in names])
+    return pa.concat_tables([t.select(names).cast(schema) for t in tables])
+
+def _read_parquet_range(data_path, start, end):
+    """Read only the date range and OHLCV columns, letting pyarrow skip row groups by their statistics.
+
+    `data_path` may also be a partitioned dataset directory; fragments outside the range are not opened.
+    """
+    # 范围内没有碎片时仍读取第一个碎片，得到列结构完整的空表
+    files = dataset_files(data_path, start, end) or dataset_files(data_path)[:1]
+    schema = pq.read_schema(files[0])
+    names = {name.lower(): name for name in schema.names}
+    if 'date' not in names:
+        # 日期保存在 pandas 索引中的旧格式文件，只能整体读取后在 pandas 中过滤
+        return pd.read_parquet(data_path)
+
+    date_col = names['date']
+    columns = [date_col] + [names[col.lower()] for col in PRICE_COLUMNS + ['Volume'] if col.lower() in names]
+    date_type = schema.field(date_col).type
+    if pa.types.is_timestamp(date_type) and date_type.tz and start.tz is None:
+        start, end = start.tz_localize(date_type.tz), end.tz_localize(date_type.tz)
+    tables = []
+    for path in files:
+        try:
+            tables.append(pq.read_table(path, columns=columns, filters=[(date_col, '>=', start), (date_col, '<=', end)]))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, TypeError):
+            # 日期列不是 timestamp 类型（例如字符串），无法下推过滤
+            tables.append(pq.read_table(path, columns=columns))
+    # 旧版本写出的碎片之间列类型可能不同，先统一再拼接
+    return _concat_tables(tables).to_pandas()
+
+def _downcast(df):
+    """Shrink dtypes where no information is lost."""
+    prices = df[PRICE_COLUMNS]
+    if all(dtype == np.float64 for dtype in prices.dtypes):
+        as_float32 = prices.astype(np.float32)
+        if np.array_equal(as_float32.to_numpy(np.float64), prices.to_numpy(), equal_nan=True):
+            df[PRICE_COLUMNS] = as_float32
+    if 'Volume' in df.columns and df['Volume'].dtype.kind == 'f':
+        volume = df['Volume'].to_numpy()
+        if not np.isnan(volume).any() and np.array_equal(volume, np.round(volume)):
+            df['Volume'] = volume.astype(np.int64)
+    return df
+
+def find_data_path(asset, interval, start, end, verbose=False):
+    data_dir = DATA_DIR
+    # 优先通过 datahub 维护的数据目录索引定位文件
+    data_path = find_data_file(data_dir, asset, interval, start, end)
+    if data_path is None:
+        if verbose:
+            print(f"No catalog found, searching for data files in: {data_dir}")
+        pattern = os.path.join(data_dir, f"*_{asset.upper()}_{interval.upper()}_*.parquet")
+        data_files = sorted(glob.glob(pattern))
+        if not data_files:
+            print(f"No files found matching pattern: {pattern}")
+            print("Available files in data directory:")
+            print("\n".join(os.listdir(data_dir)))
+            raise FileNotFoundError(f"No data file found for {asset} with {interval} interval")
+        data_path = data_files[0]
+
+    if verbose:
+        print(f"Found data file: {data_path}")
+    return data_path
+
+def load_data(asset, interval, start_date, end_date, verbose=False):
+    """OHLCV bars of `asset` between the dates as a DataFrame with capitalized columns and a DatetimeIndex.
+
+    The memory-mapped snapshot slice is converted with to_pandas, which copies the selected rows once;
+    code that only needs the raw columns can use bar_store.bar_arrays for zero-copy views instead.
+    """
+    start, end = pd.to_datetime(start_date), pd.to_datetime(end_date)
+    data_path = find_data_path(asset, interval, start, end, verbose)
+    # datahub 发布了内存映射快照时直接切片读取（免去 parquet 解码，但 to_pandas 仍会复制选中的行）
+    bars = read_bars(data_path, start, end) if os.path.isdir(data_path) else None
+    df = bars.to_pandas() if bars is not None else _read_parquet_range(data_path, start, end)
 
     # 将列名改为大写
     df.columns = df.columns.str.capitalize()
 
     # 确保数据包含所需的列
-    required_columns = ['Open', 'High', 'Low', 'Close']
-    if not all(col in df.columns for col in required_columns):
-        raise ValueError(f"Data must contain columns: {', '.join(required_columns)}")
+    if not all(col in df.columns for col in PRICE_COLUMNS):
+        raise ValueError(f"Data must contain columns: {', '.join(PRICE_COLUMNS)}")
     
     # 将 'Date' 列设置为索引
     if 'Date' in df.columns:
@@ -63,26 +149,70 @@ def load_data(asset, interval, start_date, end_date):
     elif not isinstance(df.index, pd.DatetimeIndex):
         raise ValueError("DataFrame index must be a DatetimeIndex")
     
-    # 按日期范围过滤数据
-    df = df[(df.index >= pd.to_datetime(start_date)) & (df.index <= pd.to_datetime(end_date))]
+    # 按日期范围过滤数据（下推过滤之后这里通常不会再删掉行）
+    if df.index.tz is not None and start.tz is None:
+        start, end = start.tz_localize(df.index.tz), end.tz_localize(df.index.tz)
+    df = df[(df.index >= start) & (df.index <= end)]
     
     # 选择所需的列
-    df = df[['Open', 'High', 'Low', 'Close', 'Volume']] if 'Volume' in df.columns else df[['Open', 'High', 'Low', 'Close']]
+    df = df[PRICE_COLUMNS + ['Volume']] if 'Volume' in df.columns else df[PRICE_COLUMNS]
+    df = _downcast(df.copy())
     
-    print("Data shape:", df.shape)
-    print("Data columns:", df.columns)
-    print("Data index:", df.index)
-    print("Data head:\n", df.head())
+    if verbose:
+        print("Data shape:", df.shape)
+        print("Data columns:", df.columns)
+        print("Data index:", df.index)
+        print("Data head:\n", df.head())
     
     return df
 
-def run_backtest(strategy_class, data, initial_capital, commission):
+def run_backtest(strategy_class, data, initial_capital, commission, engine='backtesting', cache=None,
+                 profile=False):
 
     if not issubclass(strategy_class, Strategy):
         raise TypeError('`strategy_class` must be a subclass of Strategy')
+
+    # 命中磁盘缓存时直接返回结果，没有 Backtest 对象（bt 为 None）
+    # 剖析模式需要真正运行一次，不读缓存；参数无法序列化（make_key 返回 None）时不使用缓存
+    key = cache.make_key(strategy_class, data, initial_capital, commission, engine) if cache is not None else None
+    if key is not None:
+        results = cache.get(key) if not profile else None
+        if results is not None:
+            return None, results
+
+    profiler = BacktestProfiler() if profile else None
+    bt, results = _run_backtest(strategy_class, data, initial_capital, commission, engine, profiler)
+    if key is not None:
+        cache.put(key, results)
+    if profiler is not None:
+        # 与 _equity_curve、_trades 一样以下划线键附在结果上
+        results['_profile'] = profiler.to_dict()
+    return bt, results
+
+def _run_backtest(strategy_class, data, initial_capital, commission, engine, profiler=None):
+    if engine == 'vectorized':
+        # 向量化模式没有 Backtest 对象，bt 返回 None
+        if not hasattr(strategy_class, 'generate_signals'):
+            raise TypeError(f"{strategy_class.__name__} does not implement generate_signals() for the vectorized engine")
+        if profiler is None:
+            entries, exits = strategy_class.generate_signals(data)
+        else:
+            entries, exits = profiler.timed('signals', strategy_class.generate_signals, data)
+        results = run_vectorized_backtest(data, entries, exits, initial_capital, commission,
+                                          strategy=strategy_class.__name__, profiler=profiler)
+        if profiler is not None:
+            profiler.record('total', sum(profiler.sections.values()))
+        return None, results
+    elif engine != 'backtesting':
+        raise ValueError(f"Unknown backtest engine: {engine}")
     
-    bt = Backtest(data, strategy_class, cash=initial_capital, commission=commission) 
-    results = bt.run()
+    if profiler is None:
+        bt = Backtest(data, strategy_class, cash=initial_capital, commission=commission) 
+        results = bt.run()
+    else:
+        bt = Backtest(data, profiler.wrap_strategy(strategy_class), cash=initial_capital, commission=commission)
+        bt._broker = profiler.wrap_broker(bt._broker)
+        results = profiler.run_event(bt)
     
     # Print debug information
     strategy_instance = bt._strategy
@@ -95,12 +225,24 @@ def run_backtest(strategy_class, data, initial_capital, commission):
     
     return bt, results
 
-def save_results(results, bt):
-    results_dir = '/app/backtester'
+RESULTS_DIR = '/app/backtester'
+
+PLOT_MODES = ('full', 'fast', 'none')
+
+def save_results(results, bt, results_dir=RESULTS_DIR, plot='full'):
+    """Save CSV/JSON metrics, the equity curve and trades (parquet) and optionally a plot.
+
+    plot='full' writes the interactive Bokeh chart (needs `bt`), 'fast' renders downsampled
+    PNG figures headless, 'none' skips plotting; run `python -m src.report_generator` later
+    to render from the saved parquet files.
+    """
+    if plot not in PLOT_MODES:
+        raise ValueError(f"plot must be one of {PLOT_MODES}")
     os.makedirs(results_dir, exist_ok=True)
     
     # Save as CSV
-    results.to_csv(os.path.join(results_dir, 'backtest_results.csv'))
+    profile = results.get('_profile')
+    results.drop('_profile', errors='ignore').to_csv(os.path.join(results_dir, 'backtest_results.csv'))
     
     # Save basic metrics as JSON
     metrics = {
@@ -133,14 +275,30 @@ def save_results(results, bt):
     with open(os.path.join(results_dir, 'backtest_metrics.json'), 'w') as f:
         json.dump(metrics, f, indent=4)
 
-    # Save HTML plot
-    plot = bt.plot()
-    html = file_html(plot, CDN, "Backtest Results")
-    with open(os.path.join(results_dir, 'backtest_plot.html'), 'w') as f:
-        f.write(html)
+    if profile is not None:
+        with open(os.path.join(results_dir, 'backtest_profile.json'), 'w') as f:
+            json.dump(profile, f, indent=4)
+
+    save_report_data(results, results_dir)
+
+    if plot == 'none':
+        print(f"Backtest results saved to {results_dir} (plot skipped)")
+        return
+
+    if plot == 'fast' or bt is None:
+        # 向量化或缓存结果没有 Backtest 对象，只能从权益曲线画静态图
+        from src.report_generator import render_plots
+        paths = render_plots(results['_equity_curve'], results_dir)
+        print(f"Backtest results saved to {results_dir}")
+        print(f"Plots saved as {', '.join(paths)}")
+        return
+
+    # Save HTML plot（backtesting.py 自带重采样，直接写入结果目录，不弹浏览器）
+    plot_path = os.path.join(results_dir, 'backtest_plot.html')
+    bt.plot(filename=plot_path, open_browser=False)
 
     print(f"Backtest results saved to {results_dir}")
-    print(f"HTML plot saved as {os.path.join(results_dir, 'backtest_plot.html')}")
+    print(f"HTML plot saved as {plot_path}")
 
 
 def extract_strategy_number(filename):
@@ -177,16 +335,40 @@ def main():
     else:
         commission = 0.001
 
-    # Load data and strategy
-    data = load_data(asset, interval, start_date, end_date)
-
+    # Load strategy; data is loaded below unless it is streamed chunk by chunk
     try:
         print(f"Selected strategy file: {selected_strategy}")
         Strategy = load_strategy(selected_strategy)
         print(f"Loaded strategy class: {Strategy}")
 
-        bt, results = run_backtest(Strategy, data, initial_capital, commission)
-        save_results(results, bt)
+        engine = 'backtesting'
+        if hasattr(Strategy, 'generate_signals'):
+            choice = input("Engine - backtesting, vectorized or streaming (default backtesting): ").strip().lower()
+            engine = choice or 'backtesting'
+
+        plot = input("Plot mode - full (interactive), fast (PNG) or none (default full): ").strip().lower() or 'full'
+        if engine == 'streaming':
+            # 逐块读取 parquet，适合放不进内存的分钟/逐笔数据
+            from src.streaming_engine import stream_backtest
+            bt, results = None, stream_backtest(Strategy, asset, interval, start_date, end_date, initial_capital,
+                                                commission)
+        else:
+            data = load_data(asset, interval, start_date, end_date)
+            profile = input("Profile the backtest? (y/N): ").strip().lower() == 'y'
+            # 交互式 Bokeh 图需要 Backtest 对象，缓存命中时没有，这种情况下不读缓存
+            cache = None if plot == 'full' and engine == 'backtesting' else ResultCache()
+            bt, results = run_backtest(Strategy, data, initial_capital, commission, engine=engine,
+                                       cache=cache, profile=profile)
+            if profile:
+                print(format_profile(results['_profile']))
+        save_results(results, bt, plot=plot)
+
+        if input("Run bootstrap robustness analysis? (y/N): ").strip().lower() == 'y':
+            from src.robustness import robustness_analysis, save_robustness
+            n_sims = int(input("Number of simulations (default 1000): ").strip() or 1000)
+            summary, _ = robustness_analysis(results, n_sims=n_sims, n_jobs=os.cpu_count() or 1)
+            print(summary.to_string(float_format=lambda v: f"{v:.2f}"))
+            print(f"Robustness summary saved to {save_robustness(summary, RESULTS_DIR)}")
         print("Backtest completed successfully.")
     except Exception as e:
         print(f"An error occurred during the backtest: {str(e)}")
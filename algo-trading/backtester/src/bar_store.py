@@ -0,0 +1,127 @@
+import os
+import json
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+DATASET_MANIFEST = '_manifest.json'
+
+# 读取 datahub 发布的内存映射快照（见 datahub/src/storage.py 的 publish）：分区数据集的每个年度分区
+# 有一个未压缩的 Arrow IPC 文件 year=YYYY/_bars-*.arrow，整年一个 record batch，manifest 的 snapshots
+# 记录每个快照由哪些碎片生成。用 mmap 打开后，按日期二分查找得到的切片和每列的 ndarray 都直接指向
+# 映射的页面，不复制、不解码；多个进程/容器打开同一个文件时共享同一份页缓存。
+# 任何一年的快照过期（碎片列表与 manifest 不一致）或不存在时返回 None，调用方回退到读取 parquet。
+
+# 每个进程内已映射的快照：path -> (inode, mtime_ns, table)，按最近使用排序。
+# 快照文件名每次发布都不同，读取数据集时释放 manifest 不再列出的快照，另外最多保留
+# MAX_OPEN_SNAPSHOTS 个，长期运行的读者不会一直映射已被删除的旧文件
+_open_snapshots = OrderedDict()
+MAX_OPEN_SNAPSHOTS = 256
+UNIT_NS = {'s': 1_000_000_000, 'ms': 1_000_000, 'us': 1_000, 'ns': 1}
+
+
+def _current_snapshots(path):
+    """Snapshot entries of the dataset at `path` in year order, or None unless every year has a current one."""
+    try:
+        with open(os.path.join(path, DATASET_MANIFEST), 'r') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, NotADirectoryError):
+        manifest = {'fragments': []}
+    _release_superseded(path, {os.path.join(path, s['file']) for s in manifest.get('snapshots', [])})
+    files = {}
+    for fragment in manifest['fragments']:
+        files.setdefault(fragment['year'], []).append(fragment['file'])
+    snapshots = {s['year']: s for s in manifest.get('snapshots', []) if files.get(s['year']) == s['fragments']}
+    if not files or set(snapshots) != set(files):
+        return None
+    return [snapshots[year] for year in sorted(snapshots)]
+
+
+def _release_superseded(path, listed):
+    prefix = os.path.join(path, '')
+    for snapshot_path in [p for p in _open_snapshots if p.startswith(prefix) and p not in listed]:
+        del _open_snapshots[snapshot_path]
+
+
+def open_snapshot(snapshot_path):
+    """Memory-map one snapshot file as a pyarrow Table, or None if it does not exist."""
+    try:
+        stat = os.stat(snapshot_path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    cached = _open_snapshots.get(snapshot_path)
+    if cached is not None and cached[:2] == (stat.st_ino, stat.st_mtime_ns):
+        _open_snapshots.move_to_end(snapshot_path)
+        return cached[2]
+    # 只映射文件，不读取数据；页面在访问时才由操作系统载入
+    table = pa.ipc.open_file(pa.memory_map(snapshot_path)).read_all()
+    _open_snapshots[snapshot_path] = (stat.st_ino, stat.st_mtime_ns, table)
+    _open_snapshots.move_to_end(snapshot_path)
+    # 释放缓存里的表之后，仍在使用的切片和数组继续持有映射，直到它们被回收
+    while len(_open_snapshots) > MAX_OPEN_SNAPSHOTS:
+        _open_snapshots.popitem(last=False)
+    return table
+
+
+def _bound(value, date_type, ceil=False):
+    """`value` as an integer in the unit of the snapshot's date column."""
+    ts = pd.Timestamp(value)
+    if date_type.tz is not None and ts.tz is None:
+        ts = ts.tz_localize(date_type.tz)
+    elif date_type.tz is None and ts.tz is not None:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+    step = UNIT_NS[date_type.unit]
+    return -(-ts.value // step) if ceil else ts.value // step
+
+
+def _slice(table, start, end):
+    if start is None and end is None:
+        return table
+    date_type = table.schema.field('date').type
+    # 快照是单个 chunk，日期列直接作为 int64 视图做二分查找
+    dates = table.column('date').chunk(0).to_numpy(zero_copy_only=True).view(np.int64) \
+        if table.num_rows else np.array([], np.int64)
+    lo = np.searchsorted(dates, _bound(start, date_type, ceil=True), 'left') if start is not None else 0
+    hi = np.searchsorted(dates, _bound(end, date_type), 'right') if end is not None else len(dates)
+    return table.slice(lo, max(hi - lo, 0))
+
+
+def read_bars(path, start=None, end=None):
+    """Zero-copy slice of the snapshots covering [start, end] (inclusive), or None without current snapshots.
+
+    The result has one chunk per year partition that the range touches.
+    """
+    snapshots = _current_snapshots(path)
+    if snapshots is None:
+        return None
+    slices = []
+    for entry in snapshots:
+        table = open_snapshot(os.path.join(path, entry['file']))
+        if table is None:
+            return None
+        slices.append(_slice(table, start, end))
+    # 拼接只引用各年的切片，不复制数据；范围外的年份不参与
+    selected = [t for t in slices if t.num_rows] or slices[:1]
+    if any(not t.schema.equals(selected[0].schema) for t in selected[1:]):
+        # 数据集的 schema 放宽后、重新发布前，各年快照的列类型可能不同
+        return None
+    return pa.concat_tables(selected) if len(selected) > 1 else selected[0]
+
+
+def bar_arrays(table):
+    """ndarrays of every column of a snapshot slice (tz-aware dates come back as UTC datetime64).
+
+    A slice within one year partition gives read-only views of the mapped pages; a slice spanning
+    several years is concatenated into new arrays.
+    """
+    arrays = {}
+    for name in table.column_names:
+        column = table.column(name)
+        if column.num_chunks == 1:
+            arrays[name] = column.chunk(0).to_numpy(zero_copy_only=True)
+        elif column.num_chunks:
+            arrays[name] = np.concatenate([chunk.to_numpy(zero_copy_only=True) for chunk in column.chunks])
+        else:
+            arrays[name] = pa.array([], column.type).to_numpy(zero_copy_only=True)
+    return arrays
@@ -0,0 +1,271 @@
+"""Non-interactive batch backtests: every strategy x asset x interval x date window.
+
+    python -m src.batch_runner --config batch.yaml
+    python -m src.batch_runner --strategies '/app/strategies/*.py' --assets btcusd ethusd \
+        --intervals 1d --start 20200101 --end 20231231 --jobs 8 --output batch_results.csv
+
+Config file (YAML or JSON) keys mirror the command line options:
+
+    strategies: ["/app/strategies/*.py"]
+    assets: [btcusd, ethusd]
+    intervals: [1d]
+    windows:
+      - {start: "20200101", end: "20231231"}
+    initial_capital: 100000
+    commission: 0.001
+    engine: backtesting   # default; or vectorized, or auto (vectorized when the strategy supports it)
+    jobs: 8
+    output: /app/backtester/batch_results.csv
+"""
+import argparse
+import glob
+import json
+import math
+import multiprocessing as mp
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+sys.path.append('/app')
+
+from src.backtest_engine import load_data, load_strategy, run_backtest
+from src.result_cache import ResultCache
+from src.shared_data import share_dataframe, attach_dataframe
+
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+STRATEGY_DIR = '/app/strategies'
+DEFAULT_OUTPUT = '/app/backtester/batch_results.csv'
+DEFAULTS = {
+    'strategies': [os.path.join(STRATEGY_DIR, '*.py')],
+    'assets': [],
+    'intervals': ['1d'],
+    'windows': [],
+    'initial_capital': 100000,
+    'commission': 0.001,
+    'engine': 'backtesting',
+    'jobs': 1,
+    'cache': True,
+    'output': DEFAULT_OUTPUT,
+}
+
+
+def load_config(path):
+    with open(path, 'r') as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+
+def resolve_strategy_files(patterns):
+    """Expand globs and bare names (looked up in /app/strategies) into a sorted list of files."""
+    files = []
+    for pattern in patterns:
+        if not os.path.dirname(pattern) and not os.path.exists(pattern):
+            pattern = os.path.join(STRATEGY_DIR, pattern if pattern.endswith('.py') else f"{pattern}.py")
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            raise FileNotFoundError(f"No strategy file matches {pattern}")
+        files.extend(m for m in matches if m not in files)
+    return files
+
+
+def _parse_date(value):
+    return datetime.strptime(str(value), "%Y%m%d")
+
+
+def build_jobs(config):
+    """Expand the config into datasets (asset, interval, start, end) and strategy files."""
+    datasets = [(asset.lower(), interval.lower(), _parse_date(window['start']), _parse_date(window['end']))
+                for asset in config['assets']
+                for interval in config['intervals']
+                for window in config['windows']]
+    return datasets, resolve_strategy_files(config['strategies'])
+
+
+def _metrics_row(results):
+    return {
+        'total_return': results['Return [%]'],
+        'buy_hold_return': results['Buy & Hold Return [%]'],
+        'sharpe_ratio': results['Sharpe Ratio'],
+        'sortino_ratio': results['Sortino Ratio'],
+        'max_drawdown': results['Max. Drawdown [%]'],
+        'win_rate': results['Win Rate [%]'],
+        'num_trades': results['# Trades'],
+        'exposure_time': results['Exposure Time [%]'],
+    }
+
+
+def run_one(data, strategy_file, initial_capital, commission, engine, cache, strategies=None):
+    """Backtest one strategy file on one dataset; errors are reported in the row instead of raised."""
+    row = {'strategy': os.path.basename(strategy_file)}
+    start = time.perf_counter()
+    try:
+        if strategies is None or strategy_file not in strategies:
+            strategy_class = load_strategy(strategy_file)
+            if strategies is not None:
+                strategies[strategy_file] = strategy_class
+        else:
+            strategy_class = strategies[strategy_file]
+        if engine == 'auto':
+            engine = 'vectorized' if hasattr(strategy_class, 'generate_signals') else 'backtesting'
+        row['engine'] = engine
+        _, results = run_backtest(strategy_class, data, initial_capital, commission, engine=engine, cache=cache)
+        row.update(_metrics_row(results))
+        row['error'] = None
+    except Exception as e:
+        row['error'] = f"{type(e).__name__}: {e}"
+    row['seconds'] = time.perf_counter() - start
+    return row
+
+
+# 工作进程状态：共享内存中的数据集按需挂载，策略文件每个进程只加载一次
+_worker_state = {}
+
+
+def _init_worker(data_metas, initial_capital, commission, engine, cache):
+    _worker_state.update(data_metas=data_metas, frames={}, strategies={}, initial_capital=initial_capital,
+                         commission=commission, engine=engine, cache=cache)
+
+
+def _run_task(dataset_idx, strategy_idx, strategy_file):
+    state = _worker_state
+    if dataset_idx not in state['frames']:
+        state['frames'][dataset_idx] = attach_dataframe(state['data_metas'][dataset_idx])
+    data, _ = state['frames'][dataset_idx]
+    row = run_one(data, strategy_file, state['initial_capital'], state['commission'], state['engine'],
+                  state['cache'], state['strategies'])
+    return dataset_idx, strategy_idx, row
+
+
+def run_batch(datasets, strategy_files, initial_capital=100000, commission=0.001, engine='backtesting',
+              n_jobs=1, cache=None, loader=load_data):
+    """Run every strategy on every dataset and return one DataFrame with a row per run.
+
+    Each dataset is read once in the parent process and placed in shared memory;
+    the (dataset, strategy) runs are then spread over `n_jobs` worker processes.
+    """
+    frames, failed = [], {}
+    for idx, (asset, interval, start, end) in enumerate(datasets):
+        try:
+            frames.append(loader(asset, interval, start, end))
+        except Exception as e:
+            frames.append(None)
+            failed[idx] = f"{type(e).__name__}: {e}"
+            print(f"Skipping {asset} {interval} {start:%Y%m%d}-{end:%Y%m%d}: {failed[idx]}")
+
+    tasks = [(idx, pos, strategy_file) for idx in range(len(datasets)) if idx not in failed
+             for pos, strategy_file in enumerate(strategy_files)]
+    rows = [(idx, pos, {'strategy': os.path.basename(f), 'engine': None, 'error': failed[idx], 'seconds': 0.0})
+            for idx in failed for pos, f in enumerate(strategy_files)]
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(tasks))
+
+    if n_jobs <= 1:
+        strategies = {}
+        for done, (idx, pos, strategy_file) in enumerate(tasks, 1):
+            rows.append((idx, pos, run_one(frames[idx], strategy_file, initial_capital, commission, engine, cache,
+                                           strategies)))
+            print(f"Completed {done}/{len(tasks)} runs")
+    else:
+        if 'fork' in mp.get_all_start_methods():
+            mp_context = mp.get_context('fork')
+        else:
+            mp_context = mp.get_context()
+        shared = {idx: share_dataframe(frame) for idx, frame in enumerate(frames) if frame is not None}
+        data_metas = {idx: meta for idx, (_, meta) in shared.items()}
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp_context, initializer=_init_worker,
+                                     initargs=(data_metas, initial_capital, commission, engine,
+                                               cache)) as executor:
+                # 同一数据集的任务相邻提交，工作进程挂载的数据集更少
+                futures = [executor.submit(_run_task, *task) for task in tasks]
+                for done, future in enumerate(as_completed(futures), 1):
+                    rows.append(future.result())
+                    if done % max(1, math.ceil(len(tasks) / 20)) == 0 or done == len(tasks):
+                        print(f"Completed {done}/{len(tasks)} runs")
+        finally:
+            for shm, _ in shared.values():
+                shm.close()
+                shm.unlink()
+
+    records = []
+    for idx, _, row in sorted(rows, key=lambda r: r[:2]):
+        asset, interval, start, end = datasets[idx]
+        records.append({'asset': asset, 'interval': interval, 'start': start.date(), 'end': end.date(),
+                        'bars': len(frames[idx]) if frames[idx] is not None else 0, **row})
+    return pd.DataFrame(records)
+
+
+def save_table(table, output):
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    if output.endswith('.parquet'):
+        table.to_parquet(output, index=False)
+    else:
+        table.to_csv(output, index=False)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run backtests for many strategies and assets")
+    parser.add_argument('--config', help="YAML or JSON file with the batch definition")
+    parser.add_argument('--strategies', nargs='+', help="strategy files, globs or names in /app/strategies")
+    parser.add_argument('--assets', nargs='+')
+    parser.add_argument('--intervals', nargs='+')
+    parser.add_argument('--start', help="window start (YYYYMMDD), used with --end")
+    parser.add_argument('--end', help="window end (YYYYMMDD)")
+    parser.add_argument('--initial-capital', type=float)
+    parser.add_argument('--commission', type=float)
+    parser.add_argument('--engine', choices=['backtesting', 'vectorized', 'auto'],
+                        help="backtest engine (default backtesting)")
+    parser.add_argument('--jobs', type=int, help="worker processes (-1 for all cores)")
+    parser.add_argument('--no-cache', action='store_true', help="do not use the backtest result cache")
+    parser.add_argument('--output', help="results table (.csv or .parquet)")
+    return parser.parse_args(argv)
+
+
+def build_config(args):
+    config = dict(DEFAULTS)
+    if args.config:
+        config.update(load_config(args.config))
+    for key in ('strategies', 'assets', 'intervals', 'initial_capital', 'commission', 'engine', 'jobs', 'output'):
+        value = getattr(args, key)
+        if value is not None:
+            config[key] = value
+    if args.start or args.end:
+        if not (args.start and args.end):
+            raise ValueError("--start and --end must be given together")
+        config['windows'] = [{'start': args.start, 'end': args.end}]
+    if args.no_cache:
+        config['cache'] = False
+    if not config['assets'] or not config['windows']:
+        raise ValueError("At least one asset and one date window are required")
+    return config
+
+
+def main(argv=None):
+    config = build_config(parse_args(argv))
+    datasets, strategy_files = build_jobs(config)
+    print(f"Running {len(strategy_files)} strategies on {len(datasets)} datasets "
+          f"({len(strategy_files) * len(datasets)} backtests, {config['jobs']} workers)")
+
+    start = time.perf_counter()
+    table = run_batch(datasets, strategy_files, config['initial_capital'], config['commission'], config['engine'],
+                      config['jobs'], ResultCache() if config['cache'] else None)
+    save_table(table, config['output'])
+
+    errors = int(table['error'].notna().sum()) if not table.empty else 0
+    print(f"Batch finished in {time.perf_counter() - start:.1f}s, {errors} failed runs")
+    print(f"Results saved to {config['output']}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import os
+import json
+import pandas as pd
+
+MANIFEST_NAME = 'catalog.json'
+DATASET_MANIFEST = '_manifest.json'
+
+# 读取 datahub 维护的数据目录索引（/app/data/catalog.json），按代码、周期和日期范围
+# 直接定位数据文件，不再 glob 扫描目录。索引的格式见 datahub/src/catalog.py。
+# 定位到的也可能是分区存储的数据集目录（见 datahub/src/storage.py），用 dataset_files 展开成碎片文件。
+
+_manifest_cache = {}
+
+
+def load_manifest(data_dir):
+    """Return the catalog entries grouped by (symbol, interval); None if there is no catalog."""
+    path = os.path.join(data_dir, MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except FileNotFoundError:
+        return None
+    cached = _manifest_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, 'r') as f:
+        files = json.load(f)['files']
+    index = {}
+    for entry in files.values():
+        index.setdefault((entry['symbol'], entry['interval']), []).append(entry)
+    _manifest_cache[path] = (mtime, index)
+    return index
+
+
+def _ts(value, reference):
+    ts = pd.Timestamp(value)
+    if ts.tz is not None and reference.tz is None:
+        ts = ts.tz_localize(None)
+    elif ts.tz is None and reference.tz is not None:
+        ts = ts.tz_localize(reference.tz)
+    return ts
+
+
+def find_data_file(data_dir, asset, interval, start_date, end_date):
+    """Pick the catalogued file that best covers [start_date, end_date].
+
+    Files that do not overlap the range are skipped. A file covering the whole range
+    wins (the smallest one if several do); otherwise the largest overlap, then the latest
+    end date, then the file name decide, so the choice is deterministic.
+    Returns None when the catalog has no entry for the asset/interval.
+    """
+    index = load_manifest(data_dir)
+    if index is None:
+        return None
+    entries = index.get((asset.upper(), interval.upper()), [])
+    if not entries:
+        return None
+
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    candidates = []
+    for entry in entries:
+        if entry['start'] is None or not os.path.exists(os.path.join(data_dir, entry['file'])):
+            continue
+        entry_start, entry_end = _ts(entry['start'], start), _ts(entry['end'], start)
+        overlap = min(entry_end, end) - max(entry_start, start)
+        if overlap < pd.Timedelta(0):
+            continue
+        covers = entry_start <= start and entry_end >= end
+        candidates.append((not covers, entry['rows'] if covers else -overlap.value,
+                           -entry_end.value, entry['file']))
+
+    if not candidates:
+        raise FileNotFoundError(f"No {asset.upper()} {interval.upper()} data between {start.date()} and {end.date()}")
+    return os.path.join(data_dir, min(candidates)[3])
+
+
+def dataset_files(path, start=None, end=None):
+    """Parquet files holding the data at `path`: the path itself, or the fragments of a partitioned
+    dataset directory overlapping [start, end] in date order."""
+    if not os.path.isdir(path):
+        return [path]
+    with open(os.path.join(path, DATASET_MANIFEST), 'r') as f:
+        fragments = json.load(f)['fragments']
+    files = []
+    for fragment in fragments:
+        if end is not None and _ts(fragment['start'], end) > end:
+            continue
+        if start is not None and _ts(fragment['end'], start) < start:
+            continue
+        files.append(os.path.join(path, fragment['file']))
+    return files
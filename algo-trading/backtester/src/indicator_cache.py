@@ -0,0 +1,247 @@
+import functools
+import hashlib
+import weakref
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# 指标缓存：同一进程内的多次回测（例如 optimize_strategy 的参数网格）共享计算结果。
+# 在策略文件中这样使用：
+#
+#     from src.indicator_cache import cached_indicator
+#
+#     @cached_indicator
+#     def SMA(values, n):
+#         return pd.Series(values).rolling(n).mean().values
+#
+#     class MyStrategy(Strategy):
+#         def init(self):
+#             self.ma = self.I(SMA, self.data.Close, self.n1)
+#
+# 只依赖过去数据的指标可以写成 @cached_indicator(causal=True)，walk-forward 的各个窗口共用一次计算。
+
+# id(array) -> (weakref, fingerprint)，避免对同一个不可变数组重复求哈希。可写的数组可能被原地
+# 修改，每次查找都重新对内容求哈希
+_fingerprints = {}
+
+
+def _immutable(arr):
+    # 数组本身和它引用的所有 ndarray 都只读时，内容不会再变（例如缓存的指标结果、mmap 快照的视图）
+    while isinstance(arr, np.ndarray):
+        if arr.flags.writeable:
+            return False
+        arr = arr.base
+    return True
+
+
+def _array_fingerprint(arr):
+    memoize = _immutable(arr)
+    entry = _fingerprints.get(id(arr)) if memoize else None
+    if entry is not None and entry[0]() is arr:
+        return entry[1]
+
+    arr_c = np.ascontiguousarray(arr)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{arr_c.dtype.str}{arr_c.shape}".encode())
+    digest.update(arr_c.view(np.uint8).reshape(-1) if arr_c.dtype != object else repr(arr_c.tolist()).encode())
+    fp = digest.hexdigest()
+    if not memoize:
+        return fp
+
+    try:
+        key = id(arr)
+        ref = weakref.ref(arr, lambda _, key=key: _fingerprints.pop(key, None))
+        _fingerprints[key] = (ref, fp)
+    except TypeError:
+        pass
+    return fp
+
+
+def fingerprint(value):
+    """Return a hashable fingerprint for an indicator argument."""
+    if isinstance(value, np.ndarray):
+        return ('ndarray', _array_fingerprint(value))
+    if isinstance(value, pd.Series):
+        return ('series', _array_fingerprint(value.to_numpy()), fingerprint(value.index))
+    if isinstance(value, pd.Index):
+        return ('index', _array_fingerprint(np.asarray(value)))
+    if isinstance(value, pd.DataFrame):
+        return ('frame', tuple(value.columns),
+                tuple(_array_fingerprint(value[col].to_numpy()) for col in value.columns),
+                fingerprint(value.index))
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__, tuple(fingerprint(v) for v in value))
+    if isinstance(value, dict):
+        return ('dict', tuple(sorted((k, fingerprint(v)) for k, v in value.items())))
+    try:
+        hash(value)
+    except TypeError:
+        return ('repr', repr(value))
+    return value
+
+
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        return int(np.sum(value.memory_usage(index=True)))
+    if isinstance(value, tuple):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+def _freeze(value):
+    # 缓存的结果会被多个回测共用，设为只读防止被策略意外修改
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, tuple):
+        for v in value:
+            _freeze(v)
+    return value
+
+
+def _ns_index(index):
+    return np.asarray(pd.DatetimeIndex(index).values.astype('datetime64[ns]').view('int64'))
+
+
+def _time_index(arg):
+    # backtesting.py 的 self.data.Close 等 _Array 在 _opts['index'] 中带着完整的时间索引
+    if isinstance(arg, pd.Series) and isinstance(arg.index, pd.DatetimeIndex):
+        return arg.index
+    opts = getattr(arg, '_opts', None)
+    if isinstance(arg, np.ndarray) and arg.ndim == 1 and isinstance(opts, dict):
+        index = opts.get('index')
+        if isinstance(index, pd.DatetimeIndex) and len(index) == len(arg):
+            return index
+    return None
+
+
+def _slice_result(value, start, stop):
+    if isinstance(value, np.ndarray):
+        return value[..., start:stop]
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        return value.iloc[start:stop]
+    if isinstance(value, tuple):
+        return tuple(_slice_result(v, start, stop) for v in value)
+    return value
+
+
+class IndicatorCache:
+    def __init__(self, max_entries=512, max_bytes=512 * 1024 ** 2):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._store = OrderedDict()
+        self._bytes = 0
+        self._bases = []
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, func, args, kwargs):
+        key = (func, fingerprint(args), fingerprint(kwargs))
+        if key in self._store:
+            self._store.move_to_end(key)
+            self.hits += 1
+            return self._store[key][0]
+
+        self.misses += 1
+        value = _freeze(func(*args, **kwargs))
+        size = _nbytes(value)
+        if size <= self.max_bytes:
+            self._store[key] = (value, size)
+            self._bytes += size
+            self._evict()
+        return value
+
+    # 滚动窗口（walk-forward）复用：登记完整的数据列后，causal 指标在任一子窗口上的计算
+    # 改为在完整序列上算一次再切片。只对只依赖过去数据的指标成立，需显式声明 causal=True。
+
+    def register_base(self, data):
+        """Register the full-length columns of `data` (DataFrame or Series with a DatetimeIndex)."""
+        columns = [data[col] for col in data.columns] if isinstance(data, pd.DataFrame) else [data]
+        index = _ns_index(data.index)
+        for col in columns:
+            self._bases.append((index, col.to_numpy(), data.index))
+
+    def clear_bases(self):
+        self._bases = []
+
+    def _locate(self, arg):
+        index = _time_index(arg)
+        if index is None or not len(index):
+            return None
+        values = np.asarray(arg)
+        first, last = _ns_index(index[[0, -1]])
+        n = len(values)
+        for base_index, base_values, base_time_index in self._bases:
+            start = int(np.searchsorted(base_index, first))
+            stop = start + n
+            if stop > len(base_index) or base_index[start] != first or base_index[stop - 1] != last:
+                continue
+            if np.array_equal(base_values[start:stop], values,
+                              equal_nan=values.dtype.kind == 'f' and base_values.dtype.kind == 'f'):
+                full = pd.Series(base_values, index=base_time_index) if isinstance(arg, pd.Series) else base_values
+                return full, start, stop
+        return None
+
+    def get_or_compute_causal(self, func, args, kwargs):
+        """Compute `func` on the registered full series and slice out the window of `args`.
+
+        Falls back to get_or_compute when an array argument is not a window of a registered base.
+        """
+        if not self._bases:
+            return self.get_or_compute(func, args, kwargs)
+        full_args, span = [], None
+        for arg in args:
+            if isinstance(arg, (np.ndarray, pd.Series)):
+                located = self._locate(arg)
+                if located is None or (span is not None and located[1:] != span):
+                    return self.get_or_compute(func, args, kwargs)
+                span = located[1:]
+                arg = located[0]
+            full_args.append(arg)
+        if span is None:
+            return self.get_or_compute(func, args, kwargs)
+        return _slice_result(self.get_or_compute(func, tuple(full_args), kwargs), *span)
+
+    def _evict(self):
+        while self._store and (len(self._store) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, size) = self._store.popitem(last=False)
+            self._bytes -= size
+
+    def clear(self):
+        self._store.clear()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._store)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+
+default_cache = IndicatorCache()
+
+
+def cached_indicator(func=None, cache=None, causal=False):
+    """Decorator that memoizes an indicator function in `cache` (the module default if None).
+
+    With causal=True (the value at bar t depends only on bars <= t, e.g. moving averages)
+    the indicator is computed once on the series registered with `register_base` and
+    sliced for every window, which is what walk-forward optimization uses.
+    """
+    if func is None:
+        return functools.partial(cached_indicator, cache=cache, causal=causal)
+
+    store = cache if cache is not None else default_cache
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if causal:
+            return store.get_or_compute_causal(func, args, kwargs)
+        return store.get_or_compute(func, args, kwargs)
+
+    wrapper.cache = store
+    return wrapper
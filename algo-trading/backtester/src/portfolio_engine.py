@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+sys.path.append('/app')
+
+from src.backtest_engine import load_data, load_strategy, RESULTS_DIR
+from src.vector_engine import drawdowns, return_stats
+
+# 多资产组合回测：把多个代码的 K 线按时间对齐成 (时间 x 资产) 的二维表，
+# 策略的 generate_signals 一次性对整张表计算信号，组合共用一份资金。
+# 全部用 numpy 二维数组运算，没有逐个资产或逐根 K 线的 Python 循环。
+#
+# 成交模型与 vector_engine 一致：收盘信号，下一根开盘执行。目标权重变化时在开盘调仓，
+# 两次调仓之间持仓数量不变（权重随价格漂移），权益按收盘价逐根计价。
+# 手续费只对目标权重真正变化的资产收取，按调仓前漂移后的权重到新目标权重的差额计算。
+#
+# 各资产的交易日历可以不同（例如股票和加密货币）：价格向前填充用于计价，资产没有价格的
+# K 线上不能成交，权重保持不变，复牌后第一根的开盘价相对上一个有效价格的收益照常计入。
+#
+# 等权组合在持有集合变化时把所有可交易的持仓调回等权，每次调仓都重设全部权重，各段之间只通过总资金
+# 相连，整个回测是一次 cumprod，没有 Python 循环。fixed 分配或某次调仓有持仓不可交易（休市）时，
+# 部分资产沿用漂移后的权重，按调仓次数循环（通常远少于 K 线数）。
+
+PANEL_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+ALLOCATIONS = ('equal', 'fixed')
+
+
+def build_panel(frames):
+    """Align {symbol: OHLCV DataFrame} into {field: DataFrame(time x symbol)} on the union of timestamps."""
+    symbols = list(frames)
+    index = frames[symbols[0]].index
+    for symbol in symbols[1:]:
+        index = index.union(frames[symbol].index)
+    panel = {}
+    for field in PANEL_FIELDS:
+        if all(field in frame.columns for frame in frames.values()):
+            values = np.full((len(index), len(symbols)), np.nan)
+            for j, symbol in enumerate(symbols):
+                frame = frames[symbol]
+                values[index.get_indexer(frame.index), j] = frame[field].to_numpy(dtype=float)
+            panel[field] = pd.DataFrame(values, index=index, columns=symbols)
+    return panel
+
+
+def load_panel(assets, interval, start_date, end_date):
+    """Load several assets from the datahub files and align them into a panel."""
+    return build_panel({asset.upper(): load_data(asset, interval, start_date, end_date) for asset in assets})
+
+
+def positions_from_signals(entries, exits):
+    """Long/flat state per asset from entry/exit signal matrices; exits win ties."""
+    state = np.where(np.asarray(exits, dtype=bool), 0.0, np.where(np.asarray(entries, dtype=bool), 1.0, np.nan))
+    # 按列向前填充：没有新信号时保持上一状态
+    return pd.DataFrame(state).ffill().fillna(0.0).to_numpy()
+
+
+def target_weights(held, tradable, allocation='equal', max_weight=None):
+    """Portfolio weights per bar from the held matrix.
+
+    'equal' splits capital evenly over the currently held assets (rebalancing when the
+    set changes); 'fixed' gives every asset a 1/N slot whether or not the others are held.
+    """
+    held = held * tradable
+    if allocation == 'equal':
+        count = held.sum(axis=1, keepdims=True)
+        weights = np.divide(held, count, out=np.zeros_like(held), where=count > 0)
+    elif allocation == 'fixed':
+        weights = held / held.shape[1]
+    else:
+        raise ValueError(f"allocation must be one of {ALLOCATIONS}")
+    if max_weight is not None:
+        weights = np.minimum(weights, max_weight)
+    return weights
+
+
+def run_portfolio_backtest(panel, entries, exits, initial_capital, commission, allocation='equal', max_weight=None,
+                           strategy=None):
+    """Backtest long/flat signals (time x asset) on a panel with one shared capital pool."""
+    open_ = panel['Open'].to_numpy(dtype=float)
+    close = panel['Close'].to_numpy(dtype=float)
+    index, symbols = panel['Close'].index, list(panel['Close'].columns)
+    n, m = open_.shape
+    if np.shape(entries) != (n, m) or np.shape(exits) != (n, m):
+        raise ValueError(f"Signals must have shape {(n, m)}")
+
+    held = positions_from_signals(entries, exits)
+    # 收盘信号在下一根开盘执行
+    held = np.vstack([np.zeros((1, m)), held[:-1]])
+    tradable = ~np.isnan(open_)
+    open_px = pd.DataFrame(open_).ffill().to_numpy()
+    mark_px = pd.DataFrame(np.where(np.isnan(close), open_, close)).ffill().to_numpy()
+    listed = (~np.isnan(open_px)).astype(float)
+    targets = target_weights(held, listed, allocation, max_weight)
+    # 没有价格的 K 线上不能成交：目标权重只在资产可交易的 K 线上更新
+    targets = pd.DataFrame(np.where(tradable, targets, np.nan)).ffill().fillna(0.0).to_numpy()
+
+    changed = np.vstack([targets[:1] != 0, targets[1:] != targets[:-1]])
+    rebalance = changed.any(axis=1)
+    previous = np.vstack([np.zeros((1, m)), targets[:-1]])
+    if allocation == 'equal':
+        # 等权：持有集合变化时，所有可交易的持仓都调回等权
+        changed |= rebalance[:, None] & tradable & ((previous != 0) | (targets != 0))
+    starts = np.flatnonzero(rebalance)
+    # 每次调仓都重设了全部持仓（没有沿用漂移权重的资产）时，各段之间只通过总资金相连，可以整体向量化
+    full = not ((previous[starts] != 0) & ~changed[starts]).any()
+    simulate = _full_rebalances if full else _rebalance_loop
+    equity, turnover, pnl = simulate(targets, changed, starts, open_px, mark_px, initial_capital, commission)
+    contributions = pnl / initial_capital
+
+    # 报告的是目标权重；不调仓的资产实际权重会随价格漂移
+    return compute_portfolio_stats(index, symbols, close, equity, targets, contributions, turnover, held,
+                                   initial_capital, strategy)
+
+
+def _full_rebalances(targets, changed, starts, open_px, mark_px, initial_capital, commission):
+    """Equity, turnover and per-asset P&L when every rebalance resets all positions to their targets."""
+    n, m = targets.shape
+    equity = np.full(n, float(initial_capital))
+    turnover = np.zeros(n)
+    if not len(starts):
+        return equity, turnover, np.zeros(m)
+    weights, entry = targets[starts], open_px[starts]
+    previous = np.vstack([np.zeros((1, m)), weights[:-1]])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        growth = np.where(previous > 0, entry / np.vstack([np.ones((1, m)), entry[:-1]]), 1.0)
+    # 调仓前的资金相对上一次调仓后的倍数，以及漂移后的权重
+    before = 1 - previous.sum(axis=1) + (previous * growth).sum(axis=1)
+    drifted = previous * growth / before[:, None]
+    turnover[starts] = np.abs(weights - drifted).sum(axis=1)
+    value = initial_capital * np.cumprod(before * (1 - commission * turnover[starts]))
+    value_before = np.r_[float(initial_capital), value[:-1]]
+    pnl = (value_before[:, None] * previous * (growth - 1)).sum(axis=0)
+
+    # 每根 K 线所在的调仓段
+    segment = np.searchsorted(starts, np.arange(starts[0], n), side='right') - 1
+    held = weights[segment]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        relative = np.where(held > 0, mark_px[starts[0]:] / entry[segment], 1.0)
+    equity[starts[0]:] = value[segment] * (1 - held.sum(axis=1) + (held * relative).sum(axis=1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pnl += value[-1] * weights[-1] * (np.where(weights[-1] > 0, mark_px[-1] / entry[-1], 1.0) - 1)
+    return equity, turnover, pnl
+
+
+def _rebalance_loop(targets, changed, starts, open_px, mark_px, initial_capital, commission):
+    """Equity, turnover and per-asset P&L when some rebalances keep drifted positions; loops once per rebalance."""
+    n, m = targets.shape
+    equity = np.full(n, float(initial_capital))
+    turnover = np.zeros(n)
+    pnl = np.zeros(m)
+    value, position, entry = float(initial_capital), np.zeros(m), np.ones(m)
+    for k, start in enumerate(starts):
+        end = starts[k + 1] if k + 1 < len(starts) else n
+        # 调仓前：上一段的持仓按本根开盘价计价
+        growth = np.where(position > 0, open_px[start] / entry, 1.0)
+        pnl += value * position * (growth - 1)
+        before = value * (1 - position.sum() + (position * growth).sum())
+        drifted = value * position * growth / before
+        value = before
+
+        # 只有目标变化的资产成交，其余保持漂移后的权重；新目标超出剩余资金时按比例缩小
+        target = np.where(changed[start], targets[start], drifted)
+        kept = drifted[~changed[start]].sum()
+        moving = target[changed[start]].sum()
+        if moving > 1 - kept > 0:
+            target[changed[start]] *= (1 - kept) / moving
+        turnover[start] = np.abs(target - drifted).sum()
+        value *= 1 - commission * turnover[start]
+
+        position, entry = target, np.where(target > 0, open_px[start], 1.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            relative = np.where(position > 0, mark_px[start:end] / entry, 1.0)
+        equity[start:end] = value * (1 - position.sum() + (position * relative).sum(axis=1))
+    if len(starts):
+        pnl += value * position * (np.where(position > 0, mark_px[-1] / entry, 1.0) - 1)
+    return equity, turnover, pnl
+
+
+def compute_portfolio_stats(index, symbols, close, equity, weights, contributions, turnover, held, initial_capital,
+                            strategy=None):
+    dd, dd_dur, dd_peaks = drawdowns(equity, index)
+    equity_df = pd.DataFrame({'Equity': equity, 'DrawdownPct': dd, 'DrawdownDuration': dd_dur}, index=index)
+
+    # 等权买入持有作为基准：每个资产从首个有效价格开始
+    first = pd.DataFrame(close).bfill().to_numpy()[0]
+    last = pd.DataFrame(close).ffill().to_numpy()[-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        buy_hold = np.nanmean(last / first - 1)
+
+    entries = np.diff(np.vstack([np.zeros((1, held.shape[1])), held]), axis=0) > 0
+    gross = weights.sum(axis=1)
+
+    s = {}
+    s['Start'] = index[0]
+    s['End'] = index[-1]
+    s['Duration'] = s['End'] - s['Start']
+    s['# Assets'] = len(symbols)
+    s['Exposure Time [%]'] = (gross > 0).mean() * 100
+    s['Avg. Gross Exposure [%]'] = gross.mean() * 100
+    s['Equity Final [$]'] = equity[-1]
+    s['Equity Peak [$]'] = equity.max()
+    s['Return [%]'] = (equity[-1] - initial_capital) / initial_capital * 100
+    s['Buy & Hold Return [%]'] = buy_hold * 100
+    s.update(return_stats(equity_df, dd_peaks))
+    s['# Trades'] = int(entries.sum())
+    s['Avg. Turnover [%]'] = turnover.mean() * 100
+
+    s['_strategy'] = strategy
+    s['_equity_curve'] = equity_df
+    s['_weights'] = pd.DataFrame(weights, index=index, columns=symbols)
+    s['_asset_contribution'] = pd.Series(contributions * 100, index=symbols, name='Contribution [%]')
+    return pd.Series(s, dtype=object)
+
+
+def run_portfolio(strategy_class, panel, initial_capital, commission, allocation='equal', max_weight=None):
+    """Run `strategy_class.generate_signals` on the whole panel and backtest the signals as one portfolio.
+
+    generate_signals(data) receives the panel, i.e. data['Close'] is a (time x asset)
+    DataFrame, so pandas-based signal code written for one asset usually works unchanged.
+    """
+    if not hasattr(strategy_class, 'generate_signals'):
+        raise TypeError(f"{strategy_class.__name__} does not implement generate_signals() for portfolio backtests")
+    entries, exits = strategy_class.generate_signals(panel)
+    return run_portfolio_backtest(panel, entries, exits, initial_capital, commission, allocation, max_weight,
+                                  strategy=strategy_class.__name__)
+
+
+def _json_value(value):
+    if isinstance(value, (np.integer, np.floating)):
+        return value.item()
+    return value if isinstance(value, (int, float)) else str(value)
+
+
+def save_portfolio_results(results, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    metrics = {key: _json_value(value) for key, value in results.items() if not key.startswith('_')}
+    with open(os.path.join(results_dir, 'portfolio_metrics.json'), 'w') as f:
+        json.dump(metrics, f, indent=4)
+    results['_equity_curve'].to_parquet(os.path.join(results_dir, 'portfolio_equity.parquet'))
+    results['_weights'].to_parquet(os.path.join(results_dir, 'portfolio_weights.parquet'))
+    results['_asset_contribution'].to_csv(os.path.join(results_dir, 'portfolio_contribution.csv'))
+    print(f"Portfolio results saved to {results_dir}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest one strategy on a basket of assets with shared capital")
+    parser.add_argument('--strategy', required=True, help="strategy file implementing generate_signals")
+    parser.add_argument('--assets', nargs='+', required=True)
+    parser.add_argument('--interval', default='1d')
+    parser.add_argument('--start', required=True, help="YYYYMMDD")
+    parser.add_argument('--end', required=True, help="YYYYMMDD")
+    parser.add_argument('--initial-capital', type=float, default=100000)
+    parser.add_argument('--commission', type=float, default=0.001)
+    parser.add_argument('--allocation', choices=ALLOCATIONS, default='equal')
+    parser.add_argument('--max-weight', type=float, help="cap on the weight of a single asset")
+    parser.add_argument('--output-dir', default=RESULTS_DIR)
+    args = parser.parse_args(argv)
+
+    strategy_class = load_strategy(args.strategy)
+    panel = load_panel(args.assets, args.interval, datetime.strptime(args.start, "%Y%m%d"),
+                       datetime.strptime(args.end, "%Y%m%d"))
+    results = run_portfolio(strategy_class, panel, args.initial_capital, args.commission, args.allocation,
+                            args.max_weight)
+    print(results[[key for key in results.index if not key.startswith('_')]].to_string())
+    save_portfolio_results(results, args.output_dir)
+
+
+if __name__ == "__main__":
+    main()
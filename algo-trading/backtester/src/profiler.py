@@ -0,0 +1,116 @@
+import time
+import numpy as np
+
+# 回测性能剖析：记录策略 init、每根 K 线 next() 的耗时分布、broker 订单处理以及统计计算的时间。
+# 只有 run_backtest(..., profile=True) 时才会包装策略和 broker，关闭时没有任何额外开销。
+
+PERCENTILES = (50, 90, 99)
+
+
+class BacktestProfiler:
+    def __init__(self):
+        self.sections = {}
+        self.next_ns = []
+        self.broker_ns = []
+        self._loop_end = None
+
+    def record(self, name, seconds):
+        self.sections[name] = self.sections.get(name, 0.0) + seconds
+
+    def timed(self, name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.record(name, time.perf_counter() - start)
+        return result
+
+    def wrap_strategy(self, strategy_class):
+        """Return a subclass of `strategy_class` whose init() and next() are timed."""
+        profiler = self
+        next_ns = self.next_ns
+
+        def init(strategy):
+            start = time.perf_counter()
+            strategy_class.init(strategy)
+            profiler.record('init', time.perf_counter() - start)
+
+        def next(strategy):
+            start = time.perf_counter_ns()
+            strategy_class.next(strategy)
+            end = time.perf_counter_ns()
+            next_ns.append(end - start)
+            profiler._loop_end = end
+
+        # 保持类名不变，结果中的 _strategy 仍显示原策略名
+        return type(strategy_class.__name__, (strategy_class,),
+                    {'init': init, 'next': next, '__module__': strategy_class.__module__})
+
+    def wrap_broker(self, broker_factory):
+        """Wrap Backtest._broker so that every broker.next() call is timed."""
+        broker_ns = self.broker_ns
+
+        def factory(*args, **kwargs):
+            broker = broker_factory(*args, **kwargs)
+            broker_next = broker.next
+
+            def next():
+                start = time.perf_counter_ns()
+                try:
+                    return broker_next()
+                finally:
+                    broker_ns.append(time.perf_counter_ns() - start)
+
+            broker.next = next
+            return broker
+
+        return factory
+
+    def run_event(self, bt):
+        """Run a prepared backtesting.Backtest and split the wall time into phases."""
+        start = time.perf_counter()
+        results = bt.run()
+        end = time.perf_counter()
+        total = end - start
+
+        init = self.sections.get('init', 0.0)
+        if self._loop_end is not None:
+            # 最后一次 next() 之后的时间：收尾平仓和 compute_stats
+            stats = max(end - self._loop_end / 1e9, 0.0)
+        else:
+            stats = 0.0
+        self.record('stats', stats)
+        self.record('total', total)
+        self.record('loop', max(total - init - stats, 0.0))
+        return results
+
+    def to_dict(self):
+        profile = {'sections': {name: round(seconds, 6) for name, seconds in self.sections.items()}}
+        for name, samples in (('next', self.next_ns), ('broker', self.broker_ns)):
+            if not samples:
+                continue
+            values = np.asarray(samples, dtype=np.float64) / 1e3
+            stats = {'calls': len(values), 'total_s': round(values.sum() / 1e6, 6),
+                     'mean_us': round(values.mean(), 3), 'max_us': round(values.max(), 3)}
+            for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                stats[f'p{p}_us'] = round(value, 3)
+            profile[name] = stats
+        if 'loop' in self.sections:
+            # 循环中既不是 next() 也不是 broker 的部分：指标切片等框架开销
+            accounted = sum(profile[name]['total_s'] for name in ('next', 'broker') if name in profile)
+            profile['sections']['framework'] = round(max(self.sections['loop'] - accounted, 0.0), 6)
+        return profile
+
+
+def format_profile(profile):
+    sections = profile['sections']
+    total = sections.get('total') or sum(sections.values()) or 1.0
+    lines = ["Profile:"]
+    for name, seconds in sections.items():
+        if name != 'total':
+            lines.append(f"  {name:<10} {seconds:10.4f}s  {100 * seconds / total:5.1f}%")
+    lines.append(f"  {'total':<10} {total:10.4f}s")
+    for name in ('next', 'broker'):
+        if name in profile:
+            stats = profile[name]
+            lines.append(f"  {name}() x{stats['calls']}: mean {stats['mean_us']}us, p50 {stats['p50_us']}us, "
+                         f"p99 {stats['p99_us']}us, max {stats['max_us']}us")
+    return "\n".join(lines)
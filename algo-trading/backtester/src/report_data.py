@@ -0,0 +1,73 @@
+import os
+import numpy as np
+import pandas as pd
+
+# 报告数据：权益曲线和交易记录以 parquet 列式格式保存，画图前用 LTTB 降采样。
+# 分钟级回测有上百万个点，全量画图比回测本身还慢，降到几千个点后形状基本不变。
+
+EQUITY_FILE = 'equity_curve.parquet'
+TRADES_FILE = 'trades.parquet'
+DEFAULT_MAX_POINTS = 2000
+
+
+def lttb_indices(y, n_out, x=None):
+    """Largest-Triangle-Three-Buckets: indices of `n_out` points that preserve the shape of `y`."""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+    # NaN 会让三角形面积失效，按 0 处理但仍保留原始索引
+    y = np.nan_to_num(y)
+
+    # 首尾两个点固定，中间 n - 2 个点平均分到 n_out - 2 个桶
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < n_out - 1:
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        bucket_x, bucket_y = x[start:end], y[start:end]
+        area = np.abs((x[prev] - avg_x) * (bucket_y - y[prev]) - (x[prev] - bucket_x) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        indices[i + 1] = prev
+    return indices
+
+
+def downsample(series, max_points=DEFAULT_MAX_POINTS):
+    """Downsample a Series for plotting with LTTB; short series are returned unchanged."""
+    if max_points is None or len(series) <= max_points:
+        return series
+    return series.iloc[lttb_indices(series.to_numpy(dtype=np.float64), max_points)]
+
+
+def save_report_data(results, results_dir):
+    """Write the equity curve and trades of a backtest result as parquet files."""
+    paths = {}
+    equity = results.get('_equity_curve')
+    if isinstance(equity, pd.DataFrame):
+        paths['equity'] = os.path.join(results_dir, EQUITY_FILE)
+        equity.to_parquet(paths['equity'])
+    trades = results.get('_trades')
+    if isinstance(trades, pd.DataFrame):
+        paths['trades'] = os.path.join(results_dir, TRADES_FILE)
+        # Tag 等对象列可能混有不同类型，统一转成字符串再写
+        trades = trades.copy()
+        for col in trades.columns[trades.dtypes == object]:
+            trades[col] = trades[col].map(lambda v: None if v is None else str(v))
+        trades.to_parquet(paths['trades'])
+    return paths
+
+
+def load_report_data(results_dir):
+    """Read back (equity_curve, trades) written by save_report_data; missing files give None."""
+    frames = []
+    for file_name in (EQUITY_FILE, TRADES_FILE):
+        path = os.path.join(results_dir, file_name)
+        frames.append(pd.read_parquet(path) if os.path.exists(path) else None)
+    return tuple(frames)
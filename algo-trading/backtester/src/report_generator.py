@@ -1,38 +1,105 @@
+import os
+import sys
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # 无界面渲染，容器里没有显示器
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+sys.path.append('/app')
+
+from src.report_data import DEFAULT_MAX_POINTS, downsample, load_report_data
+
+PLOT_FILES = {
+    'equity': 'equity_curve.png',
+    'drawdown': 'drawdown.png',
+    'monthly': 'monthly_returns_heatmap.png',
+}
+
+
+def monthly_returns(equity):
+    try:
+        month_end = equity.resample('ME').last()
+    except ValueError:
+        # 旧版 pandas 不认识 'ME'
+        month_end = equity.resample('M').last()
+    returns = month_end.pct_change()
+    return returns.groupby([returns.index.year, returns.index.month]).first().unstack()
+
+
+def make_figure(kind, data):
+    if kind == 'monthly':
+        fig, ax = plt.subplots(figsize=(12, 8))
+        sns.heatmap(data, annot=True, fmt='.2%', cmap='RdYlGn', ax=ax)
+        ax.set_title('Monthly Returns')
+        return fig
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    data.plot(ax=ax)
+    title, ylabel = ('Equity Curve', 'Equity') if kind == 'equity' else ('Drawdown', 'Drawdown %')
+    ax.set_title(title)
+    ax.set_xlabel('Date')
+    ax.set_ylabel(ylabel)
+    ax.grid(True)
+    return fig
+
+
+def _render(kind, data, path):
+    fig = make_figure(kind, data)
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+
+def render_plots(equity_curve, output_dir, max_points=DEFAULT_MAX_POINTS, n_jobs=1):
+    """Render the equity, drawdown and monthly-return figures to PNG files in `output_dir`.
+
+    Curves are downsampled to `max_points` with LTTB first; with n_jobs > 1 the figures
+    are rendered in separate processes.
+    """
+    jobs = [
+        ('equity', downsample(equity_curve['Equity'], max_points)),
+        ('drawdown', downsample(equity_curve['DrawdownPct'], max_points)),
+        ('monthly', monthly_returns(equity_curve['Equity'])),
+    ]
+    jobs = [(kind, data, os.path.join(output_dir, PLOT_FILES[kind])) for kind, data in jobs]
+    if n_jobs <= 1:
+        return [_render(*job) for job in jobs]
+
+    if 'fork' in mp.get_all_start_methods():
+        mp_context = mp.get_context('fork')
+    else:
+        mp_context = mp.get_context()
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(jobs)), mp_context=mp_context) as executor:
+        return list(executor.map(_render, *zip(*jobs)))
+
+
+def render_deferred(results_dir, max_points=DEFAULT_MAX_POINTS, n_jobs=1):
+    """Render plots later from the equity_curve.parquet saved by save_results(..., plot='none')."""
+    equity_curve, _ = load_report_data(results_dir)
+    if equity_curve is None:
+        raise FileNotFoundError(f"No equity curve saved in {results_dir}")
+    return render_plots(equity_curve, results_dir, max_points, n_jobs)
+
+
 class ReportGenerator:
-    def __init__(self, results, params):
+    def __init__(self, results, params, max_points=DEFAULT_MAX_POINTS, robustness=None):
         self.results = results
         self.params = params
+        self.max_points = max_points
+        # robustness.summarize() 的结果（可选），在报告中展示各指标的分布
+        self.robustness = robustness
 
     def generate_equity_curve_plot(self):
-        plt.figure(figsize=(12, 6))
-        self.results._equity_curve['Equity'].plot()
-        plt.title('Equity Curve')
-        plt.xlabel('Date')
-        plt.ylabel('Equity')
-        plt.grid(True)
-        return plt
+        return make_figure('equity', downsample(self.results._equity_curve['Equity'], self.max_points))
 
     def generate_drawdown_plot(self):
-        plt.figure(figsize=(12, 6))
-        self.results._equity_curve['DrawdownPct'].plot()
-        plt.title('Drawdown')
-        plt.xlabel('Date')
-        plt.ylabel('Drawdown %')
-        plt.grid(True)
-        return plt
+        return make_figure('drawdown', downsample(self.results._equity_curve['DrawdownPct'], self.max_points))
 
     def generate_monthly_returns_heatmap(self):
-        returns = self.results._equity_curve['Equity'].resample('M').last().pct_change()
-        returns = returns.groupby([returns.index.year, returns.index.month]).first().unstack()
-        
-        plt.figure(figsize=(12, 8))
-        sns.heatmap(returns, annot=True, fmt='.2%', cmap='RdYlGn')
-        plt.title('Monthly Returns')
-        return plt
+        return make_figure('monthly', monthly_returns(self.results._equity_curve['Equity']))
 
     def generate_html_report(self):
         metrics = {
@@ -48,6 +115,13 @@ class ReportGenerator:
             'Avg Trade Duration': str(self.results['Avg. Trade Duration']),
         }
 
+        robustness_html = ''
+        if self.robustness is not None:
+            robustness_html = f"""
+                <h2>Robustness (bootstrap)</h2>
+                {self.robustness.to_html(float_format=lambda v: f"{v:.2f}")}
+            """
+
         html_content = f"""
         <html>
             <head>
@@ -87,22 +161,36 @@ class ReportGenerator:
                 
                 <h2>Monthly Returns Heatmap</h2>
                 <img src="monthly_returns_heatmap.png" alt="Monthly Returns Heatmap">
+                {robustness_html}
             </body>
         </html>
         """
         return html_content
 
-    def save_report(self, output_dir):
+    def save_report(self, output_dir, n_jobs=1):
         # Save HTML report
         with open(f"{output_dir}/report.html", 'w') as f:
             f.write(self.generate_html_report())
         
         # Save plots
-        self.generate_equity_curve_plot().savefig(f"{output_dir}/equity_curve.png")
-        self.generate_drawdown_plot().savefig(f"{output_dir}/drawdown.png")
-        self.generate_monthly_returns_heatmap().savefig(f"{output_dir}/monthly_returns_heatmap.png")
+        render_plots(self.results._equity_curve, output_dir, self.max_points, n_jobs)
         
         # Save performance metrics as CSV
-        pd.Series(self.results._trade_data).to_csv(f"{output_dir}/performance_metrics.csv")
+        metrics = self.results[[key for key in self.results.index if not key.startswith('_')]]
+        metrics.to_csv(f"{output_dir}/performance_metrics.csv")
+        if self.robustness is not None:
+            self.robustness.to_csv(f"{output_dir}/robustness_summary.csv")
+
+        print(f"Report saved to {output_dir}")
+
+
+if __name__ == "__main__":
+    import argparse
 
-        print(f"Report saved to {output_dir}")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Render deferred backtest plots")
+    parser.add_argument('results_dir', nargs='?', default='/app/backtester')
+    parser.add_argument('--max-points', type=int, default=DEFAULT_MAX_POINTS)
+    parser.add_argument('--jobs', type=int, default=3)
+    args = parser.parse_args()
+    for path in render_deferred(args.results_dir, args.max_points, args.jobs):
+        print(f"Saved {path}")
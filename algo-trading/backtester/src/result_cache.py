@@ -0,0 +1,239 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+import weakref
+import numpy as np
+import pandas as pd
+from backtesting import Strategy
+
+from src.indicator_cache import fingerprint, _immutable
+
+CACHE_DIR = '/app/backtester/cache'
+
+# 回测结果磁盘缓存：键由策略源码、参数、手续费/初始资金和数据指纹共同决定，
+# 任意一项变化都会得到新的键，因此不需要手动判断缓存是否过期。
+# 目录结构：{cache_dir}/{策略源码哈希}/{结果键}.pkl
+#
+# 数据指纹按内容计算。参数扫描会对同一个 DataFrame 反复求键，只有每一列都由只读数组支撑时
+# （例如 bar_store 映射的快照）才记住整个 DataFrame 的指纹；可写的数据可能被原地修改，每次都重新求哈希。
+
+# id(DataFrame) -> (weakref, index, 各列的底层数组, fingerprint)
+_data_fingerprints = {}
+
+
+def _root(arr):
+    while isinstance(arr.base, np.ndarray):
+        arr = arr.base
+    return arr
+
+
+def _frame_arrays(data):
+    """Backing arrays of every column of `data`, or None if any of them can still be modified."""
+    arrays = []
+    for col in data.columns:
+        values = data[col].to_numpy()
+        if not isinstance(values, np.ndarray) or not _immutable(values):
+            return None
+        arrays.append(_root(values))
+    return arrays
+
+
+def data_fingerprint(data):
+    """Fingerprint of a backtest's input data, memoized only for frames backed by read-only arrays."""
+    if not isinstance(data, pd.DataFrame):
+        return repr(fingerprint(data))
+    arrays = _frame_arrays(data)
+    entry = _data_fingerprints.get(id(data)) if arrays is not None else None
+    # 列被替换（df['Close'] = ...）或索引被重设后底层数组/索引对象会变化，需要重新求指纹
+    if (entry is not None and entry[0]() is data and entry[1]() is data.index
+            and len(entry[2]) == len(arrays) and all(ref() is arr for ref, arr in zip(entry[2], arrays))):
+        return entry[3]
+    fp = repr(fingerprint(data))
+    if arrays is None:
+        return fp
+    try:
+        key = id(data)
+        ref = weakref.ref(data, lambda _, key=key: _data_fingerprints.pop(key, None))
+        _data_fingerprints[key] = (ref, weakref.ref(data.index), [weakref.ref(arr) for arr in arrays], fp)
+    except TypeError:
+        pass
+    return fp
+
+
+def strategy_source_hash(strategy_class):
+    """Hash the source file the strategy was loaded from (see load_strategy)."""
+    source_file = getattr(strategy_class, '_source_file', None)
+    digest = hashlib.sha256()
+    if source_file and os.path.exists(source_file):
+        with open(source_file, 'rb') as f:
+            digest.update(f.read())
+    else:
+        # 优化器动态生成的子类没有源码，参数已体现在结果键中，跳过即可
+        sources = []
+        for cls in strategy_class.__mro__:
+            if cls is Strategy:
+                break
+            try:
+                sources.append(inspect.getsource(cls))
+            except (OSError, TypeError):
+                continue
+        digest.update(''.join(sources or [strategy_class.__qualname__]).encode())
+    return digest.hexdigest()
+
+
+def strategy_params(strategy_class):
+    """Resolved public non-callable class attributes, including overrides from subclasses."""
+    params = {}
+    for name in dir(strategy_class):
+        if name.startswith('_') or hasattr(Strategy, name):
+            continue
+        value = getattr(strategy_class, name)
+        if callable(value) or isinstance(value, property):
+            continue
+        params[name] = value.item() if isinstance(value, np.generic) else value
+    return params
+
+
+def _json_default(value):
+    # 列表/元组/字典/None 由 json 直接处理，这里补上 numpy 类型；其余无法稳定序列化的值抛出 TypeError
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return {'ndarray': value.tolist(), 'dtype': value.dtype.str}
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    raise TypeError(f"{type(value).__name__} is not serializable")
+
+
+class ResultCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=2 * 1024 ** 3, evict_every=64):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # 淘汰需要扫描整个目录，每写入 evict_every 条才检查一次
+        self.evict_every = evict_every
+        self._puts = 0
+
+    def make_key(self, strategy_class, data, initial_capital, commission, engine='backtesting'):
+        """Cache key of one backtest, or None if a strategy parameter cannot be serialized (not cached)."""
+        source_hash = strategy_source_hash(strategy_class)
+        try:
+            payload = json.dumps({
+                'params': strategy_params(strategy_class),
+                'initial_capital': float(initial_capital),
+                'commission': float(commission),
+                'engine': engine,
+                'data': data_fingerprint(data),
+            }, sort_keys=True, default=_json_default)
+        except (TypeError, ValueError):
+            # 参数无法可靠地写进键时宁可不缓存，也不能让不同的设置共用一个键
+            return None
+        return f"{source_hash[:16]}/{hashlib.sha256((source_hash + payload).encode()).hexdigest()}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                results = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # 写入中断、pandas/numpy 升级后无法还原等：按未命中处理，删掉坏条目以便重新写入
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        os.utime(path)  # 记录最近使用时间，用于 LRU 淘汰
+        return results
+
+    def put(self, key, results):
+        results = results.copy()
+        # 策略实例不可序列化（类是动态创建的），只保存名称
+        strategy = results.get('_strategy')
+        if strategy is not None and not isinstance(strategy, str):
+            results['_strategy'] = type(strategy).__name__ if not isinstance(strategy, type) else strategy.__name__
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(results, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._puts += 1
+        if self._puts % self.evict_every == 0:
+            self.evict()
+
+    def _entries(self):
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for group in os.scandir(self.cache_dir):
+            if not group.is_dir():
+                continue
+            for entry in os.scandir(group.path):
+                if entry.name.endswith('.pkl'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def invalidate(self, strategy_class=None):
+        """Remove cached results of one strategy (its current source) or of everything."""
+        if strategy_class is None:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+        else:
+            shutil.rmtree(os.path.join(self.cache_dir, strategy_source_hash(strategy_class)[:16]),
+                          ignore_errors=True)
+
+
+def main():
+    from src.backtest_engine import load_strategy
+
+    parser = argparse.ArgumentParser(description="Manage the backtest result cache")
+    parser.add_argument('command', choices=['stats', 'clear', 'invalidate'])
+    parser.add_argument('strategy_file', nargs='?', help="strategy file for 'invalidate'")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    args = parser.parse_args()
+
+    cache = ResultCache(args.cache_dir)
+    if args.command == 'stats':
+        entries = cache._entries()
+        print(f"{len(entries)} cached results, {sum(size for _, size, _ in entries) / 1024 ** 2:.1f} MB "
+              f"in {args.cache_dir}")
+    elif args.command == 'clear':
+        cache.invalidate()
+        print(f"Cleared {args.cache_dir}")
+    else:
+        if not args.strategy_file:
+            parser.error("invalidate needs a strategy file")
+        cache.invalidate(load_strategy(args.strategy_file))
+        print(f"Invalidated cached results for {args.strategy_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import os
+import math
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.vector_engine import annual_trading_days
+
+# 回测结果稳健性分析：对交易收益或权益曲线的逐 K 线收益做重抽样，得到收益率、最大回撤和
+# 夏普比率的分布。每一批模拟是一个 (模拟次数 x 长度) 的二维数组，一次性用 numpy 计算，
+# 没有逐次模拟的 Python 循环；批次大小受内存上限控制，也可以分给多个进程。
+#
+# method:
+#   block     对权益曲线的逐 K 线收益做移动块重抽样（保留短期自相关），默认
+#   bootstrap 对交易收益有放回抽样
+#   shuffle   打乱交易顺序（总收益不变，只看回撤对顺序的敏感度）
+
+METHODS = ('block', 'bootstrap', 'shuffle')
+METRICS = ['Return [%]', 'Max. Drawdown [%]', 'Sharpe Ratio']
+MAX_BATCH_ELEMENTS = 20_000_000
+
+
+def periods_per_year(index):
+    """Bars per year on the calendar the backtest statistics annualize with (252 or 365 trading days)."""
+    if not isinstance(index, pd.DatetimeIndex) or len(index) < 2:
+        return 252
+    # 每个交易日实际出现的 K 线数乘以一年的交易日数，与回测的夏普比率使用同一个年化基准
+    bars_per_day = len(index) / index.normalize().nunique()
+    return annual_trading_days(index) * bars_per_day
+
+
+def path_metrics(returns, annualization=None):
+    """Return, max drawdown and Sharpe for each row of a (simulations x periods) returns matrix."""
+    paths = np.cumprod(1 + returns, axis=1)
+    peaks = np.maximum.accumulate(np.maximum(paths, 1.0), axis=1)
+    metrics = {
+        'Return [%]': (paths[:, -1] - 1) * 100,
+        'Max. Drawdown [%]': np.minimum((paths / peaks - 1).min(axis=1), 0) * 100,
+    }
+    if annualization is None:
+        metrics['Sharpe Ratio'] = np.full(len(returns), np.nan)
+    else:
+        std = returns.std(axis=1, ddof=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics['Sharpe Ratio'] = np.where(std > 0, returns.mean(axis=1) / std * math.sqrt(annualization), np.nan)
+    return metrics
+
+
+def resample_indices(rng, n, n_sims, method, block_size=1):
+    if method == 'shuffle':
+        return np.argsort(rng.random((n_sims, n)), axis=1)
+    if method == 'bootstrap' or block_size <= 1:
+        return rng.integers(0, n, (n_sims, n))
+    # 移动块重抽样：随机选取块起点，拼接后截断到原长度
+    block_size = min(block_size, n)
+    n_blocks = math.ceil(n / block_size)
+    starts = rng.integers(0, n - block_size + 1, (n_sims, n_blocks))
+    return (starts[:, :, None] + np.arange(block_size)).reshape(n_sims, -1)[:, :n]
+
+
+def _simulate(returns, n_sims, method, block_size, annualization, seed):
+    rng = np.random.default_rng(seed)
+    batch = max(1, MAX_BATCH_ELEMENTS // max(len(returns), 1))
+    parts = []
+    for start in range(0, n_sims, batch):
+        idx = resample_indices(rng, len(returns), min(batch, n_sims - start), method, block_size)
+        parts.append(pd.DataFrame(path_metrics(returns[idx], annualization)))
+    return pd.concat(parts, ignore_index=True)
+
+
+def _sample_returns(results, method):
+    if method == 'block':
+        equity = results['_equity_curve']['Equity']
+        returns = equity.pct_change().dropna().to_numpy(dtype=float)
+        return returns, periods_per_year(equity.index)
+    returns = results['_trades']['ReturnPct'].to_numpy(dtype=float)
+    # 交易序列没有固定时间间隔，不计算夏普
+    return returns, None
+
+
+def simulate(results, n_sims=1000, method='block', block_size=None, seed=0, n_jobs=1):
+    """Run `n_sims` resampling simulations and return one row of metrics per simulation."""
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    returns, annualization = _sample_returns(results, method)
+    if len(returns) < 2:
+        raise ValueError("Not enough trades or bars to resample")
+    if block_size is None:
+        # 常用经验值：块长约为样本长度的立方根
+        block_size = max(1, round(len(returns) ** (1 / 3))) if method == 'block' else 1
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = max(1, min(n_jobs, n_sims))
+    seeds = np.random.SeedSequence(seed).spawn(n_jobs)
+    counts = [n_sims // n_jobs + (i < n_sims % n_jobs) for i in range(n_jobs)]
+    if n_jobs == 1:
+        return _simulate(returns, n_sims, method, block_size, annualization, seeds[0])
+
+    if 'fork' in mp.get_all_start_methods():
+        mp_context = mp.get_context('fork')
+    else:
+        mp_context = mp.get_context()
+    with ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp_context) as executor:
+        parts = executor.map(_simulate, [returns] * n_jobs, counts, [method] * n_jobs, [block_size] * n_jobs,
+                             [annualization] * n_jobs, seeds)
+        return pd.concat(list(parts), ignore_index=True)
+
+
+def summarize(samples, results=None, method='block', confidence=0.95):
+    """Mean, std and confidence interval of each metric; `actual` is the metric of the original path."""
+    lower, upper = (1 - confidence) / 2, 1 - (1 - confidence) / 2
+    summary = pd.DataFrame({
+        'mean': samples.mean(),
+        'std': samples.std(),
+        f'p{lower * 100:g}': samples.quantile(lower),
+        'p50': samples.median(),
+        f'p{upper * 100:g}': samples.quantile(upper),
+    })
+    if results is not None:
+        returns, annualization = _sample_returns(results, method)
+        actual = path_metrics(returns[None, :], annualization)
+        summary['actual'] = [actual[metric][0] for metric in summary.index]
+    return summary
+
+
+def robustness_analysis(results, n_sims=1000, method='block', block_size=None, seed=0, n_jobs=1, confidence=0.95):
+    """Bootstrap a backtest result; returns (summary, samples)."""
+    samples = simulate(results, n_sims, method, block_size, seed, n_jobs)
+    return summarize(samples, results, method, confidence), samples
+
+
+def save_robustness(summary, results_dir):
+    path = os.path.join(results_dir, 'robustness_summary.csv')
+    summary.to_csv(path)
+    return path
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+
+
+def share_dataframe(df):
+    """Copy an OHLCV DataFrame into one shared memory block.
+
+    Returns the SharedMemory object (the caller owns it and must close/unlink it)
+    and a small picklable description that workers pass to `attach_dataframe`.
+    """
+    index = pd.DatetimeIndex(df.index) if not isinstance(df.index, pd.DatetimeIndex) else df.index
+    arrays = [('__index', index.values.astype('datetime64[ns]').view('int64'))]
+    arrays += [(col, np.ascontiguousarray(df[col].to_numpy())) for col in df.columns]
+
+    layout = []
+    offset = 0
+    for name, arr in arrays:
+        # 8 字节对齐，保证每列都能直接映射成 ndarray
+        offset = (offset + 7) // 8 * 8
+        layout.append((name, arr.dtype.str, len(arr), offset))
+        offset += arr.nbytes
+
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for (name, dtype, length, start), (_, arr) in zip(layout, arrays):
+        view = np.ndarray((length,), dtype=dtype, buffer=shm.buf, offset=start)
+        view[:] = arr
+
+    meta = {
+        'name': shm.name,
+        'layout': layout,
+        'tz': str(index.tz) if index.tz is not None else None,
+        'index_name': df.index.name,
+    }
+    return shm, meta
+
+
+def attach_dataframe(meta):
+    """Rebuild the DataFrame described by `meta` from shared memory.
+
+    Returns (df, shm); keep `shm` referenced for as long as `df` is in use.
+    """
+    shm = shared_memory.SharedMemory(name=meta['name'])
+    columns = {}
+    index = None
+    for name, dtype, length, start in meta['layout']:
+        view = np.ndarray((length,), dtype=dtype, buffer=shm.buf, offset=start)
+        if name == '__index':
+            index = pd.DatetimeIndex(view.view('datetime64[ns]'), name=meta['index_name'])
+            if meta['tz']:
+                index = index.tz_localize('UTC').tz_convert(meta['tz'])
+        else:
+            columns[name] = view
+    df = pd.DataFrame(columns, index=index)
+    return df, shm
@@ -8,11 +8,16 @@ import warnings
 import inspect
 import glob
 import re
+import math
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Add the project root to the Python path
 sys.path.append('/app')
 
 from src.backtest_engine import load_data, load_strategy, run_backtest
+from src.shared_data import share_dataframe, attach_dataframe
+from src.result_cache import ResultCache
 
 # Suppress FutureWarning from pandas
 warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -39,29 +44,116 @@ def generate_param_grid(default_params, user_inputs):
             param_grid[param] = np.arange(min_value, max_value + step / 2, step)  # Add step/2 to include max_value
     return param_grid
 
-def optimize_strategy(data, strategy_class, param_grid, initial_capital, commission, filter_conditions):
-    results = []
-    
-    for params in product(*param_grid.values()):
-        param_dict = dict(zip(param_grid.keys(), params))
-        
-        optimized_strategy = type('OptimizedStrategy', (strategy_class,), param_dict)
-        
-        _, result = run_backtest(optimized_strategy, data, initial_capital, commission)
-        
-        # Check if the result meets the filter conditions
-        if all(result[metric] >= value for metric, value in filter_conditions.items()):
-            result_dict = {
-                **param_dict,
-                'total_return': result['Return [%]'],
-                'sharpe_ratio': result['Sharpe Ratio'],
-                'max_drawdown': result['Max. Drawdown [%]'],
-                'win_rate': result['Win Rate [%]'],
-                'num_trades': result['# Trades'],
-                'exposure_time': result['Exposure Time [%]']
-            }
-            results.append(result_dict)
-    
+def evaluate_params(data, strategy_class, param_dict, initial_capital, commission, filter_conditions,
+                    engine='backtesting', cache=None):
+    """Run one parameter combination and return its result row, or None if filtered out."""
+    optimized_strategy = type('OptimizedStrategy', (strategy_class,), param_dict)
+
+    _, result = run_backtest(optimized_strategy, data, initial_capital, commission, engine=engine, cache=cache)
+
+    # Check if the result meets the filter conditions
+    if not all(result[metric] >= value for metric, value in filter_conditions.items()):
+        return None
+    return {
+        **param_dict,
+        'total_return': result['Return [%]'],
+        'sharpe_ratio': result['Sharpe Ratio'],
+        'max_drawdown': result['Max. Drawdown [%]'],
+        'win_rate': result['Win Rate [%]'],
+        'num_trades': result['# Trades'],
+        'exposure_time': result['Exposure Time [%]']
+    }
+
+# 每个工作进程只在启动时挂载一次共享数据，之后的任务只传参数
+_worker_state = {}
+
+def _init_worker(data_meta, strategy_ref, initial_capital, commission, filter_conditions, engine, cache):
+    data, shm = attach_dataframe(data_meta)
+    strategy_class = load_strategy(strategy_ref) if isinstance(strategy_ref, str) else strategy_ref
+    _worker_state.update(
+        data=data, shm=shm, strategy_class=strategy_class, initial_capital=initial_capital,
+        commission=commission, filter_conditions=filter_conditions, engine=engine, cache=cache)
+
+def _run_chunk(chunk):
+    state = _worker_state
+    rows = []
+    for idx, param_dict in chunk:
+        row = evaluate_params(state['data'], state['strategy_class'], param_dict,
+                              state['initial_capital'], state['commission'], state['filter_conditions'],
+                              state['engine'], state['cache'])
+        rows.append((idx, row))
+    return rows
+
+def _strategy_ref(strategy_class, mp_context):
+    # fork 子进程直接继承类对象；spawn/forkserver 需要在子进程里按文件重新加载
+    if mp_context.get_start_method() == 'fork':
+        return strategy_class
+    source_file = getattr(strategy_class, '_source_file', None)
+    if source_file is None:
+        raise ValueError(f"Cannot ship {strategy_class.__name__} to worker processes: "
+                         "load it with load_strategy() or use n_jobs=1")
+    return source_file
+
+def evaluate_param_sets(data, strategy_class, param_dicts, initial_capital, commission, filter_conditions,
+                        n_jobs=1, chunksize=None, engine='backtesting', cache=None):
+    """Backtest a list of parameter dicts and return the result rows in input order.
+
+    Filtered-out combinations are dropped. n_jobs > 1 (or -1 for all cores) spreads
+    the work over a process pool; the data is placed in shared memory once.
+    """
+    tasks = list(enumerate(param_dicts))
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(tasks))
+
+    if n_jobs <= 1:
+        results = []
+        for _, param_dict in tasks:
+            row = evaluate_params(data, strategy_class, param_dict, initial_capital, commission, filter_conditions,
+                                  engine, cache)
+            if row is not None:
+                results.append(row)
+        return results
+
+    if chunksize is None:
+        chunksize = max(1, math.ceil(len(tasks) / (n_jobs * 4)))
+    chunks = [tasks[i:i + chunksize] for i in range(0, len(tasks), chunksize)]
+
+    if 'fork' in mp.get_all_start_methods():
+        mp_context = mp.get_context('fork')
+    else:
+        mp_context = mp.get_context()
+    shm, data_meta = share_dataframe(data)
+    rows = {}
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp_context, initializer=_init_worker,
+                                 initargs=(data_meta, _strategy_ref(strategy_class, mp_context),
+                                           initial_capital, commission, filter_conditions, engine,
+                                           cache)) as executor:
+            futures = [executor.submit(_run_chunk, chunk) for chunk in chunks]
+            done = 0
+            for future in as_completed(futures):
+                for idx, row in future.result():
+                    done += 1
+                    if row is not None:
+                        rows[idx] = row
+                print(f"Completed {done}/{len(tasks)} combinations")
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return [rows[idx] for idx in sorted(rows)]
+
+def optimize_strategy(data, strategy_class, param_grid, initial_capital, commission, filter_conditions,
+                      n_jobs=1, chunksize=None, engine='backtesting', cache=None):
+    """Backtest every combination in `param_grid`.
+
+    The rows are returned in grid order whether or not a process pool is used.
+    """
+    param_dicts = [dict(zip(param_grid.keys(), params)) for params in product(*param_grid.values())]
+    results = evaluate_param_sets(data, strategy_class, param_dicts, initial_capital, commission, filter_conditions,
+                                  n_jobs=n_jobs, chunksize=chunksize, engine=engine, cache=cache)
     return pd.DataFrame(results)
 
 def get_user_input(default_params):
@@ -113,6 +205,33 @@ def format_param_range(param_range):
     else:
         return str(param_range)
 
+def _window_size(value):
+    # 纯数字表示 K 线根数，否则按时间长度解析（例如 180D）
+    return int(value) if value.isdigit() else value
+
+def run_walk_forward(data, strategy_file, strategy_class, param_grid, asset, interval, initial_capital, commission,
+                     filter_conditions, n_jobs, engine, cache):
+    from src.walk_forward import walk_forward, summarize
+    in_sample = _window_size(input("In-sample window (bars or duration, default 365D): ").strip() or '365D')
+    out_of_sample = _window_size(input("Out-of-sample window (bars or duration, default 90D): ").strip() or '90D')
+    anchored = input("Anchored in-sample windows? (y/N): ").strip().lower() == 'y'
+    metric = input("Metric to maximize in sample (default total_return): ").strip() or 'total_return'
+
+    windows, equity = walk_forward(data, strategy_class, param_grid, initial_capital, commission, in_sample,
+                                   out_of_sample, anchored=anchored, metric=metric,
+                                   filter_conditions=filter_conditions, n_jobs=n_jobs, engine=engine, cache=cache)
+    summary = summarize(windows, equity, initial_capital)
+
+    output_dir = '/app/backtester'
+    os.makedirs(output_dir, exist_ok=True)
+    name = f"walkforward_{os.path.basename(strategy_file).split('_')[1]}_{asset.upper()}_{interval.upper()}"
+    windows.to_csv(os.path.join(output_dir, f'{name}_windows.csv'), index=False)
+    equity.rename('Equity').to_csv(os.path.join(output_dir, f'{name}_equity.csv'))
+
+    print(windows.to_string(index=False))
+    print('\n'.join(f"{k}: {v}" for k, v in summary.items()))
+    print(f"\nWalk-forward results saved to: {os.path.join(output_dir, name)}_*.csv")
+
 def main():
     try:
         strategy_file = select_strategy()
@@ -130,7 +249,29 @@ def main():
         
         param_grid = generate_param_grid(default_params, user_inputs)
         
-        results = optimize_strategy(data, strategy_class, param_grid, initial_capital, commission, filter_conditions)
+        n_jobs = int(input("Enter number of worker processes (default 1, -1 for all cores): ") or 1)
+        engine = 'backtesting'
+        if hasattr(strategy_class, 'generate_signals'):
+            if input("Use the vectorized engine? (y/N): ").strip().lower() == 'y':
+                engine = 'vectorized'
+        # 未变化的策略/数据/参数直接读取磁盘缓存
+        cache = ResultCache()
+        method = input("Search method (grid/halving/walkforward, default grid): ").strip().lower() or 'grid'
+        if method == 'walkforward':
+            run_walk_forward(data, strategy_file, strategy_class, param_grid, asset, interval, initial_capital,
+                             commission, filter_conditions, n_jobs, engine, cache)
+            return
+        if method == 'halving':
+            from src.adaptive_search import successive_halving
+            max_evals = input("Maximum number of backtests (default unlimited): ").strip()
+            max_seconds = input("Maximum search time in seconds (default unlimited): ").strip()
+            results = successive_halving(data, strategy_class, param_grid, initial_capital, commission,
+                                         filter_conditions, max_evals=int(max_evals) if max_evals else None,
+                                         max_seconds=float(max_seconds) if max_seconds else None,
+                                         n_jobs=n_jobs, engine=engine, cache=cache)
+        else:
+            results = optimize_strategy(data, strategy_class, param_grid, initial_capital, commission,
+                                        filter_conditions, n_jobs=n_jobs, engine=engine, cache=cache)
         
         if results.empty:
             print("No results found that meet the specified criteria. Try relaxing your filter conditions.")
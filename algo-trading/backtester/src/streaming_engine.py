@@ -0,0 +1,260 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.backtest_engine import find_data_path, PRICE_COLUMNS
+from src.data_catalog import dataset_files
+from src.result_cache import strategy_params
+from src.vector_engine import drawdowns, return_stats, trade_stats
+
+# 分块流式回测：逐个 row group 读取 parquet，每块只在内存里保留紧凑的 float32 价格和
+# int64 纳秒时间戳，持仓、权益、回撤等状态跨块传递，峰值内存与历史长度无关。
+#
+# 只支持实现了 generate_signals 的策略（backtesting.py 的事件引擎需要整段数据）。
+# 信号计算时在每块前面拼上上一块末尾的 lookback 根 K 线，保证滚动指标与整段计算一致；
+# 策略可以用类属性 lookback 指定，否则取最大的整数参数 + 1。
+# 成交模型与 vector_engine 相同：收盘信号，下一根开盘成交，只做多。
+
+DEFAULT_CHUNK_ROWS = 20000
+DEFAULT_EQUITY_FREQ = '1h'
+
+
+def _strategy_lookback(strategy_class):
+    lookback = getattr(strategy_class, 'lookback', None)
+    if lookback is None:
+        lookback = max([v for v in strategy_params(strategy_class).values()
+                        if isinstance(v, (int, np.integer)) and not isinstance(v, bool)], default=0) + 1
+    return int(lookback)
+
+
+def _localize(ts, tz):
+    ts = pd.Timestamp(ts)
+    if tz is not None and ts.tz is None:
+        return ts.tz_localize(tz)
+    if tz is None and ts.tz is not None:
+        return ts.tz_localize(None)
+    return ts
+
+
+def iter_chunks(data_path, start=None, end=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield OHLCV DataFrames (float32 prices, int64 volume) of at most `chunk_rows` rows.
+
+    Row groups whose date statistics fall outside [start, end] are never read. `data_path`
+    may be a partitioned dataset directory, whose fragments are streamed in date order.
+    """
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    for path in dataset_files(data_path, start, end):
+        yield from _iter_file_chunks(path, start, end, chunk_rows)
+
+
+def _iter_file_chunks(data_path, start, end, chunk_rows):
+    parquet_file = pq.ParquetFile(data_path)
+    schema = parquet_file.schema_arrow
+    names = {name.lower(): name for name in schema.names}
+    if 'date' not in names:
+        raise ValueError(f"{data_path} has no date column; streaming needs the datahub file layout")
+    date_col = names['date']
+    columns = [date_col] + [names[col.lower()] for col in PRICE_COLUMNS + ['Volume'] if col.lower() in names]
+    date_type = schema.field(date_col).type
+    tz = date_type.tz if pa.types.is_timestamp(date_type) else None
+    start = _localize(start, tz) if start is not None else None
+    end = _localize(end, tz) if end is not None else None
+
+    date_idx = schema.names.index(date_col)
+    row_groups = []
+    for i in range(parquet_file.metadata.num_row_groups):
+        stats = parquet_file.metadata.row_group(i).column(date_idx).statistics
+        if stats is not None and stats.has_min_max and pa.types.is_timestamp(date_type):
+            if (end is not None and _localize(stats.min, tz) > end) or \
+                    (start is not None and _localize(stats.max, tz) < start):
+                continue
+        row_groups.append(i)
+    if not row_groups:
+        return
+
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows, row_groups=row_groups, columns=columns):
+        df = batch.to_pandas()
+        df.columns = df.columns.str.capitalize()
+        index = pd.DatetimeIndex(pd.to_datetime(df.pop('Date')), name='Date')
+        mask = np.ones(len(index), dtype=bool)
+        if start is not None:
+            mask &= index >= start
+        if end is not None:
+            mask &= index <= end
+        if not mask.any():
+            continue
+        chunk = pd.DataFrame({col: df[col].to_numpy()[mask].astype(np.float32) for col in PRICE_COLUMNS},
+                             index=index[mask])
+        if 'Volume' in df.columns:
+            volume = df['Volume'].to_numpy()[mask]
+            chunk['Volume'] = volume.astype(np.int64) if np.array_equal(volume, np.round(volume)) else \
+                volume.astype(np.float32)
+        yield chunk
+
+
+class StreamingSimulator:
+    """Long-only position simulation whose state carries over from one chunk to the next."""
+
+    def __init__(self, initial_capital, commission, size=0.9999, equity_freq=DEFAULT_EQUITY_FREQ):
+        self.initial_capital = float(initial_capital)
+        self.commission = commission
+        self.size = size
+        self.freq_ns = pd.Timedelta(equity_freq).value
+        self.target = 0.0
+        self.held = False
+        self.start_equity = self.initial_capital  # 当前持仓开仓时的权益，空仓时即当前权益
+        self.entry_price = np.nan
+        self.entry_bar = -1
+        self.entry_time = None
+        self.n_bars = 0
+        self.held_bars = 0
+        self.equity = self.initial_capital
+        self.peak = self.initial_capital
+        self.max_dd = 0.0
+        self.first_close = None
+        self.last_close = None
+        self.trades = []
+        self._equity_times = []
+        self._equity_values = []
+
+    def update(self, times, open_prices, close_prices, entries, exits):
+        n = len(times)
+        if n == 0:
+            return
+        target = np.where(exits, 0.0, np.where(entries, 1.0, np.nan))
+        if np.isnan(target[0]):
+            target[0] = self.target
+        target = pd.Series(target).ffill().to_numpy()
+
+        # 信号在下一根 K 线开盘成交；本块第一根使用上一块最后的信号
+        held = np.r_[self.target, target[:-1]] > 0
+        prev_held = np.r_[self.held, held[:-1]]
+        entry_bars = np.flatnonzero(held & ~prev_held)
+        exit_bars = np.flatnonzero(~held & prev_held)
+        carried = 1 if self.held else 0
+
+        entry_px = np.r_[[self.entry_price] * carried, open_prices[entry_bars] * (1 + self.commission)]
+        exit_px = open_prices[exit_bars] * (1 - self.commission)
+        n_closed = len(exit_bars)
+        trade_returns = exit_px / entry_px[:n_closed] - 1
+        start_equity = self.start_equity * np.r_[1.0, np.cumprod(1 + self.size * trade_returns)]
+
+        flat_equity = start_equity[np.cumsum(~held & prev_held)]
+        if len(entry_px):
+            trade_id = np.maximum(np.cumsum(held & ~prev_held) + carried - 1, 0)
+            held_equity = start_equity[trade_id] * (1 - self.size + self.size * close_prices / entry_px[trade_id])
+            equity = np.where(held, held_equity, flat_equity)
+        else:
+            equity = flat_equity
+
+        entry_bar_ids = np.r_[[self.entry_bar] * carried, self.n_bars + entry_bars].astype(np.int64)
+        entry_times = [self.entry_time] * carried + list(times[entry_bars])
+        for k in range(n_closed):
+            self.trades.append((start_equity[k] * self.size / entry_px[k], entry_bar_ids[k], self.n_bars + exit_bars[k],
+                                entry_px[k], exit_px[k], start_equity[k] * self.size * trade_returns[k],
+                                trade_returns[k], entry_times[k], times[exit_bars[k]]))
+
+        if held[-1]:
+            self.entry_price = entry_px[-1]
+            self.entry_bar = entry_bar_ids[-1]
+            self.entry_time = entry_times[-1]
+            self.start_equity = start_equity[len(entry_px) - 1]
+        else:
+            self.start_equity = start_equity[n_closed]
+
+        peaks = np.maximum.accumulate(np.r_[self.peak, equity])[1:]
+        self.max_dd = max(self.max_dd, float((1 - equity / peaks).max()))
+        self.peak = float(peaks[-1])
+        self.target = float(target[-1])
+        self.held = bool(held[-1])
+        self.held_bars += int(held.sum())
+        self.n_bars += n
+        self.equity = float(equity[-1])
+        if self.first_close is None:
+            self.first_close = float(close_prices[0])
+        self.last_close = float(close_prices[-1])
+
+        # 权益曲线只按 equity_freq 保留每个时间段的最后一个值
+        buckets = times // self.freq_ns
+        last = np.flatnonzero(np.r_[buckets[1:] != buckets[:-1], True])
+        self._equity_times.append(times[last])
+        self._equity_values.append(equity[last])
+
+    def equity_curve(self, tz=None):
+        times = np.concatenate(self._equity_times)
+        values = np.concatenate(self._equity_values)
+        # 同一时间段跨两个块时保留后一个值
+        keep = np.r_[times[1:] // self.freq_ns != times[:-1] // self.freq_ns, True]
+        index = pd.DatetimeIndex(pd.to_datetime(times[keep]), name='Date')
+        if tz is not None:
+            index = index.tz_localize('UTC').tz_convert(tz)
+        return pd.Series(values[keep], index=index)
+
+    def results(self, tz=None, strategy=None):
+        if self.n_bars == 0:
+            raise ValueError("No data in the requested range")
+        equity = self.equity_curve(tz)
+        values = equity.to_numpy()
+        dd, dd_dur, dd_peaks = drawdowns(values, equity.index)
+        equity_df = pd.DataFrame({'Equity': values, 'DrawdownPct': dd, 'DrawdownDuration': dd_dur},
+                                 index=equity.index)
+
+        trades_df = pd.DataFrame(self.trades, columns=['Size', 'EntryBar', 'ExitBar', 'EntryPrice', 'ExitPrice',
+                                                       'PnL', 'ReturnPct', 'EntryTime', 'ExitTime'])
+        for col in ('EntryTime', 'ExitTime'):
+            trades_df[col] = pd.to_datetime(trades_df[col].astype(np.int64))
+            if tz is not None:
+                trades_df[col] = trades_df[col].dt.tz_localize('UTC').dt.tz_convert(tz)
+        trades_df['Duration'] = trades_df['ExitTime'] - trades_df['EntryTime']
+
+        s = {}
+        s['Start'] = equity.index[0]
+        s['End'] = equity.index[-1]
+        s['Duration'] = s['End'] - s['Start']
+        s['Exposure Time [%]'] = self.held_bars / self.n_bars * 100
+        s['Equity Final [$]'] = self.equity
+        s['Equity Peak [$]'] = self.peak
+        s['Return [%]'] = (self.equity - self.initial_capital) / self.initial_capital * 100
+        s['Buy & Hold Return [%]'] = (self.last_close - self.first_close) / self.first_close * 100
+        s.update(return_stats(equity_df, dd_peaks))
+        # 逐根 K 线跟踪的回撤是精确值，覆盖按 equity_freq 采样后的近似值
+        s['Max. Drawdown [%]'] = -self.max_dd * 100
+        s.update(trade_stats(trades_df))
+        s['_strategy'] = strategy
+        s['_equity_curve'] = equity_df
+        s['_trades'] = trades_df
+        return pd.Series(s, dtype=object)
+
+
+def run_streaming_backtest(strategy_class, chunks, initial_capital, commission, size=0.9999,
+                           equity_freq=DEFAULT_EQUITY_FREQ):
+    """Backtest `strategy_class.generate_signals` over an iterable of OHLCV chunks."""
+    if not hasattr(strategy_class, 'generate_signals'):
+        raise TypeError(f"{strategy_class.__name__} does not implement generate_signals() for streaming backtests")
+    lookback = _strategy_lookback(strategy_class)
+    simulator = StreamingSimulator(initial_capital, commission, size, equity_freq)
+    tail = None
+    tz = None
+    for chunk in chunks:
+        tz = chunk.index.tz
+        frame = chunk if tail is None or not len(tail) else pd.concat([tail, chunk])
+        entries, exits = strategy_class.generate_signals(frame)
+        entries = np.asarray(entries, dtype=bool)[-len(chunk):]
+        exits = np.asarray(exits, dtype=bool)[-len(chunk):]
+        times = chunk.index.values.astype('datetime64[ns]').view('int64') if tz is None else \
+            chunk.index.tz_convert('UTC').tz_localize(None).values.astype('datetime64[ns]').view('int64')
+        simulator.update(times, chunk['Open'].to_numpy(dtype=np.float64), chunk['Close'].to_numpy(dtype=np.float64),
+                         entries, exits)
+        tail = frame.iloc[-lookback:] if lookback else None
+    return simulator.results(tz, strategy=strategy_class.__name__)
+
+
+def stream_backtest(strategy_class, asset, interval, start_date, end_date, initial_capital, commission,
+                    chunk_rows=DEFAULT_CHUNK_ROWS, equity_freq=DEFAULT_EQUITY_FREQ):
+    """Locate the datahub file for asset/interval and backtest it chunk by chunk."""
+    start, end = pd.to_datetime(start_date), pd.to_datetime(end_date)
+    data_path = find_data_path(asset, interval, start, end)
+    return run_streaming_backtest(strategy_class, iter_chunks(data_path, start, end, chunk_rows),
+                                  initial_capital, commission, equity_freq=equity_freq)
@@ -0,0 +1,202 @@
+import numpy as np
+import pandas as pd
+
+# 向量化回测引擎：适用于可以一次性对整列数据计算出买卖信号的策略（例如均线交叉）。
+# 策略类需要提供 classmethod `generate_signals(cls, data)`，返回 (entries, exits) 两个布尔序列。
+# 成交规则与 backtesting.py 默认设置一致：第 t 根 K 线收盘产生的信号在第 t+1 根开盘成交，
+# 手续费按比例计入成交价格，只做多。
+
+
+def _as_bool_array(signal, n):
+    values = np.asarray(signal)
+    if values.dtype != bool:
+        values = np.nan_to_num(values.astype(float)) != 0
+    if values.shape != (n,):
+        raise ValueError(f"Signal length {values.shape} does not match data length {n}")
+    return values
+
+
+def _geometric_mean(returns):
+    returns = np.nan_to_num(np.asarray(returns, dtype=float)) + 1
+    if not len(returns) or np.any(returns <= 0):
+        return 0
+    return np.exp(np.log(returns).sum() / len(returns)) - 1
+
+
+def simulate_positions(open_prices, close_prices, entries, exits, initial_capital, commission, size=0.9999):
+    """Simulate a long-only position from entry/exit signals with array operations.
+
+    Returns (equity, trades) where `equity` is the mark-to-market equity per bar and
+    `trades` is a dict of per-trade arrays. Exits take precedence over entries on the same bar.
+    """
+    n = len(close_prices)
+    target = np.where(exits, 0.0, np.where(entries, 1.0, np.nan))
+    target = pd.Series(target).ffill().fillna(0).to_numpy()
+
+    # 信号在下一根 K 线开盘成交
+    held = np.zeros(n, dtype=bool)
+    held[1:] = target[:-1] > 0
+    prev_held = np.r_[False, held[:-1]]
+    entry_bars = np.flatnonzero(held & ~prev_held)
+    exit_bars = np.flatnonzero(~held & prev_held)
+    n_closed = len(exit_bars)
+
+    entry_px = open_prices[entry_bars] * (1 + commission)
+    exit_px = open_prices[exit_bars] * (1 - commission)
+    trade_returns = exit_px / entry_px[:n_closed] - 1
+    growth = 1 + size * trade_returns
+    # start_equity[k] 为第 k 笔交易开仓前的权益
+    start_equity = initial_capital * np.r_[1.0, np.cumprod(growth)]
+
+    flat_equity = start_equity[np.cumsum(~held & prev_held)]
+    trade_id = np.maximum(np.cumsum(held & ~prev_held) - 1, 0)
+    if len(entry_bars):
+        held_equity = start_equity[trade_id] * (1 - size + size * close_prices / entry_px[trade_id])
+    else:
+        held_equity = flat_equity
+    equity = np.where(held, held_equity, flat_equity)
+
+    trade_start = start_equity[:n_closed]
+    trades = {
+        'Size': trade_start * size / entry_px[:n_closed],
+        'EntryBar': entry_bars[:n_closed],
+        'ExitBar': exit_bars,
+        'EntryPrice': entry_px[:n_closed],
+        'ExitPrice': exit_px,
+        'PnL': trade_start * size * trade_returns,
+        'ReturnPct': trade_returns,
+    }
+    return equity, trades
+
+
+def drawdowns(equity, index):
+    """Drawdown fraction per bar, drawdown durations at the recovery bars and the depth of each drawdown."""
+    n = len(equity)
+    peak = np.maximum.accumulate(equity)
+    dd = 1 - equity / peak
+
+    # 回撤区间：相邻两个创新高点之间
+    zero_pos = np.unique(np.r_[np.flatnonzero(dd == 0), n - 1])
+    prev, cur = zero_pos[:-1], zero_pos[1:]
+    mask = cur > prev + 1
+    dd_dur = pd.Series(np.nan, index=index)
+    dd_peaks = np.array([])
+    if mask.any():
+        durations = index[cur[mask]] - index[prev[mask]]
+        dd_dur = pd.Series(pd.NaT, index=index, dtype=durations.dtype)
+        dd_dur.iloc[cur[mask]] = durations
+        dd_peaks = np.maximum.reduceat(dd, prev)[mask]
+    return dd, dd_dur, dd_peaks
+
+
+def annual_trading_days(index):
+    """Trading days per year as backtesting.py assumes: 365 when the data has weekend bars, else 252."""
+    have_weekends = (index.dayofweek >= 5).mean() > 2 / 7 * .6
+    return 365 if have_weekends else 252
+
+
+def return_stats(equity_df, dd_peaks):
+    """Annualized return/risk ratios and drawdown stats computed like backtesting.py."""
+    index = equity_df.index
+    dd = equity_df['DrawdownPct'].to_numpy()
+    dd_dur = equity_df['DrawdownDuration']
+
+    s = {}
+    gmean_day_return = 0
+    day_returns = np.array(np.nan)
+    trading_days = np.nan
+    if isinstance(index, pd.DatetimeIndex):
+        trading_days = annual_trading_days(index)
+        day_returns = equity_df['Equity'].resample('D').last().dropna().pct_change().dropna()
+        gmean_day_return = _geometric_mean(day_returns)
+
+    annualized_return = (1 + gmean_day_return) ** trading_days - 1
+    s['Return (Ann.) [%]'] = annualized_return * 100
+    s['Volatility (Ann.) [%]'] = np.sqrt(
+        (day_returns.var(ddof=int(bool(day_returns.shape))) + (1 + gmean_day_return) ** 2) ** trading_days
+        - (1 + gmean_day_return) ** (2 * trading_days)) * 100
+    s['Sharpe Ratio'] = s['Return (Ann.) [%]'] / (s['Volatility (Ann.) [%]'] or np.nan)
+    with np.errstate(divide='ignore'):
+        s['Sortino Ratio'] = annualized_return / (
+            np.sqrt(np.mean(np.clip(day_returns, -np.inf, 0) ** 2)) * np.sqrt(trading_days))
+    max_dd = -np.nan_to_num(dd.max())
+    s['Calmar Ratio'] = annualized_return / (-max_dd or np.nan)
+    s['Max. Drawdown [%]'] = max_dd * 100
+    s['Avg. Drawdown [%]'] = -dd_peaks.mean() * 100 if len(dd_peaks) else np.nan
+    s['Max. Drawdown Duration'] = dd_dur.max()
+    s['Avg. Drawdown Duration'] = dd_dur.mean()
+    return s
+
+
+def trade_stats(trades_df):
+    """Per-trade statistics (# Trades through Kelly Criterion) from a trades DataFrame."""
+    pl = trades_df['PnL']
+    returns = trades_df['ReturnPct']
+    durations = trades_df['Duration']
+
+    s = {}
+    s['# Trades'] = n_trades = len(trades_df)
+    win_rate = np.nan if not n_trades else (pl > 0).mean()
+    s['Win Rate [%]'] = win_rate * 100
+    s['Best Trade [%]'] = returns.max() * 100
+    s['Worst Trade [%]'] = returns.min() * 100
+    s['Avg. Trade [%]'] = _geometric_mean(returns) * 100
+    s['Max. Trade Duration'] = durations.max()
+    s['Avg. Trade Duration'] = durations.mean()
+    s['Profit Factor'] = returns[returns > 0].sum() / (abs(returns[returns < 0].sum()) or np.nan)
+    s['Expectancy [%]'] = returns.mean() * 100
+    s['SQN'] = np.sqrt(n_trades) * pl.mean() / (pl.std() or np.nan)
+    s['Kelly Criterion'] = win_rate - (1 - win_rate) / (pl[pl > 0].mean() / -pl[pl < 0].mean())
+    return s
+
+
+def compute_stats(data, equity, trades, strategy=None):
+    """Build a stats Series with the same keys as `backtesting.Backtest.run()`."""
+    index = data.index
+    close = data['Close'].to_numpy(dtype=float)
+    n = len(equity)
+
+    dd, dd_dur, dd_peaks = drawdowns(equity, index)
+    equity_df = pd.DataFrame({'Equity': equity, 'DrawdownPct': dd, 'DrawdownDuration': dd_dur}, index=index)
+
+    trades_df = pd.DataFrame(trades)
+    trades_df['EntryTime'] = index[trades_df['EntryBar'].to_numpy()]
+    trades_df['ExitTime'] = index[trades_df['ExitBar'].to_numpy()]
+    trades_df['Duration'] = trades_df['ExitTime'] - trades_df['EntryTime']
+
+    have_position = np.zeros(n + 1, dtype=int)
+    np.add.at(have_position, trades_df['EntryBar'].to_numpy(), 1)
+    np.add.at(have_position, trades_df['ExitBar'].to_numpy() + 1, -1)
+    have_position = np.cumsum(have_position[:-1]) > 0
+
+    s = {}
+    s['Start'] = index[0]
+    s['End'] = index[-1]
+    s['Duration'] = s['End'] - s['Start']
+    s['Exposure Time [%]'] = have_position.mean() * 100
+    s['Equity Final [$]'] = equity[-1]
+    s['Equity Peak [$]'] = equity.max()
+    s['Return [%]'] = (equity[-1] - equity[0]) / equity[0] * 100
+    s['Buy & Hold Return [%]'] = (close[-1] - close[0]) / close[0] * 100
+
+    s.update(return_stats(equity_df, dd_peaks))
+    s.update(trade_stats(trades_df))
+
+    s['_strategy'] = strategy
+    s['_equity_curve'] = equity_df
+    s['_trades'] = trades_df
+    return pd.Series(s, dtype=object)
+
+
+def run_vectorized_backtest(data, entries, exits, initial_capital, commission, size=0.9999, strategy=None,
+                            profiler=None):
+    n = len(data)
+    entries = _as_bool_array(entries, n)
+    exits = _as_bool_array(exits, n)
+    args = (data['Open'].to_numpy(dtype=float), data['Close'].to_numpy(dtype=float),
+            entries, exits, initial_capital, commission, size)
+    if profiler is None:
+        equity, trades = simulate_positions(*args)
+        return compute_stats(data, equity, trades, strategy)
+    equity, trades = profiler.timed('simulate', simulate_positions, *args)
+    return profiler.timed('stats', compute_stats, data, equity, trades, strategy)
@@ -0,0 +1,204 @@
+import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+
+from src.backtest_engine import load_strategy, run_backtest
+from src.strategy_optimizer import optimize_strategy, _strategy_ref
+from src.shared_data import share_dataframe, attach_dataframe
+from src.indicator_cache import default_cache
+
+# Walk-forward 优化：在滚动的样本内窗口上做参数寻优，用最优参数在紧随其后的样本外窗口回测，
+# 各样本外窗口的权益曲线首尾相接得到整体的样本外表现。窗口之间互不依赖，可以并行。
+
+
+def _to_offset(size):
+    if isinstance(size, (int, np.integer)):
+        return int(size)
+    return pd.Timedelta(size)
+
+
+def make_windows(index, in_sample, out_of_sample, step=None, anchored=False):
+    """Split `index` into in-sample/out-of-sample windows.
+
+    Sizes are either bar counts (int) or durations ('180D', pd.Timedelta). `step`
+    defaults to `out_of_sample` so the out-of-sample windows tile the data. With
+    anchored=True every in-sample window starts at the first bar.
+    Returns dicts of positional bounds (end exclusive): is_start, is_end, oos_start, oos_end.
+    """
+    in_sample, out_of_sample = _to_offset(in_sample), _to_offset(out_of_sample)
+    step = out_of_sample if step is None else _to_offset(step)
+    if {type(in_sample), type(out_of_sample), type(step)} not in ({int}, {pd.Timedelta}):
+        raise ValueError("Window sizes must all be bar counts or all be durations")
+    if step < out_of_sample:
+        raise ValueError("step must not be shorter than the out-of-sample window (overlapping OOS periods)")
+    if in_sample <= type(in_sample)(0) or out_of_sample <= type(out_of_sample)(0):
+        raise ValueError("Window sizes must be positive")
+
+    if isinstance(in_sample, int):
+        def position(start, offset):
+            return min(start + offset, len(index))
+    else:
+        def position(start, offset):
+            return int(index.searchsorted(index[start] + offset))
+
+    windows = []
+    is_start = 0
+    while True:
+        window_start = 0 if anchored else is_start
+        is_end = position(is_start, in_sample)
+        if is_end >= len(index):
+            break
+        oos_end = position(is_end, out_of_sample)
+        windows.append({'is_start': window_start, 'is_end': is_end, 'oos_start': is_end, 'oos_end': oos_end})
+        if oos_end >= len(index):
+            break
+        next_start = position(is_start, step)
+        if next_start <= is_start:
+            break
+        is_start = next_start
+    return windows
+
+
+def _cast_params(row, param_grid):
+    params = {}
+    for name, values in param_grid.items():
+        value = row[name]
+        params[name] = int(value) if isinstance(list(values)[0], (int, np.integer)) else float(value)
+    return params
+
+
+def optimize_window(data, strategy_class, param_grid, window, initial_capital, commission, metric='total_return',
+                    filter_conditions=None, engine='backtesting', cache=None):
+    """Optimize on the in-sample part of `window` and backtest the best parameters out of sample."""
+    in_sample = data.iloc[window['is_start']:window['is_end']]
+    out_of_sample = data.iloc[window['oos_start']:window['oos_end']]
+    row = {
+        'is_start': in_sample.index[0], 'is_end': in_sample.index[-1],
+        'oos_start': out_of_sample.index[0], 'oos_end': out_of_sample.index[-1],
+    }
+
+    table = optimize_strategy(in_sample, strategy_class, param_grid, initial_capital, commission,
+                              filter_conditions or {}, engine=engine, cache=cache)
+    if table.empty:
+        # 样本内没有满足条件的参数，这个窗口的样本外不交易
+        row.update(params=None, is_metric=np.nan, oos_return=0.0, oos_sharpe=np.nan, oos_max_drawdown=0.0,
+                   oos_trades=0)
+        equity = pd.Series(float(initial_capital), index=out_of_sample.index)
+        return row, equity
+
+    best = table.loc[table[metric].idxmax()]
+    params = _cast_params(best, param_grid)
+    best_strategy = type(strategy_class.__name__, (strategy_class,), params)
+    _, results = run_backtest(best_strategy, out_of_sample, initial_capital, commission, engine=engine, cache=cache)
+    row.update(params=params, is_metric=best[metric], oos_return=results['Return [%]'],
+               oos_sharpe=results['Sharpe Ratio'], oos_max_drawdown=results['Max. Drawdown [%]'],
+               oos_trades=results['# Trades'])
+    return row, results['_equity_curve']['Equity']
+
+
+def stitch_equity(curves, initial_capital):
+    """Chain out-of-sample equity curves, each starting from the previous window's final equity."""
+    pieces = []
+    capital = float(initial_capital)
+    for equity in curves:
+        scaled = equity.astype(float) / float(equity.iloc[0]) * capital
+        pieces.append(scaled)
+        capital = float(scaled.iloc[-1])
+    return pd.concat(pieces) if pieces else pd.Series(dtype=float)
+
+
+_worker_state = {}
+
+
+def _init_worker(data_meta, strategy_ref, param_grid, initial_capital, commission, metric, filter_conditions,
+                 engine, cache, reuse_indicators):
+    data, shm = attach_dataframe(data_meta)
+    strategy_class = load_strategy(strategy_ref) if isinstance(strategy_ref, str) else strategy_ref
+    if reuse_indicators:
+        default_cache.clear_bases()
+        default_cache.register_base(data)
+    _worker_state.update(data=data, shm=shm, strategy_class=strategy_class, param_grid=param_grid,
+                         initial_capital=initial_capital, commission=commission, metric=metric,
+                         filter_conditions=filter_conditions, engine=engine, cache=cache)
+
+
+def _run_window(idx, window):
+    state = _worker_state
+    row, equity = optimize_window(state['data'], state['strategy_class'], state['param_grid'], window,
+                                  state['initial_capital'], state['commission'], state['metric'],
+                                  state['filter_conditions'], state['engine'], state['cache'])
+    return idx, row, equity
+
+
+def walk_forward(data, strategy_class, param_grid, initial_capital, commission, in_sample, out_of_sample,
+                 step=None, anchored=False, metric='total_return', filter_conditions=None, n_jobs=1,
+                 engine='backtesting', cache=None, reuse_indicators=True):
+    """Walk-forward optimization of `strategy_class` over `data`.
+
+    Returns (windows, equity): a DataFrame with one row per window (dates, best parameters,
+    in-sample metric and out-of-sample stats) and the stitched out-of-sample equity curve.
+    Windows are optimized in parallel when n_jobs > 1. With reuse_indicators, indicators
+    decorated with @cached_indicator(causal=True) are computed once on the full data and
+    sliced for every window (their warm-up then uses the bars before the window).
+    """
+    windows = make_windows(data.index, in_sample, out_of_sample, step, anchored)
+    if not windows:
+        raise ValueError("Not enough data for a single in-sample/out-of-sample window")
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(windows))
+
+    outputs = {}
+    if n_jobs <= 1:
+        if reuse_indicators:
+            default_cache.register_base(data)
+        try:
+            for idx, window in enumerate(windows):
+                outputs[idx] = optimize_window(data, strategy_class, param_grid, window, initial_capital, commission,
+                                               metric, filter_conditions, engine, cache)
+                print(f"Completed window {idx + 1}/{len(windows)}")
+        finally:
+            if reuse_indicators:
+                default_cache.clear_bases()
+    else:
+        if 'fork' in mp.get_all_start_methods():
+            mp_context = mp.get_context('fork')
+        else:
+            mp_context = mp.get_context()
+        shm, data_meta = share_dataframe(data)
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp_context, initializer=_init_worker,
+                                     initargs=(data_meta, _strategy_ref(strategy_class, mp_context), param_grid,
+                                               initial_capital, commission, metric, filter_conditions, engine,
+                                               cache, reuse_indicators)) as executor:
+                futures = [executor.submit(_run_window, idx, window) for idx, window in enumerate(windows)]
+                for future in as_completed(futures):
+                    idx, row, equity = future.result()
+                    outputs[idx] = (row, equity)
+                    print(f"Completed window {len(outputs)}/{len(windows)}")
+        finally:
+            shm.close()
+            shm.unlink()
+
+    rows = [outputs[idx][0] for idx in range(len(windows))]
+    equity = stitch_equity([outputs[idx][1] for idx in range(len(windows))], initial_capital)
+    table = pd.DataFrame(rows)
+    params = pd.DataFrame([row['params'] or {} for row in rows], index=table.index)
+    table = pd.concat([table.drop(columns='params'), params], axis=1)
+    table.insert(0, 'window', range(1, len(table) + 1))
+    return table, equity
+
+
+def summarize(windows, equity, initial_capital):
+    """Overall out-of-sample statistics of a walk-forward run."""
+    drawdown = equity / equity.cummax() - 1
+    return {
+        'windows': len(windows),
+        'oos_return': (equity.iloc[-1] / float(initial_capital) - 1) * 100 if len(equity) else 0.0,
+        'oos_max_drawdown': drawdown.min() * 100 if len(equity) else 0.0,
+        'oos_trades': int(windows['oos_trades'].sum()),
+        'profitable_windows': int((windows['oos_return'] > 0).sum()),
+    }
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+from backtesting import Strategy
+from backtesting.lib import crossover
+
+
+def SMA(values, n):
+    return pd.Series(values).rolling(n).mean().values
+
+
+class SmaCross(Strategy):
+    """Moving-average crossover for both engines; subclasses swap the indicator through `ma`."""
+    n1 = 5
+    n2 = 20
+    ma = staticmethod(SMA)
+
+    def init(self):
+        self.ma1 = self.I(self.ma, self.data.Close, self.n1)
+        self.ma2 = self.I(self.ma, self.data.Close, self.n2)
+
+    def next(self):
+        if crossover(self.ma1, self.ma2):
+            self.buy()
+        elif crossover(self.ma2, self.ma1):
+            self.position.close()
+
+    @classmethod
+    def generate_signals(cls, data):
+        # 与 backtesting.lib.crossover 一致：前一根 K 线两条均线都有值才算交叉
+        ma1 = data['Close'].rolling(cls.n1).mean()
+        ma2 = data['Close'].rolling(cls.n2).mean()
+        above = ma1 > ma2
+        cross_up = above & ~above.shift(1, fill_value=False) & ma2.shift(1).notna()
+        cross_down = ~above & above.shift(1, fill_value=False) & ma2.notna()
+        return cross_up, cross_down
+
+
+def make_data(n=500, seed=0, start='2020-01-01', freq='D', drift=0.0):
+    """Random-walk OHLCV bars; each bar opens at the previous close."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(drift, 0.01, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * 1.002,
+        'Low': np.minimum(open_, close) * 0.998,
+        'Close': close,
+        'Volume': rng.integers(1000, 5000, n),
+    }, index=pd.date_range(start, periods=n, freq=freq))
@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import patch
+import numpy as np
+from src.adaptive_search import successive_halving
+from src.strategy_optimizer import optimize_strategy, evaluate_param_sets
+from helpers import SmaCross, make_data
+
+
+class TestSuccessiveHalving(unittest.TestCase):
+    def setUp(self):
+        self.data = make_data(n=1500, seed=3)
+        self.param_grid = {'n1': range(2, 20, 2), 'n2': range(20, 80, 5)}
+
+    def test_fewer_backtests_than_grid(self):
+        grid = optimize_strategy(self.data, SmaCross, self.param_grid, 100000, 0.001, {}, engine='vectorized')
+        halving = successive_halving(self.data, SmaCross, self.param_grid, 100000, 0.001, {}, engine='vectorized')
+        self.assertLess(len(halving), len(grid))
+        self.assertListEqual(list(halving.columns), list(grid.columns))
+        # 幸存者在完整数据上的结果与网格搜索一致
+        merged = halving.merge(grid, on=['n1', 'n2'], suffixes=('', '_grid'))
+        np.testing.assert_allclose(merged['total_return'], merged['total_return_grid'])
+        self.assertGreaterEqual(halving['total_return'].max(), grid['total_return'].quantile(0.75))
+
+    def run_counted(self, **kwargs):
+        # 统计实际运行的回测次数（每次 evaluate_param_sets 调用的参数组数）
+        backtests = []
+
+        def counted(data, strategy_class, param_dicts, *args, **kw):
+            backtests.append((len(data), len(param_dicts)))
+            return evaluate_param_sets(data, strategy_class, param_dicts, *args, **kw)
+
+        with patch('src.adaptive_search.evaluate_param_sets', side_effect=counted):
+            results = successive_halving(self.data, SmaCross, self.param_grid, 100000, 0.001, {},
+                                         engine='vectorized', **kwargs)
+        return results, backtests
+
+    def test_max_evals_budget(self):
+        for max_evals in (1, 2, 5, 10, 30, 100):
+            results, backtests = self.run_counted(max_evals=max_evals)
+            self.assertLessEqual(sum(n for _, n in backtests), max_evals, max_evals)
+            self.assertGreater(len(results), 0)
+        # 预算已经用完时不再提升任何候选
+        results, backtests = self.run_counted(max_evals=0)
+        self.assertEqual(backtests, [])
+        self.assertTrue(results.empty)
+
+    def test_max_seconds_budget(self):
+        clock = [0.0]
+
+        def timed(data, strategy_class, param_dicts, *args, **kw):
+            # 每个候选每根 K 线耗时 1 毫秒
+            clock[0] += 0.001 * len(data) * len(param_dicts)
+            return evaluate_param_sets(data, strategy_class, param_dicts, *args, **kw)
+
+        with patch('src.adaptive_search.evaluate_param_sets', side_effect=timed), \
+                patch('src.adaptive_search.time.time', side_effect=lambda: clock[0]):
+            results = successive_halving(self.data, SmaCross, self.param_grid, 100000, 0.001, {},
+                                         max_seconds=30, engine='vectorized')
+        self.assertLessEqual(clock[0], 30)
+        self.assertGreater(len(results), 0)
+
+    def test_filter_conditions_applied_on_full_data(self):
+        results = successive_halving(self.data, SmaCross, self.param_grid, 100000, 0.001,
+                                     {'# Trades': 10 ** 6}, engine='vectorized')
+        self.assertTrue(results.empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 from unittest.mock import patch, MagicMock
-from src.backtest_engine import BacktestExecutor
+from backtesting import Strategy
+from src.backtest_engine import run_backtest
 import pandas as pd
 
 class TestBacktestEngine(unittest.TestCase):
@@ -15,10 +16,10 @@ class TestBacktestEngine(unittest.TestCase):
         }, index=pd.date_range(start='2023-01-01', periods=5))
 
         # 创建一个模拟的策略类
-        class MockStrategy:
-            def __init__(self):
-                self.position = 0
-            
+        class MockStrategy(Strategy):
+            def init(self):
+                pass
+
             def next(self):
                 if self.data.Close[-1] > self.data.Close[-2]:
                     self.buy()
@@ -26,12 +27,12 @@ class TestBacktestEngine(unittest.TestCase):
                     self.sell()
 
         self.mock_strategy = MockStrategy
-        self.mock_params = {'initial_capital': 10000}
+        self.mock_params = {'initial_capital': 10000, 'commission': .002}
 
     def test_backtest_execution(self):
-        executor = BacktestExecutor(self.mock_strategy, self.mock_data, self.mock_params)
-        results = executor.run()
-        
+        bt, results = run_backtest(self.mock_strategy, self.mock_data,
+                                   self.mock_params['initial_capital'], self.mock_params['commission'])
+
         # 验证回测结果
         self.assertIsNotNone(results)
         self.assertIn('Return [%]', results)
@@ -40,22 +41,28 @@ class TestBacktestEngine(unittest.TestCase):
 
     @patch('src.backtest_engine.Backtest')
     def test_backtest_parameters(self, mock_backtest):
-        executor = BacktestExecutor(self.mock_strategy, self.mock_data, self.mock_params)
-        executor.run()
-        
+        mock_backtest.return_value = MagicMock()
+        run_backtest(self.mock_strategy, self.mock_data,
+                     self.mock_params['initial_capital'], self.mock_params['commission'])
+
         # 验证是否使用了正确的参数调用Backtest
         mock_backtest.assert_called_once_with(
-            self.mock_data, 
-            self.mock_strategy, 
-            cash=self.mock_params['initial_capital'], 
+            self.mock_data,
+            self.mock_strategy,
+            cash=self.mock_params['initial_capital'],
             commission=.002
         )
 
     def test_data_integrity(self):
-        executor = BacktestExecutor(self.mock_strategy, self.mock_data, self.mock_params)
+        bt, _ = run_backtest(self.mock_strategy, self.mock_data,
+                             self.mock_params['initial_capital'], self.mock_params['commission'])
         # 验证数据是否被正确加载和处理
-        self.assertEqual(len(executor.data), 5)
-        self.assertListEqual(list(executor.data.columns), ['Open', 'High', 'Low', 'Close', 'Volume'])
+        self.assertEqual(len(bt._data), 5)
+        self.assertListEqual(list(bt._data.columns), ['Open', 'High', 'Low', 'Close', 'Volume'])
+
+    def test_rejects_non_strategy(self):
+        with self.assertRaises(TypeError):
+            run_backtest(object, self.mock_data, 10000, .002)
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
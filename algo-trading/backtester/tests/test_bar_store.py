@@ -0,0 +1,133 @@
+import os
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from src import bar_store
+from src.bar_store import read_bars, bar_arrays, open_snapshot
+from src.backtest_engine import load_data
+
+
+def write_snapshot(path, year, df, fragments, name=None):
+    # 与 datahub storage.write_snapshot 相同的格式：每个年度分区一个 record batch
+    table = pa.Table.from_pandas(df, preserve_index=False).combine_chunks()
+    file_name = f"year={year}/_bars-{name or year}.arrow"
+    with pa.OSFile(os.path.join(path, file_name), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return {'year': year, 'file': file_name, 'rows': len(df), 'fragments': [f['file'] for f in fragments]}
+
+
+class TestBarStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        dates = pd.date_range('2020-01-01', periods=1000, freq='D', tz='America/New_York')
+        close = 100 + np.arange(len(dates), dtype=float)
+        self.raw = pd.DataFrame({'date': dates, 'open': close, 'high': close + 1, 'low': close - 1,
+                                 'close': close, 'volume': np.arange(len(dates), dtype=np.int64)})
+        self.path = os.path.join(self.tmp.name, 'STOCK_AAPL_1D_OHLCV')
+        fragments, snapshots = [], []
+        for year, part in self.raw.groupby(self.raw['date'].dt.year):
+            name = f"year={year}/part-{year}.parquet"
+            os.makedirs(os.path.join(self.path, f'year={year}'), exist_ok=True)
+            part.to_parquet(os.path.join(self.path, name), index=False)
+            fragment = {'file': name, 'year': int(year), 'rows': len(part),
+                        'start': part['date'].iloc[0].isoformat(), 'end': part['date'].iloc[-1].isoformat()}
+            fragments.append(fragment)
+            snapshots.append(write_snapshot(self.path, int(year), part, [fragment]))
+        self.write_manifest(fragments, snapshots)
+        catalog = {'files': {'STOCK_AAPL_1D_OHLCV': {
+            'file': 'STOCK_AAPL_1D_OHLCV', 'asset_type': 'STOCK', 'symbol': 'AAPL', 'interval': '1D',
+            'data_type': 'OHLCV', 'partitioned': True, 'rows': len(self.raw),
+            'start': dates[0].isoformat(), 'end': dates[-1].isoformat(),
+        }}}
+        with open(os.path.join(self.tmp.name, 'catalog.json'), 'w') as f:
+            json.dump(catalog, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_manifest(self, fragments, snapshots):
+        self.fragments, self.snapshots = fragments, snapshots
+        with open(os.path.join(self.path, '_manifest.json'), 'w') as f:
+            json.dump({'version': 1, 'fragments': fragments, 'snapshots': snapshots}, f)
+
+    def replace_fragment(self, year):
+        # 某一年的碎片被替换（增量写入之后、重新发布之前）
+        fragments = [dict(f, file=f['file'] + '.new') if f['year'] == year else f for f in self.fragments]
+        self.write_manifest(fragments, self.snapshots)
+
+    def test_range_slice(self):
+        bars = read_bars(self.path, '2020-02-01', '2020-02-10')
+        self.assertEqual(bars.num_rows, 10)
+        self.assertEqual(bars.column('close')[0].as_py(), 131.0)
+        # 带时区的边界与快照的时区一致比较
+        bars = read_bars(self.path, pd.Timestamp('2020-02-01 05:00', tz='UTC'), None)
+        self.assertEqual(bars.num_rows, 1000 - 31)
+        self.assertEqual(read_bars(self.path, '2030-01-01', '2030-12-31').num_rows, 0)
+
+    def test_zero_copy_views(self):
+        arrays = bar_arrays(read_bars(self.path, '2020-02-01', '2020-12-31'))
+        self.assertFalse(arrays['close'].flags.writeable)
+        np.testing.assert_array_equal(arrays['close'][:3], [131.0, 132.0, 133.0])
+        # 两次读取的切片指向同一块映射内存
+        again = bar_arrays(read_bars(self.path, '2020-06-01', '2020-06-30'))
+        self.assertTrue(np.shares_memory(arrays['close'], again['close']))
+        snapshot = os.path.join(self.path, self.snapshots[0]['file'])
+        self.assertIs(open_snapshot(snapshot), open_snapshot(snapshot))
+        # 跨年的范围每年一个 chunk，拼接成新的数组
+        spanning = read_bars(self.path, '2020-12-30', '2021-01-02')
+        self.assertEqual(spanning.column('close').num_chunks, 2)
+        np.testing.assert_array_equal(bar_arrays(spanning)['close'], [464.0, 465.0, 466.0, 467.0])
+
+    def test_stale_snapshot_is_ignored(self):
+        self.replace_fragment(2021)
+        self.assertIsNone(read_bars(self.path))
+        self.assertIsNone(read_bars(os.path.join(self.tmp.name, 'missing')))
+
+    def test_mixed_snapshot_schemas_fall_back(self):
+        part = self.raw[self.raw['date'].dt.year == 2021].astype({'close': np.float32})
+        fragment = next(f for f in self.fragments if f['year'] == 2021)
+        snapshots = [write_snapshot(self.path, 2021, part, [fragment]) if s['year'] == 2021 else s
+                     for s in self.snapshots]
+        self.write_manifest(self.fragments, snapshots)
+        self.assertIsNone(read_bars(self.path, '2020-12-30', '2021-01-02'))
+        # 只涉及一年的范围仍然可以使用快照
+        self.assertEqual(read_bars(self.path, '2021-02-01', '2021-02-03').num_rows, 3)
+
+    def test_superseded_snapshots_released(self):
+        read_bars(self.path)
+        old = os.path.join(self.path, self.snapshots[1]['file'])
+        self.assertIn(old, bar_store._open_snapshots)
+        # 重新发布 2021 年：新文件名，旧文件删除
+        part = self.raw[self.raw['date'].dt.year == 2021]
+        fragment = next(f for f in self.fragments if f['year'] == 2021)
+        snapshots = [write_snapshot(self.path, 2021, part, [fragment], name='republished') if s['year'] == 2021
+                     else s for s in self.snapshots]
+        self.write_manifest(self.fragments, snapshots)
+        os.remove(old)
+        self.assertEqual(read_bars(self.path).num_rows, 1000)
+        self.assertNotIn(old, bar_store._open_snapshots)
+        self.assertEqual(len([p for p in bar_store._open_snapshots if p.startswith(self.path)]), 3)
+
+    def test_open_snapshots_bounded(self):
+        with patch('src.bar_store.MAX_OPEN_SNAPSHOTS', 2):
+            read_bars(self.path)
+        self.assertLessEqual(len(bar_store._open_snapshots), 2)
+        # 被淘汰的快照下次读取时重新映射
+        self.assertEqual(read_bars(self.path).num_rows, 1000)
+
+    def test_load_data_matches_parquet(self):
+        with patch('src.backtest_engine.DATA_DIR', self.tmp.name):
+            from_snapshot = load_data('aapl', '1d', '2020-03-01', '2021-06-30')
+            self.write_manifest(self.fragments, [])
+            from_parquet = load_data('aapl', '1d', '2020-03-01', '2021-06-30')
+        self.assertEqual(len(from_snapshot), 487)
+        pd.testing.assert_frame_equal(from_snapshot, from_parquet)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+import pandas as pd
+from src.batch_runner import build_config, build_jobs, parse_args, run_batch
+from helpers import make_data
+
+SMA_STRATEGY = '''
+import pandas as pd
+from backtesting import Strategy
+from backtesting.lib import crossover
+
+
+def SMA(values, n):
+    return pd.Series(values).rolling(n).mean().values
+
+
+class SmaCross(Strategy):
+    n1 = {n1}
+    n2 = 20
+
+    def init(self):
+        self.ma1 = self.I(SMA, self.data.Close, self.n1)
+        self.ma2 = self.I(SMA, self.data.Close, self.n2)
+
+    def next(self):
+        if crossover(self.ma1, self.ma2):
+            self.buy()
+        elif crossover(self.ma2, self.ma1):
+            self.position.close()
+'''
+
+
+def fake_loader(asset, interval, start, end):
+    if asset == 'missing':
+        raise FileNotFoundError(f"No data file found for {asset}")
+    return make_data(400, seed=len(asset), start=start)
+
+
+class TestBatchRunner(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.strategy_files = []
+        for i, n1 in enumerate((5, 10), 1):
+            path = os.path.join(self.tmp.name, f'strategy_{i}.py')
+            with open(path, 'w') as f:
+                f.write(SMA_STRATEGY.format(n1=n1))
+            self.strategy_files.append(path)
+        with open(os.path.join(self.tmp.name, 'broken.py'), 'w') as f:
+            f.write("raise ImportError('broken strategy')\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_config_and_jobs(self):
+        config_path = os.path.join(self.tmp.name, 'batch.json')
+        with open(config_path, 'w') as f:
+            json.dump({'strategies': [os.path.join(self.tmp.name, 'strategy_*.py')],
+                       'assets': ['BTCUSD', 'ethusd'], 'windows': [{'start': 20200101, 'end': 20201231}],
+                       'jobs': 4}, f)
+        config = build_config(parse_args(['--config', config_path, '--intervals', '1h', '1d']))
+        datasets, strategy_files = build_jobs(config)
+        self.assertEqual(config['jobs'], 4)
+        self.assertEqual(len(datasets), 4)
+        self.assertEqual(datasets[0], ('btcusd', '1h', datetime(2020, 1, 1), datetime(2020, 12, 31)))
+        self.assertEqual(strategy_files, self.strategy_files)
+        with self.assertRaises(ValueError):
+            build_config(parse_args(['--assets', 'btcusd']))
+
+    def test_serial_and_parallel_match(self):
+        datasets = [('btcusd', '1d', datetime(2020, 1, 1), datetime(2021, 2, 4)),
+                    ('missing', '1d', datetime(2020, 1, 1), datetime(2021, 2, 4)),
+                    ('ethusd', '1d', datetime(2020, 1, 1), datetime(2021, 2, 4))]
+        strategy_files = self.strategy_files + [os.path.join(self.tmp.name, 'broken.py')]
+
+        serial = run_batch(datasets, strategy_files, loader=fake_loader)
+        parallel = run_batch(datasets, strategy_files, n_jobs=3, loader=fake_loader)
+
+        self.assertEqual(len(serial), 9)
+        self.assertEqual(list(serial['asset'][:3]), ['btcusd'] * 3)
+        self.assertEqual(list(serial['strategy'][:3]), ['strategy_1.py', 'strategy_2.py', 'broken.py'])
+        self.assertTrue(serial.loc[serial['asset'] == 'missing', 'error'].str.contains('FileNotFoundError').all())
+        self.assertTrue(serial.loc[serial['strategy'] == 'broken.py', 'error'].notna().all())
+        ok = serial['error'].isna()
+        self.assertEqual(ok.sum(), 4)
+        self.assertNotEqual(serial.loc[0, 'total_return'], serial.loc[1, 'total_return'])
+        pd.testing.assert_frame_equal(serial.drop(columns='seconds'), parallel.drop(columns='seconds'))
+
+
+if __name__ == '__main__':
+    unittest.main()
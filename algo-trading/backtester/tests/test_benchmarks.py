@@ -0,0 +1,37 @@
+import json
+import os
+import tempfile
+import unittest
+from benchmarks.bench_backtester import SmaCross, compare, generate_ohlcv, run_suite
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_generate_ohlcv(self):
+        df = generate_ohlcv(1000, seed=1)
+        self.assertEqual(len(df), 1000)
+        self.assertTrue((df['High'] >= df[['Open', 'Close']].max(axis=1)).all())
+        self.assertTrue((df['Low'] <= df[['Open', 'Close']].min(axis=1)).all())
+        self.assertTrue(df.equals(generate_ohlcv(1000, seed=1)))
+
+    def test_run_suite_and_compare(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            records = run_suite([500], {'SmaCross': SmaCross}, work_dir, track_memory=False)
+            benchmarks = {(r['benchmark'], r['engine']) for r in records}
+            self.assertIn(('load_data', None), benchmarks)
+            self.assertIn(('run_backtest', 'backtesting'), benchmarks)
+            self.assertIn(('optimize_strategy', 'vectorized'), benchmarks)
+            self.assertTrue(all(r['bars_per_sec'] > 0 for r in records))
+
+            old_path = os.path.join(work_dir, 'old.json')
+            new_path = os.path.join(work_dir, 'new.json')
+            slower = [dict(r, seconds=r['seconds'] * 2) for r in records]
+            with open(old_path, 'w') as f:
+                json.dump({'commit': 'a', 'results': records}, f)
+            with open(new_path, 'w') as f:
+                json.dump({'commit': 'b', 'results': slower}, f)
+            self.assertEqual(compare(old_path, new_path), len(records))
+            self.assertEqual(compare(new_path, old_path), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
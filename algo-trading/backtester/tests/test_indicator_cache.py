@@ -0,0 +1,75 @@
+import unittest
+import numpy as np
+import pandas as pd
+from src.indicator_cache import IndicatorCache, cached_indicator, fingerprint, _fingerprints
+from src.strategy_optimizer import optimize_strategy
+import helpers
+from helpers import make_data
+
+cache = IndicatorCache()
+calls = []
+
+
+@cached_indicator(cache=cache)
+def SMA(values, n):
+    calls.append(n)
+    return pd.Series(values).rolling(n).mean().values
+
+
+class SmaCross(helpers.SmaCross):
+    ma = staticmethod(SMA)
+
+
+class TestIndicatorCache(unittest.TestCase):
+    def setUp(self):
+        cache.clear()
+        calls.clear()
+        self.data = make_data(300, start='2021-01-01')
+
+    def test_grid_computes_each_window_once(self):
+        param_grid = {'n1': range(3, 9, 2), 'n2': range(15, 35, 5)}
+        results = optimize_strategy(self.data, SmaCross, param_grid, 10000, 0.001, {})
+        self.assertEqual(len(results), 12)
+        self.assertEqual(sorted(calls), [3, 5, 7, 15, 20, 25, 30])
+        self.assertEqual(cache.misses, 7)
+        self.assertEqual(cache.hits, 24 - 7)
+
+    def test_different_data_is_recomputed(self):
+        SMA(self.data.Close.values, 5)
+        SMA(self.data.Close.values * 2, 5)
+        SMA(self.data.Close.values.copy(), 5)
+        self.assertEqual(calls, [5, 5])
+
+    def test_in_place_mutation_is_recomputed(self):
+        values = self.data.Close.to_numpy().copy()
+        first = SMA(values, 5)
+        values[-1] += 10
+        second = SMA(values, 5)
+        self.assertEqual(calls, [5, 5])
+        self.assertNotEqual(first[-1], second[-1])
+        self.assertNotIn(id(values), _fingerprints)
+        # 只读数组的内容不会再变，指纹按 id 记住，不重复求哈希
+        values.flags.writeable = False
+        fingerprint(values)
+        self.assertIn(id(values), _fingerprints)
+
+    def test_eviction(self):
+        small = IndicatorCache(max_entries=2)
+        square = cached_indicator(lambda x, p: x ** p, cache=small)
+        values = np.arange(10.0)
+        for p in (1, 2, 3):
+            square(values, p)
+        self.assertEqual(len(small), 2)
+        square(values, 1)
+        self.assertEqual(small.misses, 4)
+
+        tiny = IndicatorCache(max_bytes=100)
+        cube = cached_indicator(lambda x: x ** 3, cache=tiny)
+        cube(values)
+        cube(np.arange(20.0))
+        self.assertLessEqual(tiny.nbytes, 100)
+        self.assertEqual(len(tiny), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
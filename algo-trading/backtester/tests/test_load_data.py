@@ -0,0 +1,130 @@
+import os
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from src.backtest_engine import load_data
+
+
+class TestLoadData(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        dates = pd.date_range('2015-01-01', periods=5000, freq='h')
+        rng = np.random.default_rng(0)
+        close = np.round(1.1 + np.cumsum(rng.normal(0, 0.001, len(dates))), 5)
+        # datahub 写出的格式：小写列名，date 为普通列，带 symbol 列
+        self.raw = pd.DataFrame({
+            'date': dates,
+            'open': close, 'high': close + 0.001, 'low': close - 0.001, 'close': close,
+            'volume': rng.integers(0, 1000, len(dates)).astype(float),
+            'symbol': 'EURUSD=X',
+        })
+        path = os.path.join(self.tmp.name, 'FOREX_EURUSD_1H_OHLCV_20150101_20150728.parquet')
+        self.raw.to_parquet(path, index=False, row_group_size=500)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_range_and_columns(self):
+        with patch('src.backtest_engine.DATA_DIR', self.tmp.name):
+            df = load_data('eurusd', '1h', '20150201', '20150205')
+        expected = self.raw[(self.raw.date >= '2015-02-01') & (self.raw.date <= '2015-02-05')]
+        self.assertEqual(len(df), len(expected))
+        self.assertListEqual(list(df.columns), ['Open', 'High', 'Low', 'Close', 'Volume'])
+        self.assertEqual(df.index[0], pd.Timestamp('2015-02-01'))
+        self.assertEqual(df.index[-1], pd.Timestamp('2015-02-05'))
+        np.testing.assert_array_equal(df['Close'].to_numpy(np.float64), expected['close'].to_numpy())
+
+    def test_lossless_downcast(self):
+        with patch('src.backtest_engine.DATA_DIR', self.tmp.name):
+            df = load_data('eurusd', '1h', '20150101', '20151231')
+        self.assertEqual(df['Volume'].dtype, np.int64)
+        # 5 位小数的价格无法无损转成 float32，保持 float64
+        self.assertEqual(df['Close'].dtype, np.float64)
+
+    def test_catalog_picks_covering_file(self):
+        # 两个文件覆盖不同日期范围，按目录索引选择覆盖请求区间的文件
+        later = self.raw.copy()
+        later['date'] = later['date'] + pd.Timedelta(days=365)
+        later['close'] = later['close'] + 1
+        later.to_parquet(os.path.join(self.tmp.name, 'FOREX_EURUSD_1H_OHLCV_20160101_20160727.parquet'), index=False)
+        catalog = {'files': {}}
+        for name, df in [('FOREX_EURUSD_1H_OHLCV_20150101_20150728.parquet', self.raw),
+                         ('FOREX_EURUSD_1H_OHLCV_20160101_20160727.parquet', later)]:
+            catalog['files'][name] = {
+                'file': name, 'asset_type': 'FOREX', 'symbol': 'EURUSD', 'interval': '1H', 'data_type': 'OHLCV',
+                'start': df['date'].min().isoformat(), 'end': df['date'].max().isoformat(), 'rows': len(df),
+            }
+        with open(os.path.join(self.tmp.name, 'catalog.json'), 'w') as f:
+            json.dump(catalog, f)
+
+        with patch('src.backtest_engine.DATA_DIR', self.tmp.name):
+            df = load_data('eurusd', '1h', '20160301', '20160302')
+            self.assertAlmostEqual(df['Close'].iloc[0], later.set_index('date').loc['2016-03-01 00:00', 'close'])
+            with self.assertRaises(FileNotFoundError):
+                load_data('eurusd', '1h', '20170301', '20170302')
+
+    def test_partitioned_dataset(self):
+        # datahub 分区存储的数据集目录：按年分区的碎片文件 + _manifest.json
+        dataset = os.path.join(self.tmp.name, 'FOREX_GBPUSD_1H_OHLCV')
+        fragments = []
+        for i, part in enumerate([self.raw.iloc[:2000], self.raw.iloc[2000:4000], self.raw.iloc[4000:]]):
+            name = f"year=2015/part-{i}.parquet"
+            os.makedirs(os.path.join(dataset, 'year=2015'), exist_ok=True)
+            part.to_parquet(os.path.join(dataset, name), index=False)
+            fragments.append({'file': name, 'year': 2015, 'rows': len(part),
+                              'start': part['date'].iloc[0].isoformat(), 'end': part['date'].iloc[-1].isoformat()})
+        with open(os.path.join(dataset, '_manifest.json'), 'w') as f:
+            json.dump({'version': 1, 'fragments': fragments}, f)
+        catalog = {'files': {'FOREX_GBPUSD_1H_OHLCV': {
+            'file': 'FOREX_GBPUSD_1H_OHLCV', 'asset_type': 'FOREX', 'symbol': 'GBPUSD', 'interval': '1H',
+            'data_type': 'OHLCV', 'partitioned': True, 'rows': len(self.raw),
+            'start': self.raw['date'].min().isoformat(), 'end': self.raw['date'].max().isoformat(),
+        }}}
+        with open(os.path.join(self.tmp.name, 'catalog.json'), 'w') as f:
+            json.dump(catalog, f)
+
+        with patch('src.backtest_engine.DATA_DIR', self.tmp.name):
+            df = load_data('gbpusd', '1h', '20150101', '20151231')
+            self.assertEqual(len(df), len(self.raw))
+            self.assertTrue(df.index.is_monotonic_increasing)
+            # 跨越两个碎片的区间
+            boundary = pd.Timestamp(fragments[1]['start'])
+            df = load_data('gbpusd', '1h', boundary - pd.Timedelta(days=1), boundary + pd.Timedelta(days=1))
+            self.assertEqual(len(df), 49)
+
+    def test_fragments_with_different_dtypes(self):
+        # 旧版本按批次选择 float32/float64，同一数据集的碎片 schema 可能不同
+        dataset = os.path.join(self.tmp.name, 'FOREX_GBPUSD_1H_OHLCV')
+        os.makedirs(os.path.join(dataset, 'year=2015'))
+        fragments = []
+        for i, part in enumerate([self.raw.iloc[:2500], self.raw.iloc[2500:]]):
+            part = part.copy()
+            if i == 0:
+                part[['open', 'high', 'low', 'close']] = part[['open', 'high', 'low', 'close']].astype(np.float32)
+                part['volume'] = part['volume'].astype(np.int64)
+            name = f"year=2015/part-{i}.parquet"
+            part.to_parquet(os.path.join(dataset, name), index=False)
+            fragments.append({'file': name, 'year': 2015, 'rows': len(part),
+                              'start': part['date'].iloc[0].isoformat(), 'end': part['date'].iloc[-1].isoformat()})
+        with open(os.path.join(dataset, '_manifest.json'), 'w') as f:
+            json.dump({'version': 1, 'fragments': fragments}, f)
+        with patch('src.backtest_engine.DATA_DIR', self.tmp.name), \
+                patch('src.backtest_engine.find_data_file', return_value=dataset):
+            df = load_data('gbpusd', '1h', '20150101', '20151231')
+        self.assertEqual(len(df), len(self.raw))
+        self.assertEqual(df['Close'].iloc[-1], self.raw['close'].iloc[-1])
+
+    def test_tz_aware_dates(self):
+        self.raw['date'] = self.raw['date'].dt.tz_localize('UTC').dt.tz_convert('America/New_York')
+        path = os.path.join(self.tmp.name, 'STOCK_AAPL_1H_OHLCV_20150101_20150728.parquet')
+        self.raw.to_parquet(path, index=False)
+        with patch('src.backtest_engine.DATA_DIR', self.tmp.name):
+            df = load_data('aapl', '1h', '20150301', '20150302')
+        self.assertEqual(len(df), 25)
+
+
+if __name__ == '__main__':
+    unittest.main()
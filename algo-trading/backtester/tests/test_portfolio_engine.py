@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from src.portfolio_engine import build_panel, positions_from_signals, run_portfolio, run_portfolio_backtest, \
+    save_portfolio_results, _rebalance_loop
+from src.vector_engine import run_vectorized_backtest
+from helpers import SmaCross, make_data
+
+
+class TestPortfolioEngine(unittest.TestCase):
+    def setUp(self):
+        self.frames = {'AAA': make_data(300, 1, '2023-01-01'), 'BBB': make_data(300, 2, '2023-01-01'),
+                       'CCC': make_data(200, 3, '2023-04-11')}
+        self.panel = build_panel(self.frames)
+
+    def test_build_panel_aligns_assets(self):
+        close = self.panel['Close']
+        self.assertEqual(close.shape, (300, 3))
+        self.assertTrue(close['CCC'].iloc[:100].isna().all())
+        self.assertEqual(close['CCC'].iloc[100], self.frames['CCC']['Close'].iloc[0])
+
+    def test_positions_from_signals(self):
+        entries = np.array([[1, 0], [0, 0], [0, 1], [1, 0]], dtype=bool)
+        exits = np.array([[0, 0], [1, 0], [0, 1], [0, 0]], dtype=bool)
+        np.testing.assert_array_equal(positions_from_signals(entries, exits), [[1, 0], [0, 0], [0, 0], [1, 0]])
+
+    def test_single_asset_matches_vector_engine(self):
+        # 单资产、不计手续费时，与单品种向量化引擎的收益一致（整股取整造成的微小差异除外）
+        data = self.frames['AAA']
+        entries, exits = SmaCross.generate_signals(data)
+        panel = build_panel({'AAA': data})
+        results = run_portfolio_backtest(panel, entries.to_frame(), exits.to_frame(), 1e9, 0.0)
+        single = run_vectorized_backtest(data, entries, exits, 1e9, 0.0, size=1.0)
+        self.assertAlmostEqual(results['Return [%]'], single['Return [%]'], places=4)
+        # 组合统计的是开仓次数，最后一笔仍未平仓；向量化引擎只统计已平仓的交易
+        self.assertEqual(results['# Trades'], single['# Trades'] + 1)
+
+    def test_shared_capital(self):
+        results = run_portfolio(SmaCross, self.panel, 100000, 0.001)
+        weights = results['_weights']
+        self.assertTrue((weights.sum(axis=1) <= 1 + 1e-12).all())
+        self.assertTrue((weights['CCC'].iloc[:101] == 0).all())
+        self.assertEqual(list(results['_asset_contribution'].index), ['AAA', 'BBB', 'CCC'])
+        self.assertGreater(results['# Trades'], 0)
+
+        fixed = run_portfolio(SmaCross, self.panel, 100000, 0.001, allocation='fixed')
+        self.assertLessEqual(fixed['_weights'].to_numpy().max(), 1 / 3 + 1e-12)
+        with self.assertRaises(ValueError):
+            run_portfolio(SmaCross, self.panel, 100000, 0.001, allocation='kelly')
+
+        with tempfile.TemporaryDirectory() as results_dir:
+            save_portfolio_results(results, results_dir)
+            with open(os.path.join(results_dir, 'portfolio_metrics.json')) as f:
+                self.assertEqual(json.load(f)['# Assets'], 3)
+            self.assertTrue(os.path.exists(os.path.join(results_dir, 'portfolio_weights.parquet')))
+
+    def test_mixed_calendars(self):
+        # 股票只在工作日交易、每天上涨 1%，加密货币每天交易、价格不变；两者始终各持有一半
+        days = pd.date_range('2024-01-01', '2024-01-31', freq='D')
+        weekdays = days[days.weekday < 5]
+        stock_close = 100 * 1.01 ** np.arange(1, len(weekdays) + 1)
+        stock = pd.DataFrame({'Open': np.r_[100, stock_close[:-1]], 'Close': stock_close}, index=weekdays)
+        crypto = pd.DataFrame({'Open': 50.0, 'Close': 50.0}, index=days)
+        panel = build_panel({'STK': stock, 'BTC': crypto})
+        held = np.ones((len(days), 2), dtype=bool)
+        results = run_portfolio_backtest(panel, held, ~held, 100000, 0.001, allocation='fixed')
+
+        # 第一根开盘信号生效前为空仓，第二根（1 月 2 日）开盘买入，之后不再调仓
+        expected = (1 - 0.001) * (1 + 0.5 * (stock_close[-1] / stock['Open'].iloc[1] - 1)) - 1
+        self.assertAlmostEqual(results['Return [%]'], expected * 100, places=6)
+        turnover = results['Avg. Turnover [%]'] * len(days) / 100
+        self.assertAlmostEqual(turnover, 1.0)
+        # 周末股票停牌，权重保持，权益不变
+        weights = results['_weights']
+        self.assertTrue((weights['STK'].iloc[1:] == 0.5).all())
+        equity = results['_equity_curve']['Equity']
+        self.assertEqual(equity.loc['2024-01-06'], equity.loc['2024-01-05'])
+        self.assertGreater(equity.loc['2024-01-08'], equity.loc['2024-01-07'])
+        self.assertAlmostEqual(results['_asset_contribution']['BTC'], 0.0)
+
+    def test_equal_weights_vectorized_for_many_assets(self):
+        # 几百个代码的等权组合：每次调仓都重设全部持仓，走向量化路径，结果与逐次调仓的循环一致
+        panel = build_panel({f'S{i:03d}': make_data(400, seed=i) for i in range(300)})
+        entries, exits = SmaCross.generate_signals(panel)
+        with patch('src.portfolio_engine._rebalance_loop', side_effect=AssertionError('loop used')):
+            vectorized = run_portfolio_backtest(panel, entries.to_numpy(), exits.to_numpy(), 100000, 0.001)
+        with patch('src.portfolio_engine._full_rebalances', side_effect=_rebalance_loop):
+            looped = run_portfolio_backtest(panel, entries.to_numpy(), exits.to_numpy(), 100000, 0.001)
+        self.assertGreater(vectorized['# Trades'], 1000)
+        np.testing.assert_allclose(vectorized['_equity_curve']['Equity'], looped['_equity_curve']['Equity'],
+                                   rtol=1e-9)
+        np.testing.assert_allclose(vectorized['_asset_contribution'], looped['_asset_contribution'],
+                                   rtol=1e-9, atol=1e-9)
+        self.assertAlmostEqual(vectorized['Avg. Turnover [%]'], looped['Avg. Turnover [%]'], places=9)
+
+
+if __name__ == '__main__':
+    unittest.main()
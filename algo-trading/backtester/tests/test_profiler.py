@@ -0,0 +1,42 @@
+import json
+import os
+import tempfile
+import unittest
+from src.backtest_engine import run_backtest, save_results
+from src.profiler import format_profile
+from helpers import SmaCross, make_data
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.data = make_data(300, start='2023-01-01')
+
+    def test_profile_event_engine(self):
+        bt, results = run_backtest(SmaCross, self.data, 100000, 0.001, profile=True)
+        profile = results['_profile']
+        self.assertEqual(results['_strategy'].__class__.__name__, 'SmaCross')
+        for section in ('init', 'loop', 'stats', 'total', 'framework'):
+            self.assertIn(section, profile['sections'])
+        self.assertLessEqual(abs(profile['next']['calls'] - profile['broker']['calls']), 1)
+        self.assertLessEqual(profile['next']['p50_us'], profile['next']['max_us'])
+        self.assertIn('next()', format_profile(profile))
+
+        # 剖析不应改变回测结果
+        _, plain = run_backtest(SmaCross, self.data, 100000, 0.001)
+        self.assertNotIn('_profile', plain)
+        self.assertEqual(plain['# Trades'], results['# Trades'])
+        self.assertAlmostEqual(plain['Return [%]'], results['Return [%]'])
+
+    def test_profile_vectorized_engine_saved(self):
+        bt, results = run_backtest(SmaCross, self.data, 100000, 0.001, engine='vectorized', profile=True)
+        self.assertEqual(set(results['_profile']['sections']), {'signals', 'simulate', 'stats', 'total'})
+        with tempfile.TemporaryDirectory() as results_dir:
+            save_results(results, bt, results_dir)
+            with open(os.path.join(results_dir, 'backtest_profile.json')) as f:
+                self.assertEqual(json.load(f), results['_profile'])
+            with open(os.path.join(results_dir, 'backtest_results.csv')) as f:
+                self.assertNotIn('_profile', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from backtesting import Strategy
+from src.backtest_engine import run_backtest, save_results
+from src.report_data import lttb_indices, downsample, load_report_data
+from src.report_generator import render_deferred
+
+
+class BuyAndHold(Strategy):
+    def init(self):
+        pass
+
+    def next(self):
+        if not self.position:
+            self.buy()
+
+    @classmethod
+    def generate_signals(cls, data):
+        entries = np.zeros(len(data), dtype=bool)
+        entries[0] = True
+        exits = np.zeros(len(data), dtype=bool)
+        exits[len(data) // 2] = True
+        return entries, exits
+
+
+class TestReport(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, 5000)))
+        self.data = pd.DataFrame({
+            'Open': close, 'High': close * 1.001, 'Low': close * 0.999, 'Close': close,
+            'Volume': np.full(5000, 1000),
+        }, index=pd.date_range('2023-01-01', periods=5000, freq='h'))
+
+    def test_lttb_keeps_endpoints_and_extremes(self):
+        y = np.sin(np.linspace(0, 20, 10000))
+        y[4321] = 5.0
+        idx = lttb_indices(y, 200)
+        self.assertEqual(len(idx), 200)
+        self.assertEqual((idx[0], idx[-1]), (0, 9999))
+        self.assertTrue(np.all(np.diff(idx) > 0))
+        self.assertIn(4321, idx)
+        np.testing.assert_array_equal(lttb_indices(y[:50], 200), np.arange(50))
+
+        series = pd.Series(y, index=pd.date_range('2023-01-01', periods=10000, freq='min'))
+        small = downsample(series, 500)
+        self.assertEqual(len(small), 500)
+        self.assertEqual(small.index[-1], series.index[-1])
+
+    def test_fast_and_deferred_plots(self):
+        _, results = run_backtest(BuyAndHold, self.data, 100000, 0.001, engine='vectorized')
+        with tempfile.TemporaryDirectory() as results_dir:
+            save_results(results, None, results_dir, plot='none')
+            equity, trades = load_report_data(results_dir)
+            pd.testing.assert_series_equal(equity['Equity'], results['_equity_curve']['Equity'],
+                                           check_freq=False)
+            self.assertEqual(len(trades), results['# Trades'])
+            self.assertFalse(os.path.exists(os.path.join(results_dir, 'equity_curve.png')))
+
+            paths = render_deferred(results_dir, max_points=300, n_jobs=2)
+            self.assertTrue(all(os.path.getsize(path) > 0 for path in paths))
+
+        with tempfile.TemporaryDirectory() as results_dir:
+            save_results(results, None, results_dir, plot='fast')
+            self.assertTrue(os.path.exists(os.path.join(results_dir, 'drawdown.png')))
+            with self.assertRaises(ValueError):
+                save_results(results, None, results_dir, plot='bokeh')
+
+    def test_full_plot_written_to_results_dir(self):
+        bt, results = run_backtest(BuyAndHold, self.data.iloc[:300], 100000, 0.001)
+        with tempfile.TemporaryDirectory() as results_dir:
+            save_results(results, bt, results_dir)
+            self.assertTrue(os.path.exists(os.path.join(results_dir, 'backtest_plot.html')))
+            self.assertTrue(os.path.exists(os.path.join(results_dir, 'trades.parquet')))
+
+
+if __name__ == '__main__':
+    unittest.main()
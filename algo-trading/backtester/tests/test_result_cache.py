@@ -0,0 +1,131 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from src.backtest_engine import run_backtest
+from src.result_cache import ResultCache
+from src.indicator_cache import fingerprint
+from src.strategy_optimizer import optimize_strategy
+import helpers
+from helpers import make_data
+
+calls = []
+
+
+class SmaCross(helpers.SmaCross):
+    # 统计实际运行的回测次数
+    @classmethod
+    def generate_signals(cls, data):
+        calls.append((cls.n1, cls.n2))
+        return super().generate_signals(data)
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        calls.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.tmp.name, evict_every=1)
+        self.data = make_data(300, start='2021-01-01')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_cached(self, strategy, data=None, commission=0.001):
+        return run_backtest(strategy, self.data if data is None else data, 10000, commission,
+                            engine='vectorized', cache=self.cache)
+
+    def test_hit_returns_same_stats(self):
+        _, first = self.run_cached(SmaCross)
+        _, second = self.run_cached(SmaCross)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(first['Return [%]'], second['Return [%]'])
+        pd.testing.assert_frame_equal(first['_trades'], second['_trades'])
+
+    def read_only_data(self):
+        columns = {}
+        for col in self.data.columns:
+            values = self.data[col].to_numpy().copy()
+            values.flags.writeable = False
+            columns[col] = values
+        return pd.DataFrame(columns, index=self.data.index, copy=False)
+
+    def test_read_only_data_hashed_once_per_frame(self):
+        data = self.read_only_data()
+        with patch('src.result_cache.fingerprint', wraps=fingerprint) as hashed:
+            self.run_cached(SmaCross, data=data)
+            self.run_cached(SmaCross, data=data, commission=0.002)
+            self.run_cached(type('OptimizedStrategy', (SmaCross,), {'n1': 7}), data=data)
+            self.assertEqual(hashed.call_count, 1)
+            self.run_cached(SmaCross, data=data.copy())
+            self.assertEqual(hashed.call_count, 2)
+
+    def test_in_place_changes_change_key(self):
+        for data in (self.data.copy(), self.read_only_data()):
+            key = self.cache.make_key(SmaCross, data, 10000, 0.001, 'vectorized')
+            data['Close'] *= 2
+            self.assertNotEqual(self.cache.make_key(SmaCross, data, 10000, 0.001, 'vectorized'), key)
+
+    def test_non_scalar_params_in_key(self):
+        keys = set()
+        for value in (None, [1, 2], (1, 3), {'a': 1}, {'a': 2}, np.array([1.0, 2.0])):
+            strategy = type('OptimizedStrategy', (SmaCross,), {'levels': value})
+            keys.add(self.cache.make_key(strategy, self.data, 10000, 0.001, 'vectorized'))
+        self.assertEqual(len(keys), 6)
+
+    def test_unserializable_params_not_cached(self):
+        strategy = type('OptimizedStrategy', (SmaCross,), {'level': object()})
+        self.assertIsNone(self.cache.make_key(strategy, self.data, 10000, 0.001, 'vectorized'))
+        self.run_cached(strategy)
+        self.run_cached(strategy)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.cache.size(), 0)
+
+    def test_unreadable_entry_is_a_miss(self):
+        key = self.cache.make_key(SmaCross, self.data, 10000, 0.001, 'vectorized')
+        self.run_cached(SmaCross)
+        path = self.cache._path(key)
+        # 引用了已经不存在的类的条目
+        with open(path, 'wb') as f:
+            f.write(b'cmissing_module\nThing\n.')
+        self.assertIsNone(self.cache.get(key))
+        self.assertFalse(os.path.exists(path))
+        self.run_cached(SmaCross)
+        self.assertEqual(len(calls), 2)
+        self.assertIsNotNone(self.cache.get(key))
+
+    def test_key_changes_with_inputs(self):
+        self.run_cached(SmaCross)
+        self.run_cached(type('OptimizedStrategy', (SmaCross,), {'n1': 7}))
+        self.run_cached(SmaCross, commission=0.002)
+        self.run_cached(SmaCross, data=self.data.iloc[:-1])
+        self.assertEqual(len(calls), 4)
+
+    def test_optimizer_sweep_reuses_results(self):
+        param_grid = {'n1': range(3, 9, 2), 'n2': range(15, 35, 5)}
+        first = optimize_strategy(self.data, SmaCross, param_grid, 10000, 0.001, {},
+                                  engine='vectorized', cache=self.cache)
+        second = optimize_strategy(self.data, SmaCross, param_grid, 10000, 0.001, {},
+                                   engine='vectorized', cache=self.cache)
+        self.assertEqual(len(calls), 12)
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_eviction_and_invalidate(self):
+        self.run_cached(SmaCross)
+        entry_size = self.cache.size()
+        self.cache.max_bytes = int(entry_size * 2.5)
+        for n1 in (6, 7, 8):
+            self.run_cached(type('OptimizedStrategy', (SmaCross,), {'n1': n1}))
+        self.assertLessEqual(self.cache.size(), self.cache.max_bytes)
+
+        self.cache.invalidate(SmaCross)
+        self.assertEqual(self.cache.size(), 0)
+        self.run_cached(SmaCross)
+        self.assertEqual(len(calls), 5)
+        self.cache.invalidate()
+        self.assertFalse(os.path.exists(self.tmp.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
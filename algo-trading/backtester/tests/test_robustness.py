@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from src.backtest_engine import run_backtest
+from src.report_generator import ReportGenerator
+from src.robustness import path_metrics, periods_per_year, resample_indices, robustness_analysis, simulate
+from helpers import SmaCross, make_data
+
+
+class TestRobustness(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        data = make_data(1000, seed=7, drift=0.0005)
+        _, cls.results = run_backtest(SmaCross, data, 100000, 0.001, engine='vectorized')
+
+    def test_path_metrics(self):
+        returns = np.array([[0.1, -0.5, 0.2], [0.0, 0.0, 0.0]])
+        metrics = path_metrics(returns, annualization=252)
+        np.testing.assert_allclose(metrics['Return [%]'], [(1.1 * 0.5 * 1.2 - 1) * 100, 0])
+        np.testing.assert_allclose(metrics['Max. Drawdown [%]'], [-50, 0])
+        self.assertTrue(np.isnan(metrics['Sharpe Ratio'][1]))
+
+    def test_periods_per_year(self):
+        # 与回测统计相同的年化基准：股票日线 252，全天候交易 365 天
+        self.assertEqual(periods_per_year(pd.bdate_range('2020-01-01', periods=500)), 252)
+        self.assertEqual(periods_per_year(pd.date_range('2020-01-01', periods=500, freq='D')), 365)
+        self.assertEqual(periods_per_year(pd.date_range('2020-01-01', periods=24 * 30, freq='h')), 365 * 24)
+        hourly = pd.DatetimeIndex([d + pd.Timedelta(hours=h) for d in pd.bdate_range('2020-01-01', periods=60)
+                                   for h in range(10, 17)])
+        self.assertEqual(periods_per_year(hourly), 252 * 7)
+
+    def test_resample_indices(self):
+        rng = np.random.default_rng(0)
+        shuffled = resample_indices(rng, 10, 5, 'shuffle')
+        self.assertTrue((np.sort(shuffled, axis=1) == np.arange(10)).all())
+        blocks = resample_indices(rng, 100, 4, 'block', block_size=10)
+        self.assertEqual(blocks.shape, (4, 100))
+        self.assertTrue((np.diff(blocks[:, :10], axis=1) == 1).all())
+
+    def test_block_bootstrap_summary(self):
+        summary, samples = robustness_analysis(self.results, n_sims=500, seed=1)
+        self.assertEqual(len(samples), 500)
+        self.assertEqual(list(summary.index), ['Return [%]', 'Max. Drawdown [%]', 'Sharpe Ratio'])
+        self.assertAlmostEqual(summary.loc['Return [%]', 'actual'], self.results['Return [%]'], places=6)
+        self.assertLess(summary.loc['Return [%]', 'p2.5'], summary.loc['Return [%]', 'p97.5'])
+        self.assertTrue((samples['Max. Drawdown [%]'] <= 0).all())
+
+        # 同一个种子的结果可复现，进程数不影响模拟次数
+        pd.testing.assert_frame_equal(samples, simulate(self.results, 500, seed=1))
+        self.assertEqual(len(simulate(self.results, 501, seed=1, n_jobs=2)), 501)
+
+    def test_trade_shuffle_keeps_total_return(self):
+        samples = simulate(self.results, 200, method='shuffle')
+        self.assertAlmostEqual(samples['Return [%]'].std(), 0, places=8)
+        self.assertTrue(samples['Sharpe Ratio'].isna().all())
+        with self.assertRaises(ValueError):
+            simulate(self.results, 10, method='jackknife')
+
+    def test_report_includes_robustness(self):
+        summary, _ = robustness_analysis(self.results, n_sims=100)
+        params = dict(asset='btcusd', interval='1d', start_date='20200101', end_date='20221231',
+                      initial_capital=100000, commission=0.001, strategy='SmaCross')
+        report = ReportGenerator(self.results, params, robustness=summary)
+        self.assertIn('Robustness', report.generate_html_report())
+        with tempfile.TemporaryDirectory() as output_dir:
+            report.save_report(output_dir)
+            self.assertTrue(os.path.exists(os.path.join(output_dir, 'robustness_summary.csv')))
+
+
+if __name__ == '__main__':
+    unittest.main()
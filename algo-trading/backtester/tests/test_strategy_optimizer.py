@@ -0,0 +1,26 @@
+import unittest
+import pandas as pd
+from src.strategy_optimizer import optimize_strategy
+from helpers import SmaCross, make_data
+
+
+class TestOptimizeStrategy(unittest.TestCase):
+    def setUp(self):
+        self.data = make_data()
+        self.param_grid = {'n1': range(3, 9, 2), 'n2': range(15, 35, 5)}
+
+    def test_parallel_matches_serial(self):
+        serial = optimize_strategy(self.data, SmaCross, self.param_grid, 10000, 0.001, {})
+        parallel = optimize_strategy(self.data, SmaCross, self.param_grid, 10000, 0.001, {},
+                                     n_jobs=2, chunksize=3)
+        self.assertEqual(len(serial), 12)
+        pd.testing.assert_frame_equal(serial, parallel)
+
+    def test_filter_conditions(self):
+        results = optimize_strategy(self.data, SmaCross, self.param_grid, 10000, 0.001,
+                                    {'# Trades': 10 ** 6}, n_jobs=2)
+        self.assertTrue(results.empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
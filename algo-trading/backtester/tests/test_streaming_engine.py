@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from backtesting import Strategy
+from src.backtest_engine import load_data
+from src.streaming_engine import iter_chunks, run_streaming_backtest, stream_backtest
+from src.vector_engine import run_vectorized_backtest
+from helpers import SmaCross
+
+
+class TestStreamingEngine(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(11)
+        n = 5000
+        close = (100 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))).astype(np.float32)
+        open_ = np.r_[np.float32(100), close[:-1]]
+        df = pd.DataFrame({
+            'date': pd.date_range('2023-01-01', periods=n, freq='min'),
+            'open': open_, 'high': np.maximum(open_, close), 'low': np.minimum(open_, close), 'close': close,
+            'volume': rng.integers(1, 1000, n), 'symbol': 'BTCUSD',
+        })
+        self.path = os.path.join(self.tmp.name, 'CRYPTO_BTCUSD_1MIN_OHLCV_20230101_20230104.parquet')
+        df.to_parquet(self.path, index=False, row_group_size=500)
+        self.start, self.end = pd.Timestamp('2023-01-01 05:00'), pd.Timestamp('2023-01-04 03:00')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_iter_chunks_compact_and_bounded(self):
+        chunks = list(iter_chunks(self.path, self.start, self.end, chunk_rows=300))
+        self.assertTrue(all(len(chunk) <= 300 for chunk in chunks))
+        self.assertEqual(chunks[0].index[0], self.start)
+        self.assertEqual(chunks[-1].index[-1], self.end)
+        self.assertEqual(chunks[0]['Close'].dtype, np.float32)
+        self.assertEqual(chunks[0]['Volume'].dtype, np.int64)
+        self.assertEqual(sum(len(c) for c in chunks), int((self.end - self.start) / pd.Timedelta('1min')) + 1)
+
+    def test_matches_in_memory_vectorized_engine(self):
+        with patch('src.backtest_engine.DATA_DIR', self.tmp.name):
+            data = load_data('btcusd', '1min', self.start, self.end)
+            streamed = stream_backtest(SmaCross, 'btcusd', '1min', self.start, self.end, 100000, 0.001,
+                                       chunk_rows=137)
+        entries, exits = SmaCross.generate_signals(data)
+        full = run_vectorized_backtest(data, entries, exits, 100000, 0.001)
+
+        self.assertEqual(streamed['# Trades'], full['# Trades'])
+        np.testing.assert_allclose(streamed['_trades']['ExitPrice'], full['_trades']['ExitPrice'])
+        self.assertEqual(list(streamed['_trades']['EntryBar']), list(full['_trades']['EntryBar']))
+        self.assertAlmostEqual(streamed['Return [%]'], full['Return [%]'], places=6)
+        self.assertAlmostEqual(streamed['Max. Drawdown [%]'], full['Max. Drawdown [%]'], places=6)
+        self.assertAlmostEqual(streamed['Buy & Hold Return [%]'], full['Buy & Hold Return [%]'], places=4)
+        # 权益曲线按小时保存
+        self.assertLessEqual(len(streamed['_equity_curve']), 75)
+        self.assertAlmostEqual(streamed['_equity_curve']['Equity'].iloc[-1], full['_equity_curve']['Equity'].iloc[-1])
+
+    def test_requires_generate_signals(self):
+        class EventOnly(Strategy):
+            def init(self):
+                pass
+
+            def next(self):
+                pass
+
+        with self.assertRaises(TypeError):
+            run_streaming_backtest(EventOnly, iter_chunks(self.path), 100000, 0.001)
+
+
+if __name__ == '__main__':
+    unittest.main()
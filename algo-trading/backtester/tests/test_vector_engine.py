@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+from src.backtest_engine import run_backtest
+from src.vector_engine import run_vectorized_backtest
+from helpers import SmaCross, make_data
+
+
+class TestVectorEngine(unittest.TestCase):
+    def setUp(self):
+        self.data = make_data(seed=1)
+
+    def test_matches_event_engine_trades(self):
+        _, event = run_backtest(SmaCross, self.data, 1_000_000, 0.001)
+        bt, vector = run_backtest(SmaCross, self.data, 1_000_000, 0.001, engine='vectorized')
+        self.assertIsNone(bt)
+        self.assertEqual(vector['# Trades'], event['# Trades'])
+        np.testing.assert_array_equal(vector['_trades']['EntryBar'], event['_trades']['EntryBar'])
+        np.testing.assert_array_equal(vector['_trades']['ExitBar'], event['_trades']['ExitBar'])
+        # backtesting.py 只买整数股，收益率允许少量误差
+        self.assertAlmostEqual(vector['Return [%]'], event['Return [%]'], delta=0.1)
+        self.assertAlmostEqual(vector['Max. Drawdown [%]'], event['Max. Drawdown [%]'], delta=0.1)
+        # save_results 读取的指标
+        for key in ['Start', 'End', 'Duration', 'Exposure Time [%]', 'Equity Final [$]', 'Equity Peak [$]',
+                    'Return [%]', 'Buy & Hold Return [%]', 'Max. Drawdown [%]', 'Avg. Drawdown [%]',
+                    'Max. Drawdown Duration', 'Avg. Drawdown Duration', '# Trades', 'Win Rate [%]',
+                    'Best Trade [%]', 'Worst Trade [%]', 'Avg. Trade [%]', 'Max. Trade Duration',
+                    'Avg. Trade Duration', 'Profit Factor', 'Expectancy [%]', 'SQN', 'Sharpe Ratio',
+                    'Sortino Ratio', 'Calmar Ratio']:
+            self.assertIn(key, vector.index)
+
+    def test_commission_and_sizing(self):
+        data = self.data.iloc[:4].copy()
+        data['Open'] = [100.0, 100.0, 110.0, 120.0]
+        data['Close'] = [100.0, 105.0, 115.0, 120.0]
+        entries = [True, False, False, False]
+        exits = [False, True, False, False]
+        stats = run_vectorized_backtest(data, entries, exits, 1000, 0.01, size=0.5)
+        # 第 1 根开盘以 101 买入，第 2 根开盘以 108.9 卖出，半仓
+        expected_return = 0.5 * (110 * 0.99 / 101 - 1)
+        self.assertAlmostEqual(stats['_trades']['ReturnPct'].iloc[0], 110 * 0.99 / 101 - 1)
+        self.assertAlmostEqual(stats['Equity Final [$]'], 1000 * (1 + expected_return))
+        self.assertAlmostEqual(stats['_equity_curve']['Equity'].iloc[1], 500 + 500 * 105 / 101)
+
+    def test_no_signals(self):
+        stats = run_vectorized_backtest(self.data, np.zeros(len(self.data)), np.zeros(len(self.data)), 1000, 0.001)
+        self.assertEqual(stats['# Trades'], 0)
+        self.assertEqual(stats['Return [%]'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import numpy as np
+import pandas as pd
+from src.indicator_cache import IndicatorCache, cached_indicator, default_cache
+from src.walk_forward import make_windows, walk_forward, summarize
+import helpers
+from helpers import make_data
+
+
+@cached_indicator(causal=True)
+def SMA(values, n):
+    return pd.Series(values).rolling(n).mean().values
+
+
+class SmaCross(helpers.SmaCross):
+    ma = staticmethod(SMA)
+
+
+class TestWalkForward(unittest.TestCase):
+    def setUp(self):
+        self.data = make_data(600, seed=3)
+        self.grid = {'n1': range(5, 16, 5), 'n2': range(20, 41, 20)}
+
+    def tearDown(self):
+        default_cache.clear()
+        default_cache.clear_bases()
+
+    def test_make_windows(self):
+        windows = make_windows(self.data.index, 200, 100)
+        self.assertEqual([(w['is_start'], w['is_end'], w['oos_end']) for w in windows],
+                         [(0, 200, 300), (100, 300, 400), (200, 400, 500), (300, 500, 600)])
+        anchored = make_windows(self.data.index, 200, 100, anchored=True)
+        self.assertTrue(all(w['is_start'] == 0 for w in anchored))
+        by_time = make_windows(self.data.index, '200D', '100D')
+        self.assertEqual([w['oos_start'] for w in by_time], [200, 300, 400, 500])
+        with self.assertRaises(ValueError):
+            make_windows(self.data.index, 200, 100, step=50)
+        with self.assertRaises(ValueError):
+            make_windows(self.data.index, 200, '100D')
+
+    def test_causal_reuse_slices_full_computation(self):
+        cache = IndicatorCache()
+        close = self.data['Close']
+        cache.register_base(self.data)
+
+        def sma(values, n):
+            return pd.Series(values).rolling(n).mean().values
+
+        full = sma(close.to_numpy(), 10)
+        for start in (0, 50, 300):
+            window = close.iloc[start:start + 200]
+            value = cache.get_or_compute_causal(sma, (window, 10), {})
+            np.testing.assert_allclose(value, full[start:start + 200])
+        self.assertEqual((cache.misses, cache.hits), (1, 2))
+
+        # 不属于已登记序列的数据按普通缓存处理
+        other = pd.Series(np.arange(200.0), index=self.data.index[:200])
+        np.testing.assert_allclose(cache.get_or_compute_causal(sma, (other, 10), {}), sma(other.to_numpy(), 10))
+
+    def test_walk_forward_serial_and_parallel(self):
+        windows, equity = walk_forward(self.data, SmaCross, self.grid, 10000, 0.002, 200, 100)
+        self.assertEqual(len(windows), 4)
+        self.assertEqual(len(equity), 400)
+        self.assertEqual(equity.index[0], self.data.index[200])
+        self.assertAlmostEqual(equity.iloc[0], 10000)
+        self.assertTrue(set(self.grid).issubset(windows.columns))
+        self.assertTrue(windows['n1'].isin(list(self.grid['n1'])).all())
+        self.assertEqual(summarize(windows, equity, 10000)['windows'], 4)
+        # 复用指标时每个参数值只在完整数据上计算一次
+        self.assertEqual(len(default_cache), 5)
+
+        parallel_windows, parallel_equity = walk_forward(self.data, SmaCross, self.grid, 10000, 0.002, 200, 100,
+                                                         n_jobs=2)
+        # 共享内存中的时间索引统一为纳秒精度，只比较数值
+        pd.testing.assert_frame_equal(windows, parallel_windows, check_dtype=False)
+        np.testing.assert_allclose(equity.to_numpy(), parallel_equity.to_numpy())
+
+
+if __name__ == '__main__':
+    unittest.main()
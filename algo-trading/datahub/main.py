@@ -1,27 +1,24 @@
 import os
+import json
+import time
 import logging
+import argparse
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import pandas as pd
 from src.data_fetcher import YahooFetcher
-from src.data_processor import YahooProcessor
+from src.data_processor import YahooProcessor, Resampler
+from src.catalog import DataCatalog
+from src.storage import PartitionedStore, is_dataset, read_dataset
+from src.backfill import backfill_gaps
+from src.symbols import determine_asset_type, clean_symbol
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DATA_DIR = '/app/data'
 
-def determine_asset_type(symbol):
-    if symbol.startswith('^'):
-        return 'BOND'
-    elif '=' in symbol:
-        return 'FOREX'
-    elif symbol.endswith('=F'):
-        return 'FUTURE'
-    elif '-' in symbol:
-        return 'CRYPTO'
-    else:
-        return 'STOCK'
-
 def determine_interval(asset_type):
     if asset_type in ['STOCK', 'BOND', 'CRYPTO']:
         return '1D'
@@ -42,7 +39,7 @@ def ensure_dir(file_path):
 
 def display_parquet_sample(file_path, num_rows=5):
     try:
-        df = pd.read_parquet(file_path)
+        df = read_dataset(file_path) if is_dataset(file_path) else pd.read_parquet(file_path)
         
         print(f"\n文件路径: {file_path}")
         print(f"数据形状: {df.shape}")
@@ -63,98 +60,207 @@ def display_parquet_sample(file_path, num_rows=5):
     except Exception as e:
         logger.error(f"读取文件时发生错误: {str(e)}")
 
-def find_existing_file(symbol, asset_type, interval, data_type):
-    for filename in os.listdir(DATA_DIR):
-        if filename.startswith(f"{asset_type}_{symbol.replace('^', '').replace('=', '').replace('-', '')}_{interval}_{data_type}") and filename.endswith(".parquet"):
-            return os.path.join(DATA_DIR, filename)
-    return None
+def find_existing_file(symbol, asset_type, interval, data_type, catalog=None):
+    catalog = catalog or DataCatalog(DATA_DIR)
+    entries = catalog.find(asset_type, clean_symbol(symbol), interval, data_type)
+    if not entries:
+        return None
+    # 优先使用分区存储的数据集目录；否则取覆盖日期最晚的旧格式单文件
+    datasets = [e for e in entries if e.get('partitioned')]
+    if datasets:
+        return catalog.path(datasets[0])
+    latest = max(entries, key=lambda e: (pd.Timestamp(e['end']).value if e['end'] else 0, e['file']))
+    return catalog.path(latest)
+
+@contextmanager
+def _timed(stats, key):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats[key] = stats.get(key, 0.0) + time.perf_counter() - started
 
-def update_data(symbol, asset_type, interval, data_type, existing_file):
-    fetcher = YahooFetcher()
+def update_data(symbol, asset_type, interval, data_type, existing_file, catalog=None, store=None,
+                fetcher=None, stats=None):
+    """Bring one symbol's dataset up to date; per-stage seconds and row counts are recorded into `stats`."""
+    catalog = catalog or DataCatalog(DATA_DIR)
+    store = store or PartitionedStore(DATA_DIR)
+    fetcher = fetcher or YahooFetcher()
     processor = YahooProcessor()
+    symbol_clean = clean_symbol(symbol)
 
-    if existing_file:
-        logger.info(f"读取现有文件: {existing_file}")
-        existing_data = pd.read_parquet(existing_file)
-        last_date = existing_data['date'].max()
-        today = datetime.now().date()
-        
-        if last_date.date() == today:
-            logger.info("数据已是最新，无需更新。")
-            return existing_file
+    if existing_file and not is_dataset(existing_file):
+        # 旧格式的单个文件：一次性导入分区存储，之后只做增量写入
+        logger.info(f"将现有文件导入分区存储: {existing_file}")
+        with _timed(stats, 'write'):
+            store.write(asset_type, symbol_clean, interval, data_type, pd.read_parquet(existing_file))
+        # 先登记新数据集再删除旧文件，后面无论是否提前返回索引中都有这份数据
+        catalog.register(store.path(asset_type, symbol_clean, interval, data_type))
+        os.remove(existing_file)
+        catalog.remove(existing_file)
 
-        logger.info(f"最后更新日期: {last_date.date()}, 今天: {today}")
-        # 删除最后一天的数据（可能不完整）
-        existing_data = existing_data[existing_data['date'] < last_date]
-        
-        # 获取新数据
-        start_date = last_date.date() - timedelta(days=1)  # 往前一天，以确保覆盖
-        logger.info(f"正在从Yahoo Finance获取 {symbol} 从 {start_date} 到现在的数据...")
-        raw_data = fetcher.fetch(symbols=[symbol], start_date=start_date, end_date=None, interval=interval)
+    # 最后日期直接从数据集的 manifest 读取，不需要读取历史数据
+    dataset_path = store.path(asset_type, symbol_clean, interval, data_type)
+    last_date = store.last_timestamp(asset_type, symbol_clean, interval, data_type)
+    today = datetime.now().date()
+    since = None
+    if last_date is not None and last_date.date() == today:
+        logger.info("数据已是最新，无需更新。")
     else:
-        logger.info(f"正在从Yahoo Finance获取 {symbol} 的所有历史数据...")
-        raw_data = fetcher.fetch(symbols=[symbol], start_date=None, end_date=None, interval=interval)
+        if last_date is not None:
+            logger.info(f"最后更新日期: {last_date.date()}, 今天: {today}")
+            # 往前一天获取，最后一天（可能不完整）的数据会被新数据替换
+            start_date = last_date.date() - timedelta(days=1)
+            logger.info(f"正在从Yahoo Finance获取 {symbol} 从 {start_date} 到现在的数据...")
+        else:
+            start_date = None
+            logger.info(f"正在从Yahoo Finance获取 {symbol} 的所有历史数据...")
+        with _timed(stats, 'fetch'):
+            raw_data = fetcher.fetch(symbols=[symbol], start_date=start_date, end_date=None, interval=interval)
 
-    if not raw_data:
-        logger.error("未能获取到数据。请检查输入的代码是否正确，以及是否有可用的数据。")
-        return None
+        if not raw_data:
+            logger.error("未能获取到数据。请检查输入的代码是否正确，以及是否有可用的数据。")
+            return None
 
-    logger.info("处理数据...")
-    new_data = processor.process(raw_data, asset_type=asset_type)
+        logger.info("处理数据...")
+        with _timed(stats, 'process'):
+            new_data = processor.process(raw_data, asset_type=asset_type)
 
-    if new_data.empty:
-        logger.error("处理后的数据为空。请检查处理逻辑。")
-        return None
+        if new_data.empty:
+            logger.error("处理后的数据为空。请检查处理逻辑。")
+            return None
 
-    if existing_file:
-        # 合并新旧数据
-        combined_data = pd.concat([existing_data, new_data]).drop_duplicates(subset=['date', 'symbol'], keep='last')
-        combined_data = combined_data.sort_values('date')
-        logger.info(f"合并后的数据形状: {combined_data.shape}")
-    else:
-        combined_data = new_data
-        logger.info(f"新数据形状: {combined_data.shape}")
-
-    # 保存更新后的数据
-    start_date = combined_data['date'].min().strftime('%Y%m%d')
-    end_date = combined_data['date'].max().strftime('%Y%m%d')
-    symbol_clean = symbol.replace('^', '').replace('=', '').replace('-', '')
-    new_file_name = f"{asset_type}_{symbol_clean}_{interval}_{data_type}_{start_date}_{end_date}.parquet"
-    new_file_path = os.path.join(DATA_DIR, new_file_name)
-
-    # 清理步骤：尝试删除可能存在的旧文件
-    if os.path.exists(new_file_path):
+        # 只写入新数据所在的分区碎片，并原子地替换与之重叠的最后一个碎片
+        logger.info(f"新数据形状: {new_data.shape}")
+        try:
+            with _timed(stats, 'write'):
+                store.write(asset_type, symbol_clean, interval, data_type, new_data)
+        except Exception as e:
+            logger.error(f"保存数据时发生错误: {str(e)}")
+            return None
+        if stats is not None:
+            stats['rows'] = len(new_data)
+        since = new_data['date'].min()
+
+    if last_date is not None:
+        # 修补历史中间的缺口（新建的数据集是完整下载的，不需要）
         try:
-            os.remove(new_file_path)
-            logger.info(f"已删除现有文件: {new_file_path}")
+            with _timed(stats, 'backfill'):
+                repaired = backfill_gaps(store, fetcher, processor, symbol, asset_type, symbol_clean, interval,
+                                         data_type)
         except Exception as e:
-            logger.error(f"删除现有文件时发生错误: {str(e)}")
+            logger.error(f"修补数据缺口时发生错误: {str(e)}")
+            repaired = None
+        if repaired is not None:
+            since = repaired if since is None else min(since, repaired)
 
-    logger.info(f"正在保存数据到文件: {new_file_path}")
+    if since is None:
+        return dataset_path
+    catalog.register(dataset_path)
+
+    # 由新数据更新派生的粗周期 K 线，只重新计算受影响的时间段
+    derived = {}
     try:
-        combined_data.to_parquet(new_file_path, index=False)
-        logger.info(f"数据已成功保存。文件大小: {os.path.getsize(new_file_path)} bytes")
+        with _timed(stats, 'resample'):
+            derived = Resampler(store, catalog).update(asset_type, symbol_clean, interval, data_type, since=since)
     except Exception as e:
-        logger.error(f"保存文件时发生错误: {str(e)}")
-        return None
+        logger.error(f"生成派生周期数据时发生错误: {str(e)}")
 
-    if existing_file and existing_file != new_file_path:
-        try:
-            os.remove(existing_file)
-            logger.info(f"已删除旧文件: {existing_file}")
-        except Exception as e:
-            logger.error(f"删除旧文件时发生错误: {str(e)}")
+    # 所有写入完成后发布供各容器 mmap 读取的快照
+    try:
+        with _timed(stats, 'publish'):
+            for target in [interval] + list(derived):
+                store.publish(asset_type, symbol_clean, target, data_type)
+    except Exception as e:
+        logger.error(f"发布快照时发生错误: {str(e)}")
+    return dataset_path
 
-    # 验证文件是否成功创建
-    if os.path.exists(new_file_path):
-        logger.info(f"文件成功创建: {new_file_path}")
+def load_watchlist(path):
+    """Symbols from a JSON list / {"symbols": [...]} file or a text file (whitespace/comma separated, # comments)."""
+    with open(path, 'r') as f:
+        content = f.read()
+    if path.endswith('.json'):
+        payload = json.loads(content)
+        symbols = payload['symbols'] if isinstance(payload, dict) else payload
     else:
-        logger.error(f"文件创建失败: {new_file_path}")
-        return None
+        symbols = [token for line in content.splitlines()
+                   for token in line.split('#', 1)[0].replace(',', ' ').split()]
+    # 去重并保持顺序
+    return list(dict.fromkeys(s.strip().upper() for s in symbols if s.strip()))
+
+def refresh_symbol(symbol, fetcher, catalog):
+    """Headless update of one symbol; returns a flat report record."""
+    asset_type = determine_asset_type(symbol)
+    interval = determine_interval(asset_type)
+    data_type = determine_data_type(asset_type)
+    # 每个任务一个 store 实例，bytes_written 只统计这个代码写出的碎片
+    store = PartitionedStore(DATA_DIR)
+    stats = {}
+    started = time.perf_counter()
+    error = None
+    try:
+        existing_file = find_existing_file(symbol, asset_type, interval, data_type, catalog)
+        path = update_data(symbol, asset_type, interval, data_type, existing_file, catalog, store,
+                           fetcher=fetcher, stats=stats)
+        status = 'ok' if path else 'failed'
+    except Exception as e:
+        logger.exception(f"{symbol}: 更新失败")
+        status, error = 'error', str(e)
+    record = {'symbol': symbol, 'asset_type': asset_type, 'interval': interval, 'status': status,
+              'rows': stats.get('rows', 0), 'bytes_written': store.bytes_written}
+    for stage in ('fetch', 'process', 'write', 'backfill', 'resample', 'publish'):
+        record[f'{stage}_s'] = round(stats.get(stage, 0.0), 4)
+    record['total_s'] = round(time.perf_counter() - started, 4)
+    record['error'] = error
+    return record
+
+def refresh_universe(symbols, workers=4, fetcher=None, catalog=None):
+    """Update every symbol on a bounded thread pool; records come back in watchlist order."""
+    # 所有任务共用一个 fetcher（令牌桶限速对整个批次生效）和一个索引
+    fetcher = fetcher or YahooFetcher()
+    catalog = catalog or DataCatalog(DATA_DIR)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(symbols) or 1))) as executor:
+        return list(executor.map(lambda s: refresh_symbol(s, fetcher, catalog), symbols))
 
-    return new_file_path
+def _emit(record, report):
+    line = json.dumps(record, default=str)
+    if report:
+        with open(report, 'a') as f:
+            f.write(line + '\n')
+    else:
+        print(line, flush=True)
+
+def run_refresh(watchlist, workers=4, every=None, runs=None, report=None, fetcher=None):
+    """Refresh the watchlist once, or every `every` (a Timedelta) until `runs` passes have completed."""
+    completed = 0
+    while True:
+        started = time.time()
+        # 每次运行重新读取观察列表，修改后下一轮生效
+        symbols = load_watchlist(watchlist)
+        records = refresh_universe(symbols, workers, fetcher)
+        for record in records:
+            _emit(record, report)
+        _emit({'event': 'run', 'started': datetime.fromtimestamp(started).isoformat(), 'symbols': len(records),
+               'ok': sum(r['status'] == 'ok' for r in records),
+               'bytes_written': sum(r['bytes_written'] for r in records),
+               'seconds': round(time.time() - started, 4)}, report)
+        completed += 1
+        if every is None or (runs is not None and completed >= runs):
+            return records
+        # 按固定节奏运行：下一次从本次开始时间起算
+        time.sleep(max(0.0, started + every.total_seconds() - time.time()))
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Yahoo Finance 数据更新")
+    parser.add_argument('--watchlist', help="观察列表文件（.json 或文本，每行一个或多个代码）；不指定则进入交互模式")
+    parser.add_argument('--workers', type=int, default=4, help="并行更新的代码数")
+    parser.add_argument('--every', type=pd.Timedelta, default=None, help="定时运行的间隔，例如 1h、30min、1d")
+    parser.add_argument('--runs', type=int, default=None, help="定时运行的次数，默认不限")
+    parser.add_argument('--report', default=None, help="JSON Lines 报告文件，默认输出到标准输出")
+    return parser.parse_args(argv)
+
+def interactive():
     print("欢迎使用Yahoo Finance数据提取工具")
     print("请输入您要提取资产的Yahoo代码：")
     print("例如 股票: AAPL, 债券: ^IRX, 商品: CL=F, 加密货币: BTC-USD, 外汇: EURUSD=X")
@@ -170,13 +276,14 @@ def main():
     logger.info(f"Data Type: {data_type}")
     
     try:
-        existing_file = find_existing_file(symbol, asset_type, interval, data_type)
+        catalog = DataCatalog(DATA_DIR)
+        existing_file = find_existing_file(symbol, asset_type, interval, data_type, catalog)
         if existing_file:
             logger.info(f"找到现有文件: {existing_file}")
         else:
             logger.info("未找到现有文件，将创建新文件。")
 
-        updated_file = update_data(symbol, asset_type, interval, data_type, existing_file)
+        updated_file = update_data(symbol, asset_type, interval, data_type, existing_file, catalog)
 
         if updated_file:
             print("\n正在显示更新后的Parquet文件的数据样本...")
@@ -187,5 +294,12 @@ def main():
     except Exception as e:
         logger.exception(f"发生错误: {str(e)}")
 
+def main(argv=None):
+    args = parse_args(argv)
+    if args.watchlist is None:
+        interactive()
+        return
+    run_refresh(args.watchlist, workers=args.workers, every=args.every, runs=args.runs, report=args.report)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -10,20 +10,241 @@
 # 如果将来需要将多个数据源整合在一起，API 可以作为一个统一的接入点。
 
 
-from flask import Flask, request, jsonify
-from database import Database
 
-app = Flask(__name__)
-db = Database()
+import os
+import queue
+import threading
+import logging
+from contextlib import contextmanager
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from flask import Flask, Response, request
 
-@app.route('/api/v1/market-data/<symbol>', methods=['GET'])
-def get_market_data(symbol):
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    asset_type = request.args.get('asset_type', 'stocks')
+from src.database import Database, DATA_DIR
+from src.catalog import DataCatalog
+from src.storage import is_dataset, read_manifest
 
-    data = db.fetch_data(asset_type, symbol, start_date, end_date)
-    return jsonify(data.to_dict(orient='records'))
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 响应格式按 Accept 头协商（也可以用 ?format= 指定）：JSON（默认）、Arrow IPC 流或 parquet。
+# 结果按 CHUNK_ROWS 行一块流式输出，大范围查询不会一次性在内存中组装。
+# ?source=parquet 时直接读取 datahub 的 parquet 数据文件，不经过 SQLite。
+ARROW_MIME = 'application/vnd.apache.arrow.stream'
+PARQUET_MIME = 'application/vnd.apache.parquet'
+JSON_MIME = 'application/json'
+FORMATS = {'json': JSON_MIME, 'arrow': ARROW_MIME, 'parquet': PARQUET_MIME}
+CHUNK_ROWS = 50_000
+POOL_SIZE = 8
+OUTPUT_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume', 'symbol']
+# 所有响应的结构：两种数据源、所有碎片的每一块都转换成这个 schema，查询结果为空时也使用它。
+# 成交量用 float64，加密货币的成交量有小数
+OUTPUT_SCHEMA = pa.schema([('date', pa.timestamp('s', tz='UTC')), ('open', pa.float64()), ('high', pa.float64()),
+                           ('low', pa.float64()), ('close', pa.float64()), ('volume', pa.float64()),
+                           ('symbol', pa.string())])
+# API 使用 SQLite 表名（stocks 等），数据文件使用 main.py 的资产类型
+ASSET_TYPES = {'stocks': 'STOCK', 'bonds': 'BOND', 'forex': 'FOREX', 'futures': 'FUTURE', 'crypto': 'CRYPTO'}
+
+
+class ConnectionPool:
+    """At most `size` SQLite connections, each used by one request thread at a time."""
+
+    def __init__(self, factory, size=POOL_SIZE):
+        self.factory = factory
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        try:
+            db = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                create = self.created < self.size
+                if create:
+                    self.created += 1
+            db = self.factory() if create else self.idle.get()
+        try:
+            yield db
+        finally:
+            self.idle.put(db)
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self.created = 0
+
+
+class _ChunkSink:
+    """Write-only file object whose buffered bytes are drained after every record batch."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _sqlite_batches(pool, table_name, symbol, start_date, end_date, chunk_rows):
+    with pool.connection() as db:
+        for df in db.iter_data(table_name, symbol, start_date, end_date, chunk_rows):
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            # 纪元秒直接重新解释为 UTC 时间戳，不逐行转换
+            date = table.column('date').cast(pa.int64()).cast(pa.timestamp('s', tz='UTC'))
+            yield _to_output(table.set_column(0, 'date', date)).to_batches()[0]
+
+
+def _to_output(table):
+    """Cast a table to OUTPUT_SCHEMA; columns it lacks are filled with nulls."""
+    columns = [table.column(field.name) if field.name in table.column_names else pa.nulls(table.num_rows, field.type)
+               for field in OUTPUT_SCHEMA]
+    # 时间戳统一到 UTC 的秒精度（K 线没有亚秒部分），旧碎片的 float32/整数列统一成 float64
+    return pa.Table.from_arrays(columns, names=OUTPUT_SCHEMA.names).cast(OUTPUT_SCHEMA, safe=False)
+
+
+def _localize(ts, arrow_type):
+    # 与 SQLite 数据源一致：不带时区的查询日期按 UTC 解释
+    if ts is None:
+        return None
+    ts = pd.Timestamp(ts)
+    tz = arrow_type.tz if pa.types.is_timestamp(arrow_type) else None
+    if tz is not None and ts.tz is None:
+        ts = ts.tz_localize('UTC')
+    elif tz is None and ts.tz is not None:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+    if not pa.types.is_timestamp(arrow_type):
+        return ts
+    # 过滤条件与列的类型（精度、时区）完全一致，pyarrow 不比较不同精度的时间戳
+    nanos = pa.array([ts.value], pa.timestamp('ns', tz='UTC' if ts.tz is not None else None))
+    return nanos.cast(arrow_type, safe=False)[0]
+
+
+def _parquet_files(data_dir, asset_type, symbol, interval, start_date, end_date):
+    catalog = DataCatalog(data_dir)
+    asset = ASSET_TYPES.get(asset_type.lower(), asset_type.upper())
+    entries = catalog.find(asset, symbol.upper(), interval.upper(), 'OHLCV', start_date, end_date)
+    paths = [catalog.path(entry) for entry in entries]
+    datasets = [path for path in paths if is_dataset(path)]
+    if datasets:
+        # 分区数据集已经包含导入的旧文件，两者都读会得到重复的行
+        return [os.path.join(path, f['file']) for path in datasets for f in read_manifest(path)['fragments']]
+    return paths
+
+
+def _parquet_batches(files, start_date, end_date, chunk_rows):
+    for path in files:
+        schema = pq.read_schema(path)
+        columns = [name for name in OUTPUT_COLUMNS if name in schema.names]
+        date_type = schema.field('date').type
+        start, end = _localize(start_date, date_type), _localize(end_date, date_type)
+        filters = [('date', '>=', start)] if start is not None else []
+        filters += [('date', '<=', end)] if end is not None else []
+        # 按 row group 统计信息跳过范围外的数据
+        table = pq.read_table(path, columns=columns, filters=filters or None)
+        yield from _to_output(table).to_batches(max_chunksize=chunk_rows)
+
+
+def _encode(batches, fmt):
+    """Serialize record batches incrementally, yielding bytes as each batch is written."""
+    if fmt == 'json':
+        yield b'['
+        first = True
+        for batch in batches:
+            # pandas 的 C 实现序列化整块，不为每行构造 dict
+            body = batch.to_pandas().to_json(orient='records', date_format='iso')[1:-1]
+            if body:
+                yield (b'' if first else b',') + body.encode()
+                first = False
+        yield b']'
+        return
+
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, OUTPUT_SCHEMA) if fmt == 'arrow' else pq.ParquetWriter(sink, OUTPUT_SCHEMA)
+    for batch in batches:
+        if fmt == 'arrow':
+            writer.write_batch(batch)
+        else:
+            writer.write_table(pa.Table.from_batches([batch]))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def _negotiate():
+    fmt = request.args.get('format')
+    if fmt is not None:
+        return fmt if fmt in FORMATS else None
+    best = request.accept_mimetypes.best_match([JSON_MIME, ARROW_MIME, PARQUET_MIME], default=JSON_MIME)
+    return {mime: name for name, mime in FORMATS.items()}[best]
+
+
+def create_app(data_dir=DATA_DIR, pool_size=POOL_SIZE, chunk_rows=CHUNK_ROWS):
+    app = Flask(__name__)
+    app.config.update(DATA_DIR=data_dir, CHUNK_ROWS=chunk_rows)
+    pool = ConnectionPool(lambda: Database(data_dir=data_dir), pool_size)
+    app.extensions['db_pool'] = pool
+
+    @app.route('/api/v1/market-data/<symbol>', methods=['GET'])
+    def get_market_data(symbol):
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        asset_type = request.args.get('asset_type', 'stocks')
+        source = request.args.get('source', 'sqlite')
+        fmt = _negotiate()
+        if fmt is None:
+            return {'error': f"format must be one of {sorted(FORMATS)}"}, 406
+
+        try:
+            # 响应开始输出（状态码 200 已发出）之后的错误无法再返回给客户端，能预先检查的都在这里检查
+            for value in (start_date, end_date):
+                if value is not None:
+                    pd.Timestamp(value)
+            if source == 'parquet':
+                files = _parquet_files(data_dir, asset_type, symbol, request.args.get('interval', '1D'), start_date,
+                                       end_date)
+                if not files:
+                    return {'error': f"No parquet data for {symbol}"}, 404
+                batches = _parquet_batches(files, start_date, end_date, chunk_rows)
+            elif source == 'sqlite':
+                with pool.connection() as db:
+                    if not db.has_table(asset_type):
+                        return {'error': f"No data for asset type {asset_type}"}, 404
+                batches = _sqlite_batches(pool, asset_type, symbol, start_date, end_date, chunk_rows)
+            else:
+                return {'error': "source must be 'sqlite' or 'parquet'"}, 400
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        return Response(_encode(batches, fmt), mimetype=FORMATS[fmt])
+
+    return app
+
+
+app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True, threaded=True)
@@ -0,0 +1,148 @@
+import logging
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import (AbstractHolidayCalendar, Holiday, GoodFriday, USMartinLutherKingJr,
+                                    USPresidentsDay, USMemorialDay, USLaborDay, USThanksgivingDay,
+                                    nearest_workday, sunday_to_monday)
+from src.data_processor import INTERVALS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 缺口修补：按周期和资产类型的交易日历，把每根 K 线映射到“交易时钟”上的序号，
+# 相邻两根的序号差减一就是中间缺少的 K 线数，全部用 numpy 向量化计算。
+#
+#   CRYPTO          全天候交易，按周期步长计数
+#   FOREX 日内      24/5，纽约时间周五 17:00 到周日 17:00 休市
+#   FOREX 日线      按工作日计数
+#   其他            按纽约证券交易所的交易日（工作日去掉交易所假日）计数，只检测整天的缺失
+#
+# 临时休市、停牌等日历之外的缺口：修补时请求过但仍然没有数据的记入数据集 manifest 的
+# meta['known_gaps']，以后不再请求。相距较近的缺口合并成一次请求。
+
+WEEK = pd.Timedelta(days=7).value
+FOREX_OPEN = pd.Timedelta(days=5).value
+# 2000-01-02 是周日，纽约时间 17:00 外汇市场开盘
+FOREX_WEEK_START = pd.Timestamp('2000-01-02 17:00').value
+# 缺口之间相距不超过这个时间时合并为一次请求
+COALESCE = {'1D': pd.Timedelta(days=14)}
+DEFAULT_COALESCE = pd.Timedelta(days=1)
+
+
+class ExchangeHolidayCalendar(AbstractHolidayCalendar):
+    """Full-day closures of the New York Stock Exchange (also used for US futures and bond quotes)."""
+    rules = [
+        # 元旦是周六时交易所不在前一个周五休市
+        Holiday('New Years Day', month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-01-01', observance=nearest_workday),
+        Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas', month=12, day=25, observance=nearest_workday),
+    ]
+
+
+EXCHANGE_HOLIDAYS = ExchangeHolidayCalendar().holidays('1970-01-01', '2099-12-31').values.astype('datetime64[D]')
+
+
+def _wall_ns(dates, tz=None):
+    if tz is not None and dates.dt.tz is not None:
+        dates = dates.dt.tz_convert(tz)
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates.to_numpy().astype('datetime64[ns]').view(np.int64)
+
+
+def calendar_positions(dates, interval, asset_type):
+    """Position of every bar on the expected trading calendar; consecutive expected bars differ by 1."""
+    step = INTERVALS[interval].value
+    intraday = INTERVALS[interval] < pd.Timedelta(days=1)
+    if asset_type == 'CRYPTO':
+        return _wall_ns(dates) // step
+    if asset_type == 'FOREX' and intraday:
+        # 去掉每周的休市时段后按步长计数
+        elapsed = _wall_ns(dates, 'America/New_York') - FOREX_WEEK_START
+        weeks, offset = np.divmod(elapsed, WEEK)
+        trading = weeks * FOREX_OPEN + np.minimum(offset, FOREX_OPEN)
+        return trading // step
+    days = _wall_ns(dates).astype('datetime64[ns]').astype('datetime64[D]')
+    holidays = EXCHANGE_HOLIDAYS if asset_type != 'FOREX' else []
+    return np.busday_count(np.datetime64('1970-01-01'), days, holidays=holidays)
+
+
+def find_gaps(dates, interval, asset_type, min_missing=1):
+    """Missing stretches inside `dates` (sorted) as a DataFrame of the bars bounding each gap.
+
+    `start` and `end` are the existing bars just before and just after the gap, so the
+    missing bars lie strictly between them; `missing` is the expected number of bars.
+    """
+    dates = pd.Series(dates).reset_index(drop=True)
+    missing = np.diff(calendar_positions(dates, interval, asset_type)) - 1 if len(dates) > 1 else np.array([], int)
+    idx = np.flatnonzero(missing >= min_missing)
+    return pd.DataFrame({'start': dates.iloc[idx].reset_index(drop=True),
+                         'end': dates.iloc[idx + 1].reset_index(drop=True),
+                         'missing': missing[idx].astype(np.int64)})
+
+
+def coalesce_gaps(gaps, max_distance):
+    """Merge gaps separated by at most `max_distance` into single [start, end] request ranges."""
+    if gaps.empty:
+        return gaps[['start', 'end']].copy()
+    starts, ends = gaps['start'].reset_index(drop=True), gaps['end'].reset_index(drop=True)
+    new_group = np.r_[True, (starts.iloc[1:].to_numpy() - ends.iloc[:-1].to_numpy()) > max_distance.to_timedelta64()]
+    group = np.cumsum(new_group)
+    return pd.DataFrame({'start': starts.groupby(group).min(), 'end': ends.groupby(group).max()}).reset_index(drop=True)
+
+
+def _gap_keys(starts, ends):
+    return [f"{s.isoformat()}/{e.isoformat()}" for s, e in zip(starts, ends)]
+
+
+def backfill_gaps(store, fetcher, processor, symbol, asset_type, symbol_clean, interval, data_type,
+                  min_missing=1):
+    """Detect holes in a stored dataset, refetch only those ranges and merge them in place.
+
+    Returns the first date that was rewritten, or None when nothing changed.
+    """
+    key = (asset_type, symbol_clean, interval, data_type)
+    dates = store.read(*key, columns=['date'])['date']
+    gaps = find_gaps(dates, interval, asset_type, min_missing)
+    meta = store.meta(*key)
+    known = set(meta.get('known_gaps', []))
+    if known and not gaps.empty:
+        gaps = gaps[~pd.Series(_gap_keys(gaps['start'], gaps['end'])).isin(known).to_numpy()]
+    if gaps.empty:
+        return None
+
+    requests = coalesce_gaps(gaps, COALESCE.get(interval, DEFAULT_COALESCE))
+    logger.info(f"{symbol}: {len(gaps)} 个缺口（共 {int(gaps['missing'].sum())} 根 K 线），合并为 {len(requests)} 次请求")
+    step = INTERVALS[interval]
+    first_written = None
+    for start, end in zip(requests['start'], requests['end']):
+        raw = fetcher.fetch(symbols=[symbol], start_date=start, end_date=end + step, interval=interval)
+        fetched = processor.process(raw, asset_type=asset_type) if raw else pd.DataFrame()
+        if fetched.empty:
+            continue
+        # 只补入原来没有的 K 线，已有的数据保持不变
+        existing = store.read(*key, start=start, end=end)
+        fetched = fetched[(fetched['date'] > start) & (fetched['date'] < end)]
+        fetched = fetched[~fetched['date'].isin(existing['date'])]
+        if fetched.empty:
+            continue
+        store.write(*key, pd.concat([existing, fetched], ignore_index=True))
+        first_written = fetched['date'].min() if first_written is None else min(first_written, fetched['date'].min())
+
+    # 请求过仍然存在的缺口（临时休市、停牌等）记下来，以后不再请求
+    dates = store.read(*key, columns=['date'])['date']
+    remaining = find_gaps(dates, interval, asset_type, min_missing)
+    remaining_keys = set(_gap_keys(remaining['start'], remaining['end']))
+    still_missing = [k for k in _gap_keys(gaps['start'], gaps['end']) if k in remaining_keys]
+    if still_missing:
+        meta['known_gaps'] = sorted(known | set(still_missing))
+        store.set_meta(*key, meta)
+    logger.info(f"{symbol}: 修补了 {len(gaps) - len(still_missing)} 个缺口，{len(still_missing)} 个没有可用数据")
+    return first_written
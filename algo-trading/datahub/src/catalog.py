@@ -0,0 +1,245 @@
+import os
+import json
+import fcntl
+import threading
+import logging
+from contextlib import contextmanager
+import pandas as pd
+import pyarrow.parquet as pq
+from src.storage import MANIFEST_NAME as DATASET_MANIFEST, parse_dataset_name, read_manifest
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATA_DIR = '/app/data'
+MANIFEST_NAME = 'catalog.json'
+
+# 数据目录索引：记录 /app/data 下每个 parquet 文件的资产类型、代码、周期、日期范围、行数
+# 以及每个 row group 的日期范围。datahub 写文件时更新，backtester 读取时直接查表，
+# 不需要每次 glob/listdir 扫描目录。
+# 分区存储的数据集（见 storage.py）是一个目录，条目的 file 为目录名，partitioned 为 True，
+# row_groups 依次列出各碎片文件的 row group。
+
+
+def parse_file_name(file_name):
+    """Split '{ASSET}_{SYMBOL}_{INTERVAL}_{TYPE}_{start}_{end}.parquet' into its fields."""
+    stem, ext = os.path.splitext(file_name)
+    parts = stem.split('_')
+    if ext != '.parquet' or len(parts) != 6:
+        return None
+    asset_type, symbol, interval, data_type, start, end = parts
+    return {'asset_type': asset_type, 'symbol': symbol, 'interval': interval, 'data_type': data_type}
+
+
+def dataset_key(asset_type, symbol, interval, data_type):
+    return f"{asset_type}_{symbol}_{interval}_{data_type}"
+
+
+def _timestamp(value):
+    return pd.Timestamp(value).isoformat() if value is not None else None
+
+
+def describe_file(path):
+    """Collect row count and per-row-group date ranges from the parquet footer."""
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.metadata
+    names = [name.lower() for name in parquet_file.schema_arrow.names]
+    date_idx = names.index('date') if 'date' in names else None
+
+    row_groups = []
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        start = end = None
+        if date_idx is not None:
+            stats = row_group.column(date_idx).statistics
+            if stats is not None and stats.has_min_max:
+                start, end = _timestamp(stats.min), _timestamp(stats.max)
+        row_groups.append({'rows': row_group.num_rows, 'start': start, 'end': end})
+
+    if date_idx is not None and any(rg['start'] is None for rg in row_groups):
+        # 没有统计信息的旧文件：读取日期列计算
+        dates = pd.to_datetime(parquet_file.read(columns=[parquet_file.schema_arrow.names[date_idx]]).column(0)
+                               .to_pandas())
+        offset = 0
+        for rg in row_groups:
+            chunk = dates.iloc[offset:offset + rg['rows']]
+            rg['start'], rg['end'] = _timestamp(chunk.min()), _timestamp(chunk.max())
+            offset += rg['rows']
+
+    starts = [rg['start'] for rg in row_groups if rg['start'] is not None]
+    ends = [rg['end'] for rg in row_groups if rg['end'] is not None]
+    return {
+        'rows': metadata.num_rows,
+        'start': min(starts, key=pd.Timestamp) if starts else None,
+        'end': max(ends, key=pd.Timestamp) if ends else None,
+        'row_groups': row_groups,
+    }
+
+
+def describe_dataset(path):
+    """Aggregate the fragment footers of a partitioned dataset directory."""
+    row_groups, rows = [], 0
+    for fragment in read_manifest(path)['fragments']:
+        entry = describe_file(os.path.join(path, fragment['file']))
+        row_groups.extend(entry['row_groups'])
+        rows += entry['rows']
+    starts = [rg['start'] for rg in row_groups if rg['start'] is not None]
+    ends = [rg['end'] for rg in row_groups if rg['end'] is not None]
+    return {
+        'rows': rows,
+        'start': min(starts, key=pd.Timestamp) if starts else None,
+        'end': max(ends, key=pd.Timestamp) if ends else None,
+        'row_groups': row_groups,
+        'partitioned': True,
+    }
+
+
+def _dataset_size(path):
+    return sum(os.path.getsize(os.path.join(path, f['file'])) for f in read_manifest(path)['fragments'])
+
+
+class DataCatalog:
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self.manifest_path = os.path.join(data_dir, MANIFEST_NAME)
+        self.files = {}
+        self.datasets = {}
+        # 并行更新时多个线程共用一个索引，修改和保存需要串行；跨进程（多个容器）由 _update 的文件锁串行
+        self._lock = threading.RLock()
+        if os.path.exists(self.manifest_path):
+            self._load()
+        else:
+            self.refresh()
+
+    def _load(self):
+        with open(self.manifest_path, 'r') as f:
+            self.files = json.load(f)['files']
+        self._reindex()
+
+    def _reindex(self):
+        self.datasets = {}
+        for entry in self.files.values():
+            key = dataset_key(entry['asset_type'], entry['symbol'], entry['interval'], entry['data_type'])
+            self.datasets.setdefault(key, []).append(entry)
+        for entries in self.datasets.values():
+            entries.sort(key=lambda e: e['file'])
+
+    @contextmanager
+    def _update(self):
+        """Read-modify-write the catalog: serialized across threads by the RLock and across processes by flock."""
+        with self._lock:
+            os.makedirs(self.data_dir, exist_ok=True)
+            with open(f"{self.manifest_path}.lock", 'a') as lock_file:
+                # 关闭文件时释放锁
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # 其他进程可能在本实例加载之后更新过索引，在最新的内容上修改，不覆盖它们的条目
+                if os.path.exists(self.manifest_path):
+                    self._load()
+                yield
+                self.save()
+
+    def save(self):
+        os.makedirs(self.data_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': 1, 'files': self.files}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _describe(self, file_name):
+        path = os.path.join(self.data_dir, file_name)
+        partitioned = os.path.isdir(path)
+        if partitioned:
+            fields = parse_dataset_name(file_name)
+            if fields is None or not os.path.exists(os.path.join(path, DATASET_MANIFEST)):
+                return None
+        else:
+            fields = parse_file_name(file_name)
+            if fields is None:
+                return None
+        try:
+            entry = describe_dataset(path) if partitioned else describe_file(path)
+            size = _dataset_size(path) if partitioned else os.path.getsize(path)
+        except Exception as e:
+            logger.error(f"无法读取文件元数据 {path}: {str(e)}")
+            return None
+        entry.update(fields, file=file_name, mtime=self._mtime(path), size=size)
+        return entry
+
+    @staticmethod
+    def _mtime(path):
+        # 数据集目录以 manifest 的修改时间为准，每次写入都会原子替换 manifest
+        if os.path.isdir(path):
+            manifest_path = os.path.join(path, DATASET_MANIFEST)
+            return os.path.getmtime(manifest_path) if os.path.exists(manifest_path) else None
+        return os.path.getmtime(path)
+
+    def refresh(self):
+        """Rebuild the catalog from the files on disk, re-reading only new or modified files."""
+        with self._update():
+            self._refresh()
+
+    def _refresh(self):
+        files = {}
+        if os.path.isdir(self.data_dir):
+            for file_name in sorted(os.listdir(self.data_dir)):
+                path = os.path.join(self.data_dir, file_name)
+                old = self.files.get(file_name)
+                if old is not None and old.get('mtime') == self._mtime(path):
+                    files[file_name] = old
+                    continue
+                entry = self._describe(file_name)
+                if entry is not None:
+                    files[file_name] = entry
+        self.files = files
+        self._reindex()
+        logger.info(f"数据目录索引已更新: {len(self.files)} 个文件")
+
+    def register(self, path):
+        entry = self._describe(os.path.basename(path))
+        if entry is not None:
+            with self._update():
+                self.files[entry['file']] = entry
+                self._reindex()
+        return entry
+
+    def remove(self, path):
+        with self._update():
+            if self.files.pop(os.path.basename(path), None) is not None:
+                self._reindex()
+
+    def find(self, asset_type, symbol, interval, data_type, start=None, end=None):
+        """Return catalog entries for a dataset, optionally only those overlapping [start, end]."""
+        entries = self.datasets.get(dataset_key(asset_type, symbol, interval, data_type), [])
+        if start is None and end is None:
+            return list(entries)
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        return [e for e in entries if e['start'] is not None and _overlaps(e, start, end)]
+
+    def path(self, entry):
+        return os.path.join(self.data_dir, entry['file'])
+
+
+def _compare_ts(value, reference):
+    ts = pd.Timestamp(value)
+    if ts.tz is not None and reference.tz is None:
+        ts = ts.tz_localize(None)
+    elif ts.tz is None and reference.tz is not None:
+        reference = reference.tz_localize(None)
+    return ts, reference
+
+
+def _overlaps(entry, start, end):
+    if end is not None:
+        entry_start, end = _compare_ts(entry['start'], end)
+        if entry_start > end:
+            return False
+    if start is not None:
+        entry_end, start = _compare_ts(entry['end'], start)
+        if entry_end < start:
+            return False
+    return True
+
+
+if __name__ == "__main__":
+    DataCatalog().refresh()
@@ -1,3 +1,11 @@
+import os
+import json
+import time
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 import yfinance as yf
 import pandas as pd
 import logging
@@ -5,29 +13,136 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 多个代码并发下载：线程池限制并发数，令牌桶限制每秒请求数，失败按指数退避重试。
+# 默认通过 yfinance 下载；指定 base_url 时直接请求 Yahoo chart 接口格式的 HTTP 服务
+# （例如 https://query1.finance.yahoo.com 或 synthetic.py 的本地替身）；没有指定时使用环境变量 YAHOO_BASE_URL。
+
+# 这些 HTTP 状态码视为临时错误，可以重试；其余 4xx（如 404 代码不存在）直接失败
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, at most `capacity` banked."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
 class YahooFetcher:
+    def __init__(self, max_workers=8, rate_limit=5.0, burst=None, max_retries=3, backoff=1.0, timeout=30,
+                 base_url=None):
+        self.max_workers = max(1, int(max_workers))
+        self.bucket = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        base_url = base_url or os.environ.get('YAHOO_BASE_URL')
+        self.base_url = base_url.rstrip('/') if base_url else None
+        # 每个代码最近一次获取的统计：attempts, seconds, rows, error。多个线程共用一个 fetcher 时
+        # 各次 fetch 只合并自己的代码，不清空别人的结果
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+
     def fetch(self, symbols, start_date, end_date, interval):
-        data = {}
-        for symbol in symbols:
+        yf_interval = self._map_interval(interval)
+        stats = {}
+        if len(symbols) <= 1 or self.max_workers == 1:
+            results = [self._fetch_symbol(symbol, start_date, end_date, yf_interval, stats) for symbol in symbols]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(symbols))) as executor:
+                results = list(executor.map(
+                    lambda s: self._fetch_symbol(s, start_date, end_date, yf_interval, stats), symbols))
+        with self._stats_lock:
+            self.stats.update(stats)
+
+        data = {symbol: history for symbol, history in zip(symbols, results) if history is not None}
+        failed = [symbol for symbol, stat in stats.items() if stat['error']]
+        logger.info(f"Fetched {len(data)}/{len(symbols)} symbols"
+                    + (f", failed: {', '.join(failed)}" if failed else ""))
+        return data
+
+    def _fetch_symbol(self, symbol, start_date, end_date, yf_interval, stats):
+        started = time.perf_counter()
+        attempts = 0
+        history, error = None, None
+        while True:
+            attempts += 1
+            if self.bucket is not None:
+                self.bucket.acquire()
             try:
-                ticker = yf.Ticker(symbol)
-                
-                yf_interval = self._map_interval(interval)
-                
-                if start_date is None and end_date is None:
-                    history = ticker.history(period="max", interval=yf_interval)
-                else:
-                    history = ticker.history(start=start_date, end=end_date, interval=yf_interval)
-                
-                if history.empty:
-                    logger.warning(f"No data returned for symbol {symbol}")
-                else:
-                    data[symbol] = history
-                    logger.info(f"Successfully fetched data for {symbol}. Shape: {history.shape}")
+                history = self._download(symbol, start_date, end_date, yf_interval)
+                error = None
+                break
             except Exception as e:
-                logger.error(f"Error fetching data for {symbol}: {str(e)}")
-        
-        return data
+                error = str(e)
+                retryable = getattr(e, 'retryable', True)
+                if not retryable or attempts > self.max_retries:
+                    logger.error(f"Error fetching data for {symbol} after {attempts} attempt(s): {error}")
+                    break
+                delay = self.backoff * 2 ** (attempts - 1)
+                logger.warning(f"Fetching {symbol} failed ({error}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+        if history is not None and history.empty:
+            logger.warning(f"No data returned for symbol {symbol}")
+            history = None
+        elif history is not None:
+            logger.info(f"Successfully fetched data for {symbol}. Shape: {history.shape}")
+
+        with self._stats_lock:
+            stats[symbol] = {'attempts': attempts, 'seconds': time.perf_counter() - started,
+                             'rows': 0 if history is None else len(history), 'error': error}
+        return history
+
+    def _download(self, symbol, start_date, end_date, yf_interval):
+        if self.base_url is not None:
+            return self._download_chart(symbol, start_date, end_date, yf_interval)
+        ticker = yf.Ticker(symbol)
+        if start_date is None and end_date is None:
+            return ticker.history(period="max", interval=yf_interval)
+        return ticker.history(start=start_date, end=end_date, interval=yf_interval)
+
+    def _download_chart(self, symbol, start_date, end_date, yf_interval):
+        params = {'interval': yf_interval}
+        if start_date is None and end_date is None:
+            params['range'] = 'max'
+        else:
+            start = pd.Timestamp(start_date) if start_date is not None else pd.Timestamp(0)
+            end = pd.Timestamp(end_date) if end_date is not None else pd.Timestamp.now()
+            params['period1'] = int(start.timestamp())
+            params['period2'] = int(end.timestamp())
+        url = f"{self.base_url}/v8/finance/chart/{urllib.parse.quote(symbol)}?{urllib.parse.urlencode(params)}"
+
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                payload = json.load(response)
+        except urllib.error.HTTPError as e:
+            raise FetchError(f"HTTP {e.code}", retryable=e.code in RETRY_STATUS) from e
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise FetchError(str(e)) from e
+        return parse_chart(payload)
 
     def _map_interval(self, interval):
         interval_map = {
@@ -37,4 +152,28 @@ class YahooFetcher:
         }
         mapped_interval = interval_map.get(interval, '1d')
         logger.info(f"Mapped interval {interval} to {mapped_interval}")
-        return mapped_interval
\ No newline at end of file
+        return mapped_interval
+
+
+def parse_chart(payload):
+    """Convert a Yahoo chart API response into a history frame shaped like yfinance's."""
+    chart = payload.get('chart', {})
+    if chart.get('error'):
+        raise FetchError(str(chart['error']), retryable=False)
+    result = (chart.get('result') or [None])[0]
+    if not result or not result.get('timestamp'):
+        return pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+
+    quote = result['indicators']['quote'][0]
+    index = pd.to_datetime(result['timestamp'], unit='s', utc=True)
+    tz = result.get('meta', {}).get('exchangeTimezoneName')
+    if tz:
+        index = index.tz_convert(tz)
+    history = pd.DataFrame({
+        'Open': quote.get('open'),
+        'High': quote.get('high'),
+        'Low': quote.get('low'),
+        'Close': quote.get('close'),
+        'Volume': quote.get('volume'),
+    }, index=pd.DatetimeIndex(index, name='Date'), dtype=float)
+    return history.dropna(subset=['Open', 'High', 'Low', 'Close'])
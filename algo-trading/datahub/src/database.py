@@ -1,56 +1,192 @@
+import re
 import sqlite3
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 import os
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 DATA_DIR = '/app/data'
+# 每个事务插入的行数
+BATCH_ROWS = 200_000
+
+# date 保存为 UTC 纪元秒（INTEGER），表按 (symbol, date) 聚簇（WITHOUT ROWID），
+# 主键本身就是 fetch_data 查询的覆盖索引：按代码和日期范围查询是一次 B 树范围扫描，不需要回表。
+# 重复加载时按主键 upsert，不会因为重复数据失败。
+
+
+def _check_table(table_name):
+    # 表名来自资产类型，不能用参数绑定，只允许标识符
+    if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', table_name):
+        raise ValueError(f"Invalid table name: {table_name}")
+    return table_name
+
+
+def _create_sql(table_name):
+    return f'''
+        CREATE TABLE IF NOT EXISTS {table_name} (
+            symbol TEXT NOT NULL,
+            date INTEGER NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume INTEGER,
+            PRIMARY KEY (symbol, date)
+        ) WITHOUT ROWID
+    '''
+
+
+def to_epoch(dates):
+    """Datetimes (naive ones are taken as UTC) or date strings -> int64 epoch seconds."""
+    dates = pd.to_datetime(pd.Series(dates), utc=True)
+    return dates.dt.tz_convert(None).to_numpy().astype('datetime64[s]').astype(np.int64)
+
+
+def from_epoch(seconds):
+    return pd.to_datetime(seconds, unit='s', utc=True)
+
 
 class Database:
-    def __init__(self, db_name='market_data.db'):
-        self.conn = sqlite3.connect(os.path.join(DATA_DIR, db_name))
+    def __init__(self, db_name='market_data.db', data_dir=DATA_DIR):
+        self.conn = sqlite3.connect(os.path.join(data_dir, db_name), check_same_thread=False)
+        # WAL 模式下读写互不阻塞；NORMAL 同步在 WAL 下仍然保证一致性
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA temp_store=MEMORY')
+        self.conn.execute('PRAGMA cache_size=-65536')
         self.cursor = self.conn.cursor()
 
     def create_table(self, table_name):
-        self.cursor.execute(f'''
-            CREATE TABLE IF NOT EXISTS {table_name} (
-                date TEXT,
-                open REAL,
-                high REAL,
-                low REAL,
-                close REAL,
-                volume INTEGER,
-                symbol TEXT,
-                PRIMARY KEY (date, symbol)
-            )
-        ''')
+        _check_table(table_name)
+        columns = self.cursor.execute(f'PRAGMA table_info({table_name})').fetchall()
+        if columns and any(name == 'date' and col_type.upper() == 'TEXT' for _, name, col_type, *_ in columns):
+            self._migrate_text_dates(table_name)
+            return
+        if self.has_table(f'{table_name}_legacy'):
+            # 旧版本的迁移在复制阶段中断，留下了空的新表和 _legacy 表：补做复制
+            self._migrate_text_dates(table_name, resume=True)
+            return
+        self._create(table_name)
+
+    def has_table(self, table_name):
+        _check_table(table_name)
+        return bool(self.cursor.execute(f'PRAGMA table_info({table_name})').fetchall())
+
+    def _create(self, table_name):
+        self.cursor.execute(_create_sql(table_name))
         self.conn.commit()
 
-    def insert_data(self, table_name, df):
-        df.to_sql(table_name, self.conn, if_exists='append', index=False)
+    def _migrate_text_dates(self, table_name, resume=False):
+        """Convert a table created with TEXT dates and a (date, symbol) key to the epoch layout.
 
-    def fetch_data(self, table_name, symbol, start_date, end_date):
+        Rename, create, copy and drop run in one transaction, so a failure leaves the original
+        table as it was. Rows whose date cannot be parsed are skipped and logged.
+        """
+        logger.info(f"迁移表 {table_name}: TEXT 日期 -> 纪元秒")
+        legacy = f'{table_name}_legacy'
+        # strftime('%s') 会处理带时区偏移的日期字符串，无法解析时返回 NULL
+        valid = "strftime('%s', date) IS NOT NULL AND symbol IS NOT NULL"
+        with self.conn:
+            # sqlite3 模块不会为 DDL 隐式开启事务，显式 BEGIN 让整个迁移原子化
+            self.conn.execute('BEGIN')
+            if not resume:
+                self.conn.execute(f'ALTER TABLE {table_name} RENAME TO {legacy}')
+                self.conn.execute(_create_sql(table_name))
+            skipped = self.conn.execute(f'SELECT COUNT(*) FROM {legacy} WHERE NOT ({valid})').fetchone()[0]
+            self.conn.execute(f'''
+                INSERT OR REPLACE INTO {table_name} (symbol, date, open, high, low, close, volume)
+                SELECT symbol, CAST(strftime('%s', date) AS INTEGER), open, high, low, close, volume FROM {legacy}
+                WHERE {valid}
+            ''')
+            self.conn.execute(f'DROP TABLE {legacy}')
+        if skipped:
+            logger.warning(f"表 {table_name} 迁移时跳过了 {skipped} 行无法解析日期或缺少代码的数据")
+
+    def insert_data(self, table_name, df, batch_rows=BATCH_ROWS):
+        """Upsert rows in large transactions; rows with an existing (symbol, date) are overwritten."""
+        _check_table(table_name)
+        n = len(df)
+        if n == 0:
+            return 0
+        volume = pd.to_numeric(df['volume'], errors='coerce') if 'volume' in df.columns else \
+            pd.Series(np.nan, index=df.index)
+        # 转成 Python 原生类型的元组，executemany 直接绑定
+        columns = [
+            df['symbol'].astype(str).tolist(),
+            to_epoch(df['date']).tolist(),
+            *[df[col].astype(float).tolist() for col in ('open', 'high', 'low', 'close')],
+            [None if np.isnan(v) else int(v) for v in volume.to_numpy(dtype=float)],
+        ]
+        rows = list(zip(*columns))
+        sql = f'''
+            INSERT INTO {table_name} (symbol, date, open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(symbol, date) DO UPDATE SET
+                open = excluded.open, high = excluded.high, low = excluded.low,
+                close = excluded.close, volume = excluded.volume
+        '''
+        for start in range(0, n, batch_rows):
+            with self.conn:
+                self.conn.executemany(sql, rows[start:start + batch_rows])
+        return n
+
+    def _range_query(self, table_name, symbol, start_date, end_date):
+        _check_table(table_name)
+        start = int(to_epoch([start_date])[0]) if start_date is not None else np.iinfo(np.int64).min
+        end = int(to_epoch([end_date])[0]) if end_date is not None else np.iinfo(np.int64).max
         query = f'''
-            SELECT * FROM {table_name}
+            SELECT date, open, high, low, close, volume, symbol FROM {table_name}
             WHERE symbol = ? AND date BETWEEN ? AND ?
+            ORDER BY date
         '''
-        return pd.read_sql_query(query, self.conn, params=(symbol, start_date, end_date))
+        return query, (symbol, start, end)
+
+    def fetch_data(self, table_name, symbol, start_date, end_date):
+        query, params = self._range_query(table_name, symbol, start_date, end_date)
+        df = pd.read_sql_query(query, self.conn, params=params)
+        df['date'] = from_epoch(df['date'])
+        return df
+
+    def iter_data(self, table_name, symbol, start_date, end_date, chunk_rows=BATCH_ROWS):
+        """Same rows as fetch_data, as DataFrames of at most `chunk_rows` rows (date left as epoch seconds)."""
+        query, params = self._range_query(table_name, symbol, start_date, end_date)
+        cursor = self.conn.execute(query, params)
+        columns = [d[0] for d in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records(rows, columns=columns)
 
     def close(self):
         self.conn.close()
 
-def load_to_database(asset_type):
-    db = Database()
+def load_to_database(asset_type, data_dir=DATA_DIR, n_readers=4):
+    db = Database(data_dir=data_dir)
     db.create_table(asset_type)
 
-    processed_dir = os.path.join(DATA_DIR, 'processed', asset_type)
-    
-    for filename in os.listdir(processed_dir):
-        if filename.endswith('.parquet'):
-            df = pd.read_parquet(os.path.join(processed_dir, filename))
-            symbol = filename.split('_')[0]
-            df['symbol'] = symbol
-            db.insert_data(asset_type, df)
+    processed_dir = os.path.join(data_dir, 'processed', asset_type)
+    files = sorted(f for f in os.listdir(processed_dir) if f.endswith('.parquet'))
+
+    def read(filename):
+        df = pd.read_parquet(os.path.join(processed_dir, filename))
+        df['symbol'] = filename.split('_')[0]
+        return df
+
+    # 读取和解码 parquet 在线程池中进行，写入始终在同一个连接上串行执行（SQLite 只允许一个写者）；
+    # 每次只预读 n_readers 个文件，内存占用有上限
+    total = 0
+    with ThreadPoolExecutor(max_workers=n_readers) as executor:
+        for start in range(0, len(files), n_readers):
+            for df in executor.map(read, files[start:start + n_readers]):
+                total += db.insert_data(asset_type, df)
+    logger.info(f"已加载 {len(files)} 个文件，共 {total} 行到表 {asset_type}")
 
     db.close()
+    return total
 
 if __name__ == "__main__":
-    load_to_database('stocks')  # You can change this to load different asset types
\ No newline at end of file
+    load_to_database('stocks')  # You can change this to load different asset types
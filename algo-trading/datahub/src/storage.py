@@ -0,0 +1,411 @@
+import os
+import json
+import uuid
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATA_DIR = '/app/data'
+MANIFEST_NAME = '_manifest.json'
+# 按日期排序写入并限制每个 row group 的行数，读取时可以按日期跳过无关的 row group
+ROW_GROUP_SIZE = 20000
+# 一个年度分区的碎片数超过这个值时，写入后自动合并
+COMPACT_THRESHOLD = 16
+# 早期版本在数据集根目录写的整库快照，publish 时删除
+LEGACY_SNAPSHOT_NAME = '_bars.arrow'
+SNAPSHOT_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+
+# 分区存储：每个数据集是 /app/data 下的一个目录，按年分区，每次增量更新只写新的碎片文件：
+#
+#   /app/data/STOCK_AAPL_1D_OHLCV/
+#       _manifest.json                       当前有效的碎片列表及其日期范围、行数
+#       year=2023/part-20230103-20231229-1a2b3c4d.parquet
+#       year=2024/part-20240102-20240614-5e6f7a8b.parquet
+#
+# 读者只读 _manifest.json 里列出的碎片。写入时先写新碎片，再用 os.replace 原子地替换
+# manifest，最后删除不再引用的旧碎片，所以读者看到的总是更新前或更新后的完整数据。
+# 碎片之间的日期范围互不重叠，按 start 排序依次读取即为时间顺序。同一数据集只允许一个写入者。
+#
+# 每个数据集的列类型在第一次写入时确定并记录在 manifest 的 schema 中，通常就是 YahooProcessor
+# 选择的紧凑类型（float32 价格、int64 成交量、category 代码），date 统一为纳秒精度。之后的写入
+# 都转换成这套类型，碎片之间 schema 一致；某一批数据无法无损转换时（例如 float32 放不下的价格、
+# 带缺失值的成交量），这一列放宽为 float64 并更新 schema。已写的碎片保持原类型，读者按列统一类型。
+#
+# publish 另外把每个年度分区写成一个未压缩的 Arrow IPC 文件 year=YYYY/_bars-*.arrow（单个
+# record batch，列按 64 字节对齐），backtester 等读者用 mmap 打开，各容器共享同一份页缓存，不需要
+# 解码 parquet。manifest 的 snapshots 列出每个快照及生成它的碎片文件名；某一年的碎片列表变了，
+# 这一年的快照就过期了，读者应回退到读取碎片。增量更新通常只改动最后一年，publish 也只重写这一年。
+
+
+def dataset_name(asset_type, symbol, interval, data_type):
+    return f"{asset_type}_{symbol}_{interval}_{data_type}"
+
+
+def parse_dataset_name(name):
+    """Split '{ASSET}_{SYMBOL}_{INTERVAL}_{TYPE}' into its fields."""
+    parts = name.split('_')
+    if len(parts) != 4:
+        return None
+    asset_type, symbol, interval, data_type = parts
+    return {'asset_type': asset_type, 'symbol': symbol, 'interval': interval, 'data_type': data_type}
+
+
+def is_dataset(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_NAME))
+
+
+def read_manifest(path):
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {'version': 1, 'fragments': []}
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+def _year_files(fragments):
+    by_year = {}
+    for fragment in fragments:
+        by_year.setdefault(fragment['year'], []).append(fragment['file'])
+    return by_year
+
+
+def current_snapshots(manifest):
+    """Snapshot entries of a manifest that still match the fragments of their year, keyed by year."""
+    files = _year_files(manifest['fragments'])
+    return {s['year']: s for s in manifest.get('snapshots', []) if files.get(s['year']) == s['fragments']}
+
+
+def write_snapshot(path, year, fragments, schema):
+    """Write one year partition as a memory-mappable Arrow IPC file and return its manifest entry.
+
+    The columns are cast to the dataset `schema` (widened in place if a cast would lose data),
+    so the snapshots of all years share one Arrow schema.
+    """
+    df = storage_dtypes(pd.concat([pd.read_parquet(os.path.join(path, f['file'])) for f in fragments],
+                                  ignore_index=True), schema)
+    table = pa.Table.from_pandas(df[[c for c in SNAPSHOT_COLUMNS if c in df.columns]], preserve_index=False)
+    # 合并成单个 chunk，读者可以把每列直接映射成连续的 ndarray
+    table = table.combine_chunks()
+    file_name = f"year={year}/_bars-{uuid.uuid4().hex[:8]}.arrow"
+    snapshot_path = os.path.join(path, file_name)
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, snapshot_path)
+    return {'year': year, 'file': file_name, 'rows': table.num_rows, 'fragments': [f['file'] for f in fragments],
+            'schema': _snapshot_schema(schema)}
+
+
+def _snapshot_schema(schema):
+    return {col: dtype for col, dtype in schema.items() if col in SNAPSHOT_COLUMNS}
+
+
+def snapshot_is_current(path):
+    """Whether every year partition of the dataset at `path` has an up-to-date snapshot."""
+    manifest = read_manifest(path)
+    current = current_snapshots(manifest)
+    years = _year_files(manifest['fragments'])
+    return bool(years) and all(year in current and os.path.exists(os.path.join(path, current[year]['file']))
+                               for year in years)
+
+
+def _dtype_name(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return 'category'
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        return series.dtype.name
+    return 'object'
+
+
+def _cast(series, dtype):
+    """`series` as `dtype`, or None when the conversion would change a value."""
+    if dtype in ('category', 'object'):
+        return series.astype(dtype)
+    if not (pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series)):
+        return None
+    try:
+        cast = series.astype(dtype)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    original = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    if not np.array_equal(cast.to_numpy(dtype=np.float64), original, equal_nan=True):
+        return None
+    return cast
+
+
+def storage_dtypes(df, schema):
+    """Cast a frame to the dataset's column types, recording new columns and widening `schema` in place.
+
+    A numeric column that cannot be converted without loss becomes float64 in `schema`.
+    """
+    df = df.copy()
+    for col in df.columns:
+        series = df[col]
+        if col == 'date':
+            if hasattr(series.dt, 'as_unit'):
+                df[col] = series.dt.as_unit('ns')
+            continue
+        dtype = schema.setdefault(col, _dtype_name(series))
+        cast = _cast(series, dtype)
+        if cast is None:
+            schema[col] = 'float64' if dtype != 'object' else dtype
+            cast = series.astype(schema[col])
+        df[col] = cast
+    return df
+
+
+def _initial_schema(path, fragments):
+    """Column types of a dataset written before the schema was recorded, taken from its latest fragment."""
+    if not fragments:
+        return {}
+    latest = max(fragments, key=lambda f: pd.Timestamp(f['end']).value)
+    empty = pq.read_schema(os.path.join(path, latest['file'])).empty_table().to_pandas()
+    return {col: _dtype_name(empty[col]) for col in empty.columns if col != 'date'}
+
+
+def dataset_schema(manifest, path):
+    return dict(manifest.get('schema') or _initial_schema(path, manifest['fragments']))
+
+
+def _write_json_atomic(path, payload):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _ts(value, reference=None):
+    ts = pd.Timestamp(value)
+    if reference is not None:
+        if ts.tz is not None and reference.tz is None:
+            ts = ts.tz_localize(None)
+        elif ts.tz is None and reference.tz is not None:
+            ts = ts.tz_localize(reference.tz)
+    return ts
+
+
+def _overlaps(fragment, start, end):
+    if end is not None and _ts(fragment['start'], end) > end:
+        return False
+    if start is not None and _ts(fragment['end'], start) < start:
+        return False
+    return True
+
+
+def read_dataset(path, start=None, end=None, columns=None):
+    """Read the fragments of a dataset overlapping [start, end] as one DataFrame in date order."""
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    fragments = [f for f in read_manifest(path)['fragments'] if _overlaps(f, start, end)]
+    if not fragments:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat([pd.read_parquet(os.path.join(path, f['file']), columns=columns) for f in fragments],
+                   ignore_index=True)
+    reference = df['date'].iloc[0] if len(df) else None
+    if start is not None:
+        df = df[df['date'] >= _ts(start, reference)]
+    if end is not None:
+        df = df[df['date'] <= _ts(end, reference)]
+    return df.reset_index(drop=True)
+
+
+class PartitionedStore:
+    def __init__(self, data_dir=DATA_DIR, row_group_size=ROW_GROUP_SIZE, compact_threshold=COMPACT_THRESHOLD):
+        self.data_dir = data_dir
+        self.row_group_size = row_group_size
+        self.compact_threshold = compact_threshold
+        # 本实例写出的碎片文件字节数累计
+        self.bytes_written = 0
+
+    def path(self, asset_type, symbol, interval, data_type):
+        return os.path.join(self.data_dir, dataset_name(asset_type, symbol, interval, data_type))
+
+    def exists(self, asset_type, symbol, interval, data_type):
+        return bool(read_manifest(self.path(asset_type, symbol, interval, data_type))['fragments'])
+
+    def last_timestamp(self, asset_type, symbol, interval, data_type):
+        """Latest date in the dataset, taken from the manifest without reading any data."""
+        fragments = read_manifest(self.path(asset_type, symbol, interval, data_type))['fragments']
+        if not fragments:
+            return None
+        return max(pd.Timestamp(f['end']) for f in fragments)
+
+    def read(self, asset_type, symbol, interval, data_type, start=None, end=None, columns=None):
+        return read_dataset(self.path(asset_type, symbol, interval, data_type), start, end, columns)
+
+    def _write_fragment(self, path, df, schema):
+        """Write one year's rows as a new fragment file and return its manifest entry."""
+        start, end = df['date'].iloc[0], df['date'].iloc[-1]
+        year = start.year
+        file_name = f"year={year}/part-{start:%Y%m%d}-{end:%Y%m%d}-{uuid.uuid4().hex[:8]}.parquet"
+        file_path = os.path.join(path, file_name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.tmp"
+        df = storage_dtypes(df, schema)
+        df.to_parquet(tmp_path, index=False, row_group_size=self.row_group_size)
+        os.replace(tmp_path, file_path)
+        self.bytes_written += os.path.getsize(file_path)
+        return {'file': file_name, 'year': year, 'rows': len(df), 'start': start.isoformat(),
+                'end': end.isoformat()}
+
+    def _write_rows(self, path, df, schema):
+        years = df['date'].dt.year
+        return [self._write_fragment(path, part.reset_index(drop=True), schema)
+                for _, part in df.groupby(years, sort=True)]
+
+    def _commit(self, path, fragments, obsolete, meta=None, snapshots=None, schema=None):
+        fragments = sorted(fragments, key=lambda f: (pd.Timestamp(f['start']).value, f['file']))
+        manifest = {'version': 1, 'generation': uuid.uuid4().hex, 'fragments': fragments}
+        previous = read_manifest(path)
+        meta = previous.get('meta') if meta is None else meta
+        if meta:
+            manifest['meta'] = meta
+        schema = previous.get('schema') if schema is None else schema
+        if schema:
+            manifest['schema'] = schema
+        # 过期的快照条目留到下一次 publish 再替换，读者按碎片列表判断是否可用
+        snapshots = previous.get('snapshots') if snapshots is None else snapshots
+        if snapshots:
+            manifest['snapshots'] = snapshots
+        _write_json_atomic(os.path.join(path, MANIFEST_NAME), manifest)
+        for fragment in obsolete:
+            try:
+                os.remove(os.path.join(path, fragment['file']))
+            except FileNotFoundError:
+                pass
+
+    def meta(self, asset_type, symbol, interval, data_type):
+        return read_manifest(self.path(asset_type, symbol, interval, data_type)).get('meta', {})
+
+    def set_meta(self, asset_type, symbol, interval, data_type, meta):
+        path = self.path(asset_type, symbol, interval, data_type)
+        self._commit(path, read_manifest(path)['fragments'], [], meta)
+
+    def write(self, asset_type, symbol, interval, data_type, df, meta=None):
+        """Upsert rows: existing rows between the first and last new date are replaced by `df`.
+
+        Only fragments overlapping that range are rewritten (for a daily update just the
+        last, partially filled one); all other history is left untouched. `meta` replaces the
+        dataset's free-form manifest metadata (kept as is when None).
+        """
+        path = self.path(asset_type, symbol, interval, data_type)
+        os.makedirs(path, exist_ok=True)
+        df = df.sort_values('date', kind='mergesort').drop_duplicates(subset=['date'], keep='last')
+        df = df.reset_index(drop=True)
+        if df.empty:
+            return path
+        first, last = df['date'].iloc[0], df['date'].iloc[-1]
+
+        manifest = read_manifest(path)
+        schema = dataset_schema(manifest, path)
+        kept, obsolete, written = [], [], []
+        for fragment in manifest['fragments']:
+            if not _overlaps(fragment, first, last):
+                kept.append(fragment)
+                continue
+            obsolete.append(fragment)
+            # 与新数据重叠的碎片：保留新数据日期范围之外的部分，前后分开写，碎片之间不交错
+            old = pd.read_parquet(os.path.join(path, fragment['file']))
+            for part in (old[old['date'] < first], old[old['date'] > last]):
+                if not part.empty:
+                    written.extend(self._write_rows(path, part.reset_index(drop=True), schema))
+        written.extend(self._write_rows(path, df, schema))
+        self._commit(path, kept + written, obsolete, meta, schema=schema)
+        logger.info(f"写入 {len(df)} 行到 {path}，新增 {len(written)} 个碎片，替换 {len(obsolete)} 个")
+
+        if self.compact_threshold:
+            counts = pd.Series([f['year'] for f in kept + written]).value_counts()
+            if (counts > self.compact_threshold).any():
+                self.compact(asset_type, symbol, interval, data_type)
+        return path
+
+    def compact(self, asset_type, symbol, interval, data_type, years=None):
+        """Merge the fragments of each year partition (or only `years`) into a single file."""
+        path = self.path(asset_type, symbol, interval, data_type)
+        manifest = read_manifest(path)
+        fragments = manifest['fragments']
+        current = current_snapshots(manifest)
+        snapshots = list(manifest.get('snapshots', []))
+        schema = dataset_schema(manifest, path)
+        by_year = {}
+        for fragment in fragments:
+            by_year.setdefault(fragment['year'], []).append(fragment)
+
+        kept, obsolete, written = [], [], []
+        for year, group in sorted(by_year.items()):
+            if len(group) < 2 or (years is not None and year not in years):
+                kept.extend(group)
+                continue
+            df = pd.concat([pd.read_parquet(os.path.join(path, f['file'])) for f in group], ignore_index=True)
+            df = df.sort_values('date', kind='mergesort').drop_duplicates(subset=['date'], keep='last')
+            written.append(self._write_fragment(path, df.reset_index(drop=True), schema))
+            obsolete.extend(group)
+            # 数据没有变化，这一年已发布的快照直接改为指向合并后的碎片，不需要重写
+            if year in current:
+                snapshots = [dict(s, fragments=[written[-1]['file']]) if s['file'] == current[year]['file'] else s
+                             for s in snapshots]
+        if obsolete:
+            self._commit(path, kept + written, obsolete, snapshots=snapshots, schema=schema)
+            logger.info(f"合并 {path}: {len(obsolete)} 个碎片合并为 {len(written)} 个")
+        return len(obsolete)
+
+    def publish(self, asset_type, symbol, interval, data_type):
+        """Refresh the memory-mapped snapshots of a dataset after its updates; only changed years are rewritten."""
+        path = self.path(asset_type, symbol, interval, data_type)
+        manifest = read_manifest(path)
+        if not manifest['fragments']:
+            return None
+        current = current_snapshots(manifest)
+        schema = dataset_schema(manifest, path)
+        snapshots, created, size = {}, [], 0
+        # 快照按数据集 schema 写出；写某一年时 schema 被放宽，之前写好的年份也要按新类型重写
+        while True:
+            widened = dict(schema)
+            for year, files in sorted(_year_files(manifest['fragments']).items()):
+                entry = snapshots.get(year) or current.get(year)
+                if (entry is None or entry.get('schema') != _snapshot_schema(widened)
+                        or not os.path.exists(os.path.join(path, entry['file']))):
+                    entry = write_snapshot(path, year, [f for f in manifest['fragments'] if f['year'] == year],
+                                           widened)
+                    size += os.path.getsize(os.path.join(path, entry['file']))
+                    created.append(entry['file'])
+                snapshots[year] = entry
+            if widened == schema:
+                break
+            schema = widened
+        snapshots = [snapshots[year] for year in sorted(snapshots)]
+        if snapshots != manifest.get('snapshots') or schema != manifest.get('schema'):
+            # 数据没有变化，只更新快照列表（以及放宽后的 schema），generation 保持不变
+            _write_json_atomic(os.path.join(path, MANIFEST_NAME), dict(manifest, snapshots=snapshots, schema=schema))
+        # 已经映射旧文件的读者继续使用旧的 inode，不受删除影响
+        obsolete = ({s['file'] for s in manifest.get('snapshots', [])} | set(created)) - {s['file'] for s in snapshots}
+        for file_name in sorted(obsolete) + [LEGACY_SNAPSHOT_NAME]:
+            try:
+                os.remove(os.path.join(path, file_name))
+            except FileNotFoundError:
+                pass
+        self.bytes_written += size
+        logger.info(f"发布快照 {path}: 重写 {len(created)} 个年度分区，{size} 字节")
+        return path
+
+    def datasets(self):
+        if not os.path.isdir(self.data_dir):
+            return []
+        return [name for name in sorted(os.listdir(self.data_dir))
+                if parse_dataset_name(name) is not None and is_dataset(os.path.join(self.data_dir, name))]
+
+    def compact_all(self):
+        total = 0
+        for name in self.datasets():
+            total += self.compact(**parse_dataset_name(name))
+        return total
+
+
+if __name__ == "__main__":
+    PartitionedStore().compact_all()
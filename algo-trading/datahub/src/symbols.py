@@ -0,0 +1,20 @@
+# 代码分类和文件名用的代码清洗；更新流程（main.py）与合成行情（synthetic.py）共用，
+# 两边对同一代码得到相同的资产类型和数据集名称。
+
+
+def determine_asset_type(symbol):
+    # 先判断 '='：CL=F 这类代码一直按 FOREX 处理，已有数据集也以 FOREX 的名称保存
+    if symbol.startswith('^'):
+        return 'BOND'
+    elif '=' in symbol:
+        return 'FOREX'
+    elif symbol.endswith('=F'):
+        return 'FUTURE'
+    elif '-' in symbol:
+        return 'CRYPTO'
+    else:
+        return 'STOCK'
+
+
+def clean_symbol(symbol):
+    return symbol.replace('^', '').replace('=', '').replace('-', '')
@@ -0,0 +1,269 @@
+import os
+import json
+import zlib
+import logging
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+from src.data_processor import YahooProcessor, INTERVALS
+from src.storage import PartitionedStore, ROW_GROUP_SIZE
+from src.catalog import DataCatalog
+from src.symbols import determine_asset_type, clean_symbol
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATA_DIR = '/app/data'
+
+# 离线压测用的合成行情：几何布朗运动加可选的泊松跳跃（Merton 跳跃扩散），
+# 同一 (seed, 代码, 周期, 日期范围) 总是生成相同的 K 线。
+#
+#   write_files   直接写成 datahub 的 {ASSET}_{SYMBOL}_{INTERVAL}_{TYPE}_{start}_{end}.parquet
+#                 （或分区存储的数据集目录），backtester 可以直接读取
+#   ChartServer   本地的 Yahoo chart 接口替身，每个代码是一条固定窗口的路径，各次请求取其中一段；
+#                 YahooFetcher(base_url=...) 或设置 YAHOO_BASE_URL 环境变量后，整个更新流程不需要访问网络
+#
+# 交易日历：CRYPTO 全天候；FOREX 日内周五 17:00 至周日 17:00（纽约时间）休市；
+# 其他资产只有工作日，日内 K 线限于 9:30-16:00。
+
+ANNUAL = pd.Timedelta(days=365.25)
+# 没有指定范围（range=max）时的历史长度，与 Yahoo 对各周期的限制大致相同
+HISTORY = {'1d': pd.Timedelta(days=365 * 25), '1h': pd.Timedelta(days=729), '5m': pd.Timedelta(days=59)}
+YF_INTERVALS = {'1d': '1D', '1h': '1H', '5m': '5MIN'}
+
+
+def asset_timezone(asset_type):
+    return 'UTC' if asset_type == 'CRYPTO' else 'America/New_York'
+
+
+def trading_index(start, end, interval, asset_type='STOCK'):
+    """Bar open times in [start, end] on the asset's trading calendar, in its exchange timezone."""
+    step = INTERVALS[interval]
+    tz = asset_timezone(asset_type)
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    start = start.tz_localize(tz) if start.tz is None else start.tz_convert(tz)
+    end = end.tz_localize(tz) if end.tz is None else end.tz_convert(tz)
+    # 从当天零点开始按步长排列，同一周期的 K 线时间与请求的起点无关；
+    # 日线按日历日递增，跨夏令时切换时仍然是当地零点
+    index = pd.date_range(start.normalize(), end, freq='D' if step == pd.Timedelta(days=1) else step)
+    index = index[index >= start]
+    if asset_type == 'CRYPTO':
+        return index
+    wall = index.tz_localize(None)
+    weekday, minutes = wall.weekday, wall.hour * 60 + wall.minute
+    if step >= pd.Timedelta(days=1):
+        return index[weekday < 5]
+    if asset_type == 'FOREX':
+        closed = (weekday == 5) | ((weekday == 4) & (wall.hour >= 17)) | ((weekday == 6) & (wall.hour < 17))
+        return index[~closed]
+    return index[(weekday < 5) & (minutes >= 9 * 60 + 30) & (minutes < 16 * 60)]
+
+
+def _rng(seed, symbol, interval):
+    return np.random.default_rng([seed, zlib.crc32(f"{symbol}|{interval}".encode())])
+
+
+def simulate(index, symbol, interval, seed=0, start_price=100.0, drift=0.05, volatility=0.2,
+             jump_intensity=0.0, jump_mean=0.0, jump_std=0.05):
+    """yfinance-shaped OHLCV history on `index`; `drift`, `volatility` and `jump_intensity` (jumps per year) are annualized."""
+    n = len(index)
+    dt = INTERVALS[interval] / ANNUAL
+    rng = _rng(seed, symbol, interval)
+    draws = rng.standard_normal((5, n))
+    log_returns = (drift - volatility ** 2 / 2) * dt + volatility * np.sqrt(dt) * draws[0]
+    if jump_intensity:
+        # 每根 K 线内的跳跃次数服从泊松分布，跳跃幅度（对数收益）服从正态分布
+        jumps = rng.poisson(jump_intensity * dt, n)
+        log_returns += jumps * jump_mean + np.sqrt(jumps) * jump_std * rng.standard_normal(n)
+    close = start_price * np.exp(np.cumsum(log_returns))
+
+    bar_sigma = volatility * np.sqrt(dt)
+    open_ = np.r_[start_price, close[:-1]] * np.exp(0.1 * bar_sigma * draws[1])
+    high = np.maximum(open_, close) * np.exp(0.5 * bar_sigma * np.abs(draws[2]))
+    low = np.minimum(open_, close) * np.exp(-0.5 * bar_sigma * np.abs(draws[3]))
+    volume = np.round(np.exp(13.0 + 0.5 * draws[4]))
+    return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume},
+                        index=pd.DatetimeIndex(index, name='Date'))
+
+
+def generate_bars(symbol, interval, start, end, asset_type='STOCK', seed=0, **model):
+    """Synthetic history for one symbol between `start` and `end`, shaped like yfinance's."""
+    return simulate(trading_index(start, end, interval, asset_type), symbol, interval, seed, **model)
+
+
+def write_files(symbols, interval, start, end, asset_type='STOCK', seed=0, data_dir=DATA_DIR,
+                partitioned=False, **model):
+    """Write synthetic bars in the datahub layout and index them in the catalog; returns the written paths.
+
+    Each symbol goes through YahooProcessor like downloaded data, so the files are
+    indistinguishable from real ones to the backtester.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    processor = YahooProcessor()
+    store = PartitionedStore(data_dir) if partitioned else None
+    catalog = DataCatalog(data_dir)
+    paths = []
+    for symbol in symbols:
+        history = generate_bars(symbol, interval, start, end, asset_type, seed, **model)
+        df = processor.process({symbol: history}, asset_type=asset_type)
+        if df.empty:
+            logger.warning(f"{symbol}: 范围内没有交易时段，跳过")
+            continue
+        name = clean_symbol(symbol)
+        if partitioned:
+            store.write(asset_type, name, interval, 'OHLCV', df)
+            path = store.publish(asset_type, name, interval, 'OHLCV')
+        else:
+            first, last = df['date'].iloc[0], df['date'].iloc[-1]
+            path = os.path.join(data_dir, f"{asset_type}_{name}_{interval}_OHLCV_{first:%Y%m%d}_{last:%Y%m%d}.parquet")
+            df.to_parquet(path, index=False, row_group_size=ROW_GROUP_SIZE)
+        catalog.register(path)
+        logger.info(f"{symbol}: 写入 {len(df)} 根合成 K 线到 {path}")
+        paths.append(path)
+    return paths
+
+
+def chart_payload(history, tz):
+    """Yahoo chart API response body for a yfinance-shaped history (see data_fetcher.parse_chart)."""
+    timestamps = history.index.tz_convert('UTC').tz_localize(None).to_numpy().astype('datetime64[s]')
+    quote = {column.lower(): history[column].tolist() for column in ['Open', 'High', 'Low', 'Close', 'Volume']}
+    return {'chart': {'result': [{
+        'meta': {'exchangeTimezoneName': tz},
+        'timestamp': timestamps.astype(np.int64).tolist(),
+        'indicators': {'quote': [quote]},
+    }], 'error': None}}
+
+
+class ChartHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.startswith('/v8/finance/chart/'):
+            return self._send(404, {'chart': {'result': None, 'error': {'code': 'Not Found'}}})
+        symbol = unquote(url.path.rsplit('/', 1)[-1])
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if self.server.should_fail():
+            return self._send(503, {'chart': {'result': None, 'error': {'code': 'Unavailable'}}})
+        interval = params.get('interval', '1d')
+        if interval not in YF_INTERVALS:
+            return self._send(400, {'chart': {'result': None, 'error': {'code': 'Bad Request',
+                                                                        'description': f'interval {interval}'}}})
+        history, tz = self.server.history(symbol, interval)
+        if 'period1' in params:
+            start = pd.Timestamp(int(params['period1']), unit='s', tz='UTC')
+            end = pd.Timestamp(int(params.get('period2', 2 ** 31)), unit='s', tz='UTC')
+            history = history[(history.index >= start) & (history.index < end)]
+        self._send(200, chart_payload(history, tz))
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ChartServer(ThreadingHTTPServer):
+    """Local stand-in for the Yahoo chart API serving deterministic synthetic history.
+
+    Each (symbol, interval) path covers a fixed window ending at `end` (default: when the
+    server started) and is generated once, so every request sees the same bars.
+    `error_rate` makes that fraction of requests fail with HTTP 503 to exercise retries.
+    """
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), seed=0, end=None, error_rate=0.0, **model):
+        super().__init__(address, ChartHandler)
+        self.seed = seed
+        self.end = pd.Timestamp(end, tz='UTC') if end is not None else pd.Timestamp.now(tz='UTC').floor('min')
+        self.error_rate = error_rate
+        self.model = model
+        self.requests = 0
+        self._paths = {}
+        self._lock = threading.Lock()
+        self._failures = np.random.default_rng(seed)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def should_fail(self):
+        with self._lock:
+            self.requests += 1
+            return bool(self.error_rate) and self._failures.random() < self.error_rate
+
+    def history(self, symbol, yf_interval):
+        key = (symbol, yf_interval)
+        with self._lock:
+            cached = self._paths.get(key)
+        if cached is None:
+            asset_type = determine_asset_type(symbol)
+            history = generate_bars(symbol, YF_INTERVALS[yf_interval], self.end - HISTORY[yf_interval], self.end,
+                                    asset_type, self.seed, **self.model)
+            cached = (history, asset_timezone(asset_type))
+            with self._lock:
+                cached = self._paths.setdefault(key, cached)
+        return cached
+
+    def start(self):
+        """Serve requests from a daemon thread and return the server."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="合成行情数据")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def model_options(p):
+        p.add_argument('--seed', type=int, default=0)
+        p.add_argument('--start-price', type=float, default=100.0)
+        p.add_argument('--drift', type=float, default=0.05, help="年化漂移")
+        p.add_argument('--volatility', type=float, default=0.2, help="年化波动率")
+        p.add_argument('--jump-intensity', type=float, default=0.0, help="每年跳跃次数，0 为纯几何布朗运动")
+        p.add_argument('--jump-mean', type=float, default=0.0)
+        p.add_argument('--jump-std', type=float, default=0.05)
+
+    files = commands.add_parser('files', help="写入数据目录")
+    files.add_argument('symbols', nargs='+')
+    files.add_argument('--interval', default='1D', choices=sorted(INTERVALS))
+    files.add_argument('--start', default='2000-01-01')
+    files.add_argument('--end', default=None, help="默认今天")
+    files.add_argument('--asset-type', default='STOCK')
+    files.add_argument('--partitioned', action='store_true', help="写成分区存储的数据集目录")
+    files.add_argument('--data-dir', default=DATA_DIR)
+    model_options(files)
+
+    serve = commands.add_parser('serve', help="启动本地 Yahoo chart 接口替身")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--error-rate', type=float, default=0.0)
+    model_options(serve)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    model = {'start_price': args.start_price, 'drift': args.drift, 'volatility': args.volatility,
+             'jump_intensity': args.jump_intensity, 'jump_mean': args.jump_mean, 'jump_std': args.jump_std}
+    if args.command == 'files':
+        end = args.end or pd.Timestamp.now().normalize()
+        write_files(args.symbols, args.interval, args.start, end, args.asset_type, args.seed, args.data_dir,
+                    args.partitioned, **model)
+        return
+    server = ChartServer((args.host, args.port), seed=args.seed, error_rate=args.error_rate, **model)
+    logger.info(f"合成行情服务: {server.base_url}（设置 YAHOO_BASE_URL={server.base_url} 让 datahub 使用）")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
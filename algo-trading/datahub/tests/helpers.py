@@ -0,0 +1,8 @@
+import pandas as pd
+
+
+def bars(start, periods, symbol='AAPL', close=1.0):
+    """Daily New York bars of one symbol; `close` is a constant or one value per bar."""
+    return pd.DataFrame({'date': pd.date_range(start, periods=periods, freq='D', tz='America/New_York'),
+                         'open': close, 'high': close, 'low': close, 'close': close, 'volume': 100.0,
+                         'symbol': symbol})
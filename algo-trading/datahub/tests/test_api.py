@@ -0,0 +1,126 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.api import create_app, ConnectionPool, ARROW_MIME, PARQUET_MIME, OUTPUT_SCHEMA
+from src.database import Database
+from src.storage import PartitionedStore, read_manifest
+from src.catalog import DataCatalog
+from helpers import bars
+
+
+# 收盘价等于距 2020-01-01 的天数
+CLOSE = [float(i) for i in range(400)]
+
+
+class TestMarketDataApi(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        db = Database(data_dir=self.tmp.name)
+        db.create_table('stocks')
+        db.insert_data('stocks', pd.concat([bars('2020-01-01', 400, close=CLOSE),
+                                            bars('2020-01-01', 400, 'MSFT', CLOSE)]))
+        db.close()
+        PartitionedStore(self.tmp.name).write('STOCK', 'AAPL', '1D', 'OHLCV', bars('2020-01-01', 400, close=CLOSE))
+        self.app = create_app(self.tmp.name, pool_size=2, chunk_rows=64)
+        self.client = self.app.test_client()
+        self.url = '/api/v1/market-data/AAPL?start_date=2020-02-01&end_date=2020-12-31'
+
+    def tearDown(self):
+        self.app.extensions['db_pool'].close()
+        self.tmp.cleanup()
+
+    def test_json_default(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.mimetype, 'application/json')
+        rows = json.loads(response.data)
+        self.assertEqual(len(rows), 334)
+        # 不带时区的查询日期按 UTC 解释：2020-02-01 00:00 UTC 之后的第一根是纽约时间 2 月 1 日
+        self.assertEqual(rows[0]['close'], 31.0)
+        self.assertEqual(pd.Timestamp(rows[0]['date']), pd.Timestamp('2020-02-01', tz='America/New_York'))
+
+    def test_arrow_stream(self):
+        response = self.client.get(self.url, headers={'Accept': ARROW_MIME})
+        self.assertEqual(response.mimetype, ARROW_MIME)
+        reader = pa.ipc.open_stream(response.data)
+        batches = list(reader)
+        # 按 chunk_rows 分块输出
+        self.assertEqual(len(batches), 6)
+        table = pa.Table.from_batches(batches)
+        self.assertEqual(table.num_rows, 334)
+        self.assertEqual(table.schema.field('date').type, pa.timestamp('s', tz='UTC'))
+        self.assertEqual(table.column('symbol').unique().to_pylist(), ['AAPL'])
+
+    def test_parquet_response(self):
+        response = self.client.get(self.url + '&format=parquet')
+        self.assertEqual(response.mimetype, PARQUET_MIME)
+        df = pq.read_table(io.BytesIO(response.data)).to_pandas()
+        self.assertEqual(len(df), 334)
+        self.assertTrue(df['date'].is_monotonic_increasing)
+
+    def test_parquet_source_matches_sqlite(self):
+        from_sqlite = pa.ipc.open_stream(self.client.get(self.url, headers={'Accept': ARROW_MIME}).data).read_pandas()
+        response = self.client.get(self.url + '&source=parquet', headers={'Accept': ARROW_MIME})
+        from_files = pa.ipc.open_stream(response.data).read_pandas()
+        self.assertEqual(len(from_files), len(from_sqlite))
+        pd.testing.assert_series_equal(from_files['close'], from_sqlite['close'])
+        self.assertTrue((from_files['date'] == from_sqlite['date']).all())
+
+    def test_parquet_source_mixed_fragment_types(self):
+        # 旧版本写出的碎片列类型不同（float32 价格、整数成交量），响应仍是同一个 schema
+        path = os.path.join(self.tmp.name, 'STOCK_AAPL_1D_OHLCV')
+        fragment = os.path.join(path, read_manifest(path)['fragments'][0]['file'])
+        df = pd.read_parquet(fragment)
+        df[['open', 'high', 'low', 'close']] = df[['open', 'high', 'low', 'close']].astype('float32')
+        df['volume'] = df['volume'].astype('int64')
+        df.to_parquet(fragment, index=False)
+        response = self.client.get(self.url + '&source=parquet', headers={'Accept': ARROW_MIME})
+        table = pa.ipc.open_stream(response.data).read_all()
+        self.assertEqual(table.num_rows, 334)
+        self.assertTrue(table.schema.equals(OUTPUT_SCHEMA))
+
+    def test_parquet_source_prefers_dataset_over_legacy_file(self):
+        legacy = os.path.join(self.tmp.name, 'STOCK_AAPL_1D_OHLCV_20200101_20210203.parquet')
+        bars('2020-01-01', 400, close=CLOSE).to_parquet(legacy, index=False)
+        DataCatalog(self.tmp.name).register(legacy)
+        response = self.client.get(self.url + '&source=parquet', headers={'Accept': ARROW_MIME})
+        self.assertEqual(pa.ipc.open_stream(response.data).read_all().num_rows, 334)
+
+    def test_empty_and_errors(self):
+        response = self.client.get('/api/v1/market-data/NONE', headers={'Accept': ARROW_MIME})
+        self.assertEqual(pa.ipc.open_stream(response.data).read_all().num_rows, 0)
+        self.assertEqual(json.loads(self.client.get('/api/v1/market-data/NONE').data), [])
+        self.assertEqual(self.client.get(self.url + '&format=xml').status_code, 406)
+        self.assertEqual(self.client.get(self.url + '&asset_type=x;y').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/market-data/NONE?source=parquet').status_code, 404)
+        # 在开始输出之前发现的错误返回对应的状态码，而不是在 200 的响应中途中断
+        self.assertEqual(self.client.get(self.url + '&asset_type=bonds').status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/market-data/AAPL?start_date=soon').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/market-data/AAPL?source=parquet&end_date=soon').status_code, 400)
+
+
+class TestConnectionPool(unittest.TestCase):
+    def test_bounded_and_reused(self):
+        created = []
+        pool = ConnectionPool(lambda: created.append(object()) or created[-1], size=2)
+        with pool.connection() as a:
+            with pool.connection() as b:
+                self.assertIsNot(a, b)
+                got = []
+                worker = threading.Thread(target=lambda: got.append(pool.connection().__enter__()))
+                worker.start()
+                worker.join(0.1)
+                # 连接都被占用时等待归还
+                self.assertTrue(worker.is_alive())
+        worker.join(1)
+        self.assertEqual(len(created), 2)
+        self.assertIn(got[0], created)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from src.backfill import find_gaps, coalesce_gaps, backfill_gaps
+from src.data_processor import YahooProcessor
+from src.storage import PartitionedStore
+
+
+def weekday_dates(start, end, tz='America/New_York'):
+    dates = pd.bdate_range(start, end, tz=tz)
+    return pd.Series(dates)
+
+
+class HistoryFetcher:
+    """Serves yfinance-shaped history from an in-memory frame and records the requested ranges."""
+
+    def __init__(self, history):
+        self.history = history
+        self.requests = []
+
+    def fetch(self, symbols, start_date, end_date, interval):
+        self.requests.append((start_date, end_date))
+        index = self.history.index
+        part = self.history[(index >= start_date) & (index < end_date)]
+        return {symbols[0]: part} if len(part) else {}
+
+
+class TestFindGaps(unittest.TestCase):
+    def test_weekday_calendar(self):
+        dates = weekday_dates('2024-01-01', '2024-01-31')
+        self.assertTrue(find_gaps(dates, '1D', 'STOCK').empty)
+        # 删掉周三和下一周的周四、周五
+        holes = dates.drop(index=[2, 8, 9]).reset_index(drop=True)
+        gaps = find_gaps(holes, '1D', 'STOCK')
+        self.assertEqual(gaps['missing'].tolist(), [1, 2])
+        self.assertEqual(gaps['start'].iloc[1], pd.Timestamp('2024-01-10', tz='America/New_York'))
+        self.assertEqual(gaps['end'].iloc[1], pd.Timestamp('2024-01-15', tz='America/New_York'))
+
+    def test_exchange_holidays_are_not_gaps(self):
+        # 感恩节所在的一周和圣诞节、元旦：交易所休市的日子没有 K 线
+        dates = weekday_dates('2023-11-13', '2024-01-12')
+        closed = pd.to_datetime(['2023-11-23', '2023-12-25', '2024-01-01']).date
+        trading = dates[~dates.dt.date.isin(closed)].reset_index(drop=True)
+        self.assertTrue(find_gaps(trading, '1D', 'STOCK').empty)
+        self.assertTrue(find_gaps(trading, '1D', 'FUTURE').empty)
+        # 假日之后真正缺失的一天仍然能检测到
+        gaps = find_gaps(trading[trading.dt.date != pd.Timestamp('2023-11-24').date()], '1D', 'STOCK')
+        self.assertEqual(gaps['missing'].tolist(), [1])
+        self.assertEqual(gaps['start'].iloc[0], pd.Timestamp('2023-11-22', tz='America/New_York'))
+        # 外汇在美国假日照常交易
+        self.assertEqual(find_gaps(trading, '1D', 'FOREX')['missing'].tolist(), [1, 1, 1])
+
+    def test_crypto_trades_every_day(self):
+        dates = pd.Series(pd.date_range('2024-01-01', periods=10, freq='D', tz='UTC'))
+        self.assertEqual(find_gaps(dates.drop(index=[5, 6]), '1D', 'CRYPTO')['missing'].tolist(), [2])
+
+    def test_forex_weekend_is_not_a_gap(self):
+        dates = pd.Series(pd.date_range('2024-01-01', '2024-01-20', freq='5min', tz='America/New_York'))
+        wall = dates.dt.tz_localize(None)
+        weekday = wall.dt.weekday
+        closed = (weekday == 5) | ((weekday == 4) & (wall.dt.hour >= 17)) | ((weekday == 6) & (wall.dt.hour < 17))
+        open_bars = dates[~closed.to_numpy()].reset_index(drop=True)
+        self.assertTrue(find_gaps(open_bars, '5MIN', 'FOREX').empty)
+        gaps = find_gaps(open_bars.drop(index=range(100, 112)), '5MIN', 'FOREX')
+        self.assertEqual(gaps['missing'].tolist(), [12])
+
+    def test_coalesce(self):
+        dates = weekday_dates('2024-01-01', '2024-06-28')
+        holes = dates.drop(index=[5, 9, 100]).reset_index(drop=True)
+        gaps = find_gaps(holes, '1D', 'STOCK')
+        ranges = coalesce_gaps(gaps, pd.Timedelta(days=14))
+        self.assertEqual(len(gaps), 3)
+        self.assertEqual(len(ranges), 2)
+        self.assertEqual(ranges['start'].iloc[0], gaps['start'].iloc[0])
+        self.assertEqual(ranges['end'].iloc[0], gaps['end'].iloc[1])
+
+
+class TestBackfillGaps(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PartitionedStore(self.tmp.name)
+        index = pd.bdate_range('2024-01-01', '2024-03-29', tz='America/New_York', name='Date')
+        prices = 100 + np.arange(len(index), dtype=float)
+        self.truth = pd.DataFrame({'Open': prices, 'High': prices, 'Low': prices, 'Close': prices,
+                                   'Volume': 1000.0}, index=index)
+        # 1 月 15 日（马丁·路德·金纪念日）交易所休市；1 月 16 日假设临时休市，数据源中也没有
+        self.truth = self.truth.drop(pd.to_datetime(['2024-01-15', '2024-01-16']).tz_localize('America/New_York'))
+        stored = self.truth.drop(self.truth.index[[20, 21, 22, 40]])
+        self.key = ('STOCK', 'AAPL', '1D', 'OHLCV')
+        self.store.write(*self.key, YahooProcessor().process({'AAPL': stored}, 'STOCK'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_repairs_gaps_and_remembers_closures(self):
+        fetcher = HistoryFetcher(self.truth)
+        first = backfill_gaps(self.store, fetcher, YahooProcessor(), 'AAPL', *self.key)
+        self.assertEqual(first, self.truth.index[20])
+        # 三个缺口（临时休市、20-22、40）中前两个相距不到 14 天，合并成一次请求
+        self.assertEqual(len(fetcher.requests), 2)
+        repaired = self.store.read(*self.key)
+        self.assertEqual(len(repaired), len(self.truth))
+        np.testing.assert_array_equal(repaired['close'].to_numpy(float), self.truth['Close'].to_numpy())
+        self.assertEqual(len(self.store.meta(*self.key)['known_gaps']), 1)
+
+        # 再次运行：只剩已知的临时休市缺口，不再请求
+        fetcher.requests = []
+        self.assertIsNone(backfill_gaps(self.store, fetcher, YahooProcessor(), 'AAPL', *self.key))
+        self.assertEqual(fetcher.requests, [])
+
+    def test_keeps_existing_bars(self):
+        altered = self.truth.copy()
+        altered['Close'] += 1000
+        backfill_gaps(self.store, HistoryFetcher(altered), YahooProcessor(), 'AAPL', *self.key)
+        repaired = self.store.read(*self.key).set_index('date')['close']
+        # 原有的 K 线不被覆盖，只补入缺失的
+        self.assertEqual(repaired.loc[self.truth.index[19]], self.truth['Close'].iloc[19])
+        self.assertEqual(repaired.loc[self.truth.index[20]], self.truth['Close'].iloc[20] + 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
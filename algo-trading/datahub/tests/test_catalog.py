@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from src.catalog import DataCatalog, parse_file_name
+
+
+def write_file(data_dir, name, start, periods, freq='D'):
+    df = pd.DataFrame({'date': pd.date_range(start, periods=periods, freq=freq), 'open': 1.0, 'high': 1.0,
+                       'low': 1.0, 'close': 1.0, 'volume': 0, 'symbol': 'AAPL'})
+    path = os.path.join(data_dir, name)
+    df.to_parquet(path, index=False, row_group_size=100)
+    return path
+
+
+class TestDataCatalog(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        write_file(self.dir, 'STOCK_AAPL_1D_OHLCV_20200101_20201226.parquet', '2020-01-01', 360)
+        write_file(self.dir, 'FOREX_EURUSDX_5MIN_OHLCV_20240101_20240102.parquet', '2024-01-01', 288, '5min')
+        open(os.path.join(self.dir, 'notes.txt'), 'w').close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse_file_name(self):
+        self.assertEqual(parse_file_name('STOCK_AAPL_1D_OHLCV_20200101_20201226.parquet'),
+                         {'asset_type': 'STOCK', 'symbol': 'AAPL', 'interval': '1D', 'data_type': 'OHLCV'})
+        self.assertIsNone(parse_file_name('notes.txt'))
+
+    def test_refresh_records_statistics(self):
+        catalog = DataCatalog(self.dir)
+        self.assertTrue(os.path.exists(catalog.manifest_path))
+        entry = catalog.find('STOCK', 'AAPL', '1D', 'OHLCV')[0]
+        self.assertEqual(entry['rows'], 360)
+        self.assertEqual(len(entry['row_groups']), 4)
+        self.assertEqual(pd.Timestamp(entry['start']), pd.Timestamp('2020-01-01'))
+        self.assertEqual(pd.Timestamp(entry['row_groups'][1]['start']), pd.Timestamp('2020-04-10'))
+        self.assertEqual(len(catalog.files), 2)
+
+    def test_range_query_skips_files(self):
+        catalog = DataCatalog(self.dir)
+        self.assertEqual(len(catalog.find('STOCK', 'AAPL', '1D', 'OHLCV', '2020-06-01', '2020-07-01')), 1)
+        self.assertEqual(catalog.find('STOCK', 'AAPL', '1D', 'OHLCV', '2021-01-01', '2021-02-01'), [])
+
+    def test_instances_do_not_overwrite_each_other(self):
+        # 两个进程各自加载的索引：后保存的一方在磁盘上最新的内容上修改
+        first, second = DataCatalog(self.dir), DataCatalog(self.dir)
+        first.register(write_file(self.dir, 'STOCK_MSFT_1D_OHLCV_20200101_20200130.parquet', '2020-01-01', 30))
+        second.register(write_file(self.dir, 'STOCK_GOOG_1D_OHLCV_20200101_20200130.parquet', '2020-01-01', 30))
+        catalog = DataCatalog(self.dir)
+        self.assertEqual(len(catalog.find('STOCK', 'MSFT', '1D', 'OHLCV')), 1)
+        self.assertEqual(len(catalog.find('STOCK', 'GOOG', '1D', 'OHLCV')), 1)
+        second.remove('STOCK_MSFT_1D_OHLCV_20200101_20200130.parquet')
+        remaining = DataCatalog(self.dir)
+        self.assertEqual(remaining.find('STOCK', 'MSFT', '1D', 'OHLCV'), [])
+        self.assertEqual(len(remaining.find('STOCK', 'GOOG', '1D', 'OHLCV')), 1)
+
+    def test_register_and_remove(self):
+        catalog = DataCatalog(self.dir)
+        path = write_file(self.dir, 'STOCK_MSFT_1D_OHLCV_20200101_20200110.parquet', '2020-01-01', 10)
+        catalog.register(path)
+        # 重新打开时从清单读取，而不是扫描目录
+        reopened = DataCatalog(self.dir)
+        self.assertEqual(reopened.find('STOCK', 'MSFT', '1D', 'OHLCV')[0]['rows'], 10)
+        reopened.remove(path)
+        self.assertEqual(DataCatalog(self.dir).find('STOCK', 'MSFT', '1D', 'OHLCV'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
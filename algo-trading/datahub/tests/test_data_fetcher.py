@@ -0,0 +1,125 @@
+import json
+import time
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from src.data_fetcher import YahooFetcher, TokenBucket
+
+
+def chart_payload(n=5, start=1577836800):
+    timestamps = [start + i * 86400 for i in range(n)]
+    prices = [100.0 + i for i in range(n)]
+    return {'chart': {'result': [{
+        'meta': {'exchangeTimezoneName': 'America/New_York'},
+        'timestamp': timestamps,
+        'indicators': {'quote': [{'open': prices, 'high': prices, 'low': prices, 'close': prices,
+                                  'volume': [1000] * n}]},
+    }], 'error': None}}
+
+
+class ChartHandler(BaseHTTPRequestHandler):
+    # 测试用的 Yahoo chart 接口替身：FLAKY 前两次返回 503，MISSING 返回 404
+    def do_GET(self):
+        server = self.server
+        symbol = urlparse(self.path).path.rsplit('/', 1)[-1]
+        with server.lock:
+            server.requests[symbol] = server.requests.get(symbol, 0) + 1
+            count = server.requests[symbol]
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay)
+            if symbol == 'MISSING' or (symbol == 'FLAKY' and count <= 2):
+                self.send_response(404 if symbol == 'MISSING' else 503)
+                self.end_headers()
+                return
+            body = json.dumps(chart_payload()).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestYahooFetcher(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ChartHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = {}
+        self.server.active = 0
+        self.server.max_active = 0
+        self.server.delay = 0.05
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_concurrent_fetch(self):
+        symbols = [f"S{i}" for i in range(8)]
+        fetcher = YahooFetcher(max_workers=4, rate_limit=None, base_url=self.base_url)
+        data = fetcher.fetch(symbols, '2020-01-01', '2020-02-01', '1D')
+        self.assertEqual(list(data), symbols)
+        self.assertEqual(list(data['S0'].columns), ['Open', 'High', 'Low', 'Close', 'Volume'])
+        self.assertEqual(data['S0'].index.name, 'Date')
+        self.assertEqual(len(data['S0']), 5)
+        self.assertGreater(self.server.max_active, 1)
+        self.assertLessEqual(self.server.max_active, 4)
+        self.assertEqual(fetcher.stats['S3']['rows'], 5)
+
+    def test_concurrent_callers_keep_their_stats(self):
+        fetcher = YahooFetcher(max_workers=2, rate_limit=None, base_url=self.base_url)
+        batches = [[f"T{i}{j}" for j in range(3)] for i in range(4)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda symbols: fetcher.fetch(symbols, '2020-01-01', '2020-02-01', '1D'), batches))
+        self.assertEqual(sorted(fetcher.stats), sorted(s for symbols in batches for s in symbols))
+        self.assertTrue(all(stat['rows'] == 5 for stat in fetcher.stats.values()))
+        # 之后的调用只更新自己的代码
+        fetcher.fetch(['T00', 'MISSING'], '2020-01-01', '2020-02-01', '1D')
+        self.assertEqual(len(fetcher.stats), 13)
+        self.assertEqual(fetcher.stats['MISSING']['error'], 'HTTP 404')
+
+    def test_retries_and_failures(self):
+        fetcher = YahooFetcher(max_workers=3, rate_limit=None, backoff=0.01, base_url=self.base_url)
+        data = fetcher.fetch(['AAPL', 'FLAKY', 'MISSING'], None, None, '1D')
+        self.assertEqual(sorted(data), ['AAPL', 'FLAKY'])
+        self.assertEqual(fetcher.stats['FLAKY']['attempts'], 3)
+        self.assertIsNone(fetcher.stats['FLAKY']['error'])
+        # 404 不重试
+        self.assertEqual(fetcher.stats['MISSING']['attempts'], 1)
+        self.assertEqual(fetcher.stats['MISSING']['error'], 'HTTP 404')
+
+    def test_retries_exhausted(self):
+        fetcher = YahooFetcher(rate_limit=None, max_retries=1, backoff=0.01, base_url=self.base_url)
+        self.assertEqual(fetcher.fetch(['FLAKY'], None, None, '1D'), {})
+        self.assertEqual(fetcher.stats['FLAKY']['attempts'], 2)
+        self.assertEqual(fetcher.stats['FLAKY']['error'], 'HTTP 503')
+
+    def test_rate_limit(self):
+        self.server.delay = 0
+        fetcher = YahooFetcher(max_workers=8, rate_limit=20, burst=1, base_url=self.base_url)
+        started = time.perf_counter()
+        fetcher.fetch([f"S{i}" for i in range(6)], None, None, '1D')
+        # 第一个令牌立即可用，之后每 50ms 一个
+        self.assertGreaterEqual(time.perf_counter() - started, 0.24)
+
+    def test_token_bucket_burst(self):
+        bucket = TokenBucket(rate=1000, capacity=5)
+        started = time.perf_counter()
+        for _ in range(5):
+            bucket.acquire()
+        self.assertLess(time.perf_counter() - started, 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from src.data_processor import YahooProcessor, resample_bars, bucket_start, Resampler
+from src.storage import PartitionedStore
+from src.catalog import DataCatalog
+
+
+def minute_bars(start, periods, freq='5min', tz='Europe/London', seed=0):
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.001, periods))
+    return pd.DataFrame({
+        'date': pd.date_range(start, periods=periods, freq=freq, tz=tz),
+        'open': close + rng.normal(0, 0.0005, periods), 'high': close + 0.002, 'low': close - 0.002,
+        'close': close, 'volume': rng.integers(0, 100, periods), 'symbol': 'EURUSD=X',
+    })
+
+
+def pandas_resample(df, rule):
+    agg = df.set_index('date').resample(rule).agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last',
+                                                   'volume': 'sum'})
+    return agg.dropna(subset=['open'])
+
+
+def history(periods, start='2024-01-02', tz='America/New_York', index_name='Date', price=100.0):
+    # yfinance Ticker.history 的格式：日期索引，首字母大写的列名
+    index = pd.date_range(start, periods=periods, freq='D', tz=tz, name=index_name)
+    prices = price + np.arange(periods) * 0.25
+    return pd.DataFrame({'Open': prices, 'High': prices + 1, 'Low': prices - 1, 'Close': prices + 0.5,
+                         'Volume': np.arange(periods) * 100.0, 'Dividends': 0.0}, index=index)
+
+
+class TestYahooProcessor(unittest.TestCase):
+    def test_long_format_and_dtypes(self):
+        data = {'AAPL': history(5), 'MSFT': history(3, price=300.0)}
+        df = YahooProcessor().process(data, 'STOCK')
+        self.assertEqual(list(df.columns), ['date', 'open', 'high', 'low', 'close', 'volume', 'symbol'])
+        self.assertEqual(len(df), 8)
+        self.assertEqual(df['symbol'].dtype, 'category')
+        self.assertEqual(list(df['symbol'].cat.categories), ['AAPL', 'MSFT'])
+        self.assertEqual(df['symbol'].tolist(), ['AAPL'] * 5 + ['MSFT'] * 3)
+        # 0.25 步长的价格可以无损表示为 float32，成交量是整数
+        self.assertEqual(df['close'].dtype, np.float32)
+        self.assertEqual(df['volume'].dtype, np.int64)
+        self.assertEqual(df['date'].iloc[5], pd.Timestamp('2024-01-02', tz='America/New_York'))
+        np.testing.assert_array_equal(df['open'].iloc[5:], [300.0, 300.25, 300.5])
+
+    def test_keeps_float64_when_float32_is_lossy(self):
+        raw = history(4)
+        raw['Close'] = [1.123456789, 2.2, 3.3, 4.4]
+        raw.loc[raw.index[1], 'Volume'] = np.nan
+        df = YahooProcessor().process({'EURUSD=X': raw}, 'FOREX')
+        self.assertEqual(df['close'].dtype, np.float64)
+        self.assertEqual(df['open'].dtype, np.float32)
+        self.assertEqual(df['close'].iloc[0], 1.123456789)
+        self.assertEqual(df['volume'].dtype, np.float64)
+
+    def test_bond_yield(self):
+        with_yield = history(3)
+        with_yield['Yield'] = [4.1, 4.2, 4.3]
+        df = YahooProcessor().process({'^IRX': history(3), '^TNX': with_yield}, 'BOND')
+        expected = (df['close'].iloc[:3].astype(float) - df['open'].iloc[:3].astype(float)) / \
+            df['open'].iloc[:3].astype(float) * 100
+        np.testing.assert_allclose(df['yield'].iloc[:3], expected)
+        np.testing.assert_allclose(df['yield'].iloc[3:], [4.1, 4.2, 4.3])
+
+    def test_skips_invalid_symbols_and_mixed_timezones(self):
+        intraday = history(2, tz='Europe/London', index_name='Datetime')
+        no_volume = history(2).drop(columns='Volume')
+        no_date = history(2).reset_index(drop=True)
+        df = YahooProcessor().process({'A': history(2), 'B': intraday, 'C': no_volume, 'D': no_date}, 'STOCK')
+        self.assertEqual(list(df['symbol'].cat.categories), ['A', 'B'])
+        self.assertEqual(str(df['date'].dt.tz), 'UTC')
+        self.assertEqual(df['date'].iloc[0], pd.Timestamp('2024-01-02 05:00', tz='UTC'))
+        self.assertTrue(YahooProcessor().process({}, 'STOCK').empty)
+
+
+class TestResampleBars(unittest.TestCase):
+    def test_matches_pandas_resample(self):
+        df = minute_bars('2024-03-01 00:00', 3000)
+        # 去掉一段，模拟周末或缺失的 K 线
+        df = df.drop(index=range(500, 800)).reset_index(drop=True)
+        for interval, rule in [('15MIN', '15min'), ('1H', '1h'), ('4H', '4h'), ('1D', '1D')]:
+            ours = resample_bars(df, interval).set_index('date')
+            expected = pandas_resample(df, rule)
+            self.assertEqual(len(ours), len(expected), interval)
+            np.testing.assert_array_equal(ours.index, expected.index)
+            for col in ['open', 'high', 'low', 'close', 'volume']:
+                np.testing.assert_allclose(ours[col].to_numpy(float), expected[col].to_numpy(float))
+        self.assertEqual(resample_bars(df, '1H')['symbol'].unique().tolist(), ['EURUSD=X'])
+
+    def test_daily_buckets_use_local_midnight(self):
+        df = minute_bars('2024-01-02 00:00', 48, freq='1h', tz='America/New_York')
+        daily = resample_bars(df, '1D')
+        self.assertEqual(daily['date'].tolist(), [pd.Timestamp('2024-01-02', tz='America/New_York'),
+                                                  pd.Timestamp('2024-01-03', tz='America/New_York')])
+        # 日内周期按 UTC 对齐：17:40 EST 即 22:40 UTC，所在 4H 桶从 20:00 UTC 开始
+        self.assertEqual(bucket_start(pd.Series([pd.Timestamp('2024-01-02 17:40', tz='America/New_York')]),
+                                      '4H').iloc[0], pd.Timestamp('2024-01-02 15:00', tz='America/New_York'))
+
+    def test_dst_transitions(self):
+        for day in ['2023-11-05', '2023-03-12']:
+            df = minute_bars(f'{day} 00:00', 288, tz='America/New_York')
+            for interval, rule in [('15MIN', '15min'), ('1H', '1h')]:
+                ours = resample_bars(df, interval).set_index('date')
+                expected = pandas_resample(df, rule)
+                np.testing.assert_array_equal(ours.index, expected.index)
+                np.testing.assert_array_equal(ours['volume'].to_numpy(), expected['volume'].to_numpy())
+            # 本地零点开始的一天在夏令时结束时是 25 小时，开始时是 23 小时
+            daily = resample_bars(df, '1D')
+            self.assertEqual(daily['date'].iloc[0], pd.Timestamp(day, tz='America/New_York'))
+        # 夏令时结束当天两个本地 01 点各是一根 1H K 线
+        hourly = resample_bars(minute_bars('2023-11-05 00:00', 48, tz='America/New_York'), '1H')
+        self.assertEqual(len(hourly), 4)
+        self.assertEqual([str(ts) for ts in hourly['date']],
+                         ['2023-11-05 00:00:00-04:00', '2023-11-05 01:00:00-04:00',
+                          '2023-11-05 01:00:00-05:00', '2023-11-05 02:00:00-05:00'])
+
+
+class TestResampler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PartitionedStore(self.tmp.name)
+        self.key = ('FOREX', 'EURUSD', '5MIN', 'OHLCV')
+        self.data = minute_bars('2024-03-01 00:00', 2000)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_builds_and_updates_incrementally(self):
+        self.store.write(*self.key, self.data.iloc[:1500])
+        catalog = DataCatalog(self.tmp.name)
+        resampler = Resampler(self.store, catalog)
+        self.assertEqual(sorted(resampler.update(*self.key)), ['15MIN', '1D', '1H', '4H'])
+        self.assertEqual(catalog.find('FOREX', 'EURUSD', '1H', 'OHLCV')[0]['rows'],
+                         len(pandas_resample(self.data.iloc[:1500], '1h')))
+
+        # 新的细粒度数据到达（与上次末尾有重叠），只重算受影响的桶
+        new = self.data.iloc[1400:].copy()
+        new['close'] += 0.01
+        self.store.write(*self.key, new)
+        resampler.update(*self.key, since=new['date'].min())
+        merged = pd.concat([self.data.iloc[:1400], new], ignore_index=True)
+        hourly = self.store.read('FOREX', 'EURUSD', '1H', 'OHLCV').set_index('date')
+        expected = pandas_resample(merged, '1h')
+        np.testing.assert_array_equal(hourly.index, expected.index)
+        np.testing.assert_allclose(hourly['close'], expected['close'])
+        np.testing.assert_allclose(hourly['volume'], expected['volume'])
+        self.assertEqual(self.store.meta('FOREX', 'EURUSD', '1H', 'OHLCV'), {'derived_from': '5MIN'})
+
+    def test_does_not_overwrite_fetched_interval(self):
+        self.store.write(*self.key, self.data)
+        self.store.write('FOREX', 'EURUSD', '1D', 'OHLCV', pandas_resample(self.data, '1D').reset_index())
+        self.assertNotIn('1D', Resampler(self.store).targets(*self.key))
+        self.assertEqual(Resampler(self.store).targets('FOREX', 'EURUSD', '4H', 'OHLCV'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
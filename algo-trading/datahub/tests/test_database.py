@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+import pandas as pd
+from src.database import Database, load_to_database
+from helpers import bars
+
+
+class TestDatabase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = Database(data_dir=self.tmp.name)
+        self.db.create_table('stocks')
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_insert_and_fetch_range(self):
+        self.db.insert_data('stocks', pd.concat([bars('2020-01-01', 100), bars('2020-01-01', 100, 'MSFT')]))
+        df = self.db.fetch_data('stocks', 'AAPL', '2020-02-01', '2020-02-10')
+        self.assertEqual(len(df), 9)
+        self.assertTrue(df['date'].is_monotonic_increasing)
+        self.assertEqual(df['date'].iloc[0], pd.Timestamp('2020-02-01', tz='America/New_York'))
+        self.assertEqual(df['volume'].iloc[0], 100)
+        self.assertEqual(set(df['symbol']), {'AAPL'})
+        self.assertEqual(len(self.db.fetch_data('stocks', 'MSFT', None, None)), 100)
+
+    def test_reload_upserts(self):
+        self.db.insert_data('stocks', bars('2020-01-01', 10))
+        # 重复加载（部分重叠且价格变化）不会因主键冲突失败
+        self.db.insert_data('stocks', bars('2020-01-05', 10, close=2.0))
+        df = self.db.fetch_data('stocks', 'AAPL', None, None)
+        self.assertEqual(len(df), 14)
+        self.assertEqual(df['close'].tolist(), [1.0] * 4 + [2.0] * 10)
+
+    def test_query_uses_primary_key(self):
+        plan = self.db.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT date, open, high, low, close, volume, symbol FROM stocks "
+            "WHERE symbol = ? AND date BETWEEN ? AND ? ORDER BY date", ('AAPL', 0, 1)).fetchall()
+        detail = ' '.join(row[-1] for row in plan)
+        self.assertIn('PRIMARY KEY', detail)
+        self.assertNotIn('TEMP B-TREE', detail)
+        self.assertEqual(self.db.conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+
+    def test_invalid_table_name(self):
+        with self.assertRaises(ValueError):
+            self.db.fetch_data('stocks; DROP TABLE stocks', 'AAPL', None, None)
+
+    def test_migrates_text_dates(self):
+        conn = sqlite3.connect(os.path.join(self.tmp.name, 'market_data.db'))
+        conn.execute('CREATE TABLE bonds (date TEXT, open REAL, high REAL, low REAL, close REAL, volume INTEGER, '
+                     'symbol TEXT, PRIMARY KEY (date, symbol))')
+        conn.execute("INSERT INTO bonds VALUES ('2020-01-02 00:00:00-05:00', 1, 1, 1, 1, 5, 'IRX')")
+        conn.commit()
+        conn.close()
+        self.db.create_table('bonds')
+        df = self.db.fetch_data('bonds', 'IRX', None, None)
+        self.assertEqual(df['date'].iloc[0], pd.Timestamp('2020-01-02', tz='America/New_York'))
+
+    def legacy_bonds(self, *dates):
+        conn = sqlite3.connect(os.path.join(self.tmp.name, 'market_data.db'))
+        conn.execute('CREATE TABLE bonds (date TEXT, open REAL, high REAL, low REAL, close REAL, volume INTEGER, '
+                     'symbol TEXT, PRIMARY KEY (date, symbol))')
+        conn.executemany("INSERT INTO bonds VALUES (?, 1, 1, 1, 1, 5, 'IRX')", [(d,) for d in dates])
+        conn.commit()
+        conn.close()
+
+    def test_migration_skips_unparsable_dates(self):
+        self.legacy_bonds('2020-01-02 00:00:00-05:00', 'bad', '2020-01-03 00:00:00-05:00')
+        with self.assertLogs('src.database', level='WARNING'):
+            self.db.create_table('bonds')
+        self.assertEqual(len(self.db.fetch_data('bonds', 'IRX', None, None)), 2)
+        self.assertFalse(self.db.has_table('bonds_legacy'))
+
+    def test_failed_migration_leaves_table_untouched(self):
+        self.legacy_bonds('2020-01-02 00:00:00-05:00')
+        conn = self.db.conn
+
+        class FailingDrop:
+            # 在最后一步失败：此前的 RENAME、CREATE 和复制都必须回滚
+            def execute(self, sql, *args):
+                if sql.startswith('DROP'):
+                    raise sqlite3.OperationalError('disk I/O error')
+                return conn.execute(sql, *args)
+
+            def __enter__(self):
+                return conn.__enter__()
+
+            def __exit__(self, *exc):
+                return conn.__exit__(*exc)
+
+        self.db.conn = FailingDrop()
+        with self.assertRaises(sqlite3.OperationalError):
+            self.db._migrate_text_dates('bonds')
+        self.db.conn = conn
+        columns = {name: col_type for _, name, col_type, *_ in conn.execute('PRAGMA table_info(bonds)')}
+        self.assertEqual(columns['date'], 'TEXT')
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM bonds').fetchone()[0], 1)
+        self.assertFalse(self.db.has_table('bonds_legacy'))
+
+    def test_resumes_interrupted_migration(self):
+        # 旧版本的迁移：RENAME 已提交、新表已建，复制失败
+        self.legacy_bonds('2020-01-02 00:00:00-05:00')
+        self.db.conn.execute('ALTER TABLE bonds RENAME TO bonds_legacy')
+        self.db.conn.commit()
+        self.db._create('bonds')
+        self.db.create_table('bonds')
+        self.assertEqual(len(self.db.fetch_data('bonds', 'IRX', None, None)), 1)
+        self.assertFalse(self.db.has_table('bonds_legacy'))
+
+    def test_load_to_database(self):
+        processed = os.path.join(self.tmp.name, 'processed', 'stocks')
+        os.makedirs(processed)
+        for symbol in ['AAPL', 'MSFT', 'GOOG']:
+            bars('2020-01-01', 50, symbol).drop(columns='symbol').to_parquet(
+                os.path.join(processed, f'{symbol}_1D.parquet'), index=False)
+        self.assertEqual(load_to_database('stocks', data_dir=self.tmp.name, n_readers=2), 150)
+        # 再次加载是幂等的
+        load_to_database('stocks', data_dir=self.tmp.name)
+        self.assertEqual(len(self.db.fetch_data('stocks', 'GOOG', None, None)), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+import main
+from src.storage import snapshot_is_current
+
+
+class UniverseFetcher:
+    """Serves yfinance-shaped daily history for any symbol; unknown symbols return nothing."""
+
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def fetch(self, symbols, start_date, end_date, interval):
+        with self.lock:
+            self.calls.append((symbols[0], start_date))
+        if symbols[0] in self.missing:
+            return {}
+        index = pd.bdate_range(end=pd.Timestamp.now().normalize() - pd.Timedelta(days=1), periods=300,
+                               tz='America/New_York', name='Date')
+        if start_date is not None:
+            index = index[index >= pd.Timestamp(start_date, tz='America/New_York')]
+        prices = 100 + np.arange(len(index), dtype=float)
+        return {symbols[0]: pd.DataFrame({'Open': prices, 'High': prices, 'Low': prices, 'Close': prices,
+                                          'Volume': 1000.0}, index=index)}
+
+
+class TestRefresh(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(main, 'DATA_DIR', self.tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.watchlist = os.path.join(self.tmp.name, 'watchlist.txt')
+        with open(self.watchlist, 'w') as f:
+            f.write("# 美股\nAAPL, msft\nGOOG NONE\n\nAAPL\n")
+        self.report = os.path.join(self.tmp.name, 'report.jsonl')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_report(self):
+        with open(self.report) as f:
+            return [json.loads(line) for line in f]
+
+    def test_load_watchlist(self):
+        self.assertEqual(main.load_watchlist(self.watchlist), ['AAPL', 'MSFT', 'GOOG', 'NONE'])
+        path = os.path.join(self.tmp.name, 'watchlist.json')
+        with open(path, 'w') as f:
+            json.dump({'symbols': ['btc-usd', '^IRX']}, f)
+        self.assertEqual(main.load_watchlist(path), ['BTC-USD', '^IRX'])
+
+    def test_refresh_reports_each_symbol(self):
+        fetcher = UniverseFetcher(missing={'NONE'})
+        main.run_refresh(self.watchlist, workers=3, report=self.report, fetcher=fetcher)
+        records = self.read_report()
+        by_symbol = {r['symbol']: r for r in records[:-1]}
+        self.assertEqual(list(by_symbol), ['AAPL', 'MSFT', 'GOOG', 'NONE'])
+        self.assertEqual(by_symbol['NONE']['status'], 'failed')
+        for symbol in ['AAPL', 'MSFT', 'GOOG']:
+            record = by_symbol[symbol]
+            self.assertEqual(record['status'], 'ok')
+            self.assertEqual(record['rows'], 300)
+            self.assertGreater(record['bytes_written'], 0)
+            self.assertGreater(record['fetch_s'] + record['process_s'] + record['write_s'], 0)
+        summary = records[-1]
+        self.assertEqual(summary['event'], 'run')
+        self.assertEqual(summary['ok'], 3)
+        self.assertEqual(summary['bytes_written'], sum(r['bytes_written'] for r in records[:-1]))
+        # 并行写入后索引包含全部数据集及其派生周期
+        catalog = main.DataCatalog(self.tmp.name)
+        self.assertEqual(len(catalog.find('STOCK', 'MSFT', '1D', 'OHLCV')), 1)
+        self.assertEqual(len(catalog.find('STOCK', 'GOOG', '1D', 'OHLCV')), 1)
+        # 更新后发布了 mmap 快照
+        self.assertTrue(snapshot_is_current(os.path.join(self.tmp.name, 'STOCK_GOOG_1D_OHLCV')))
+
+    def test_scheduled_runs_are_incremental(self):
+        fetcher = UniverseFetcher(missing={'NONE'})
+        main.run_refresh(self.watchlist, workers=2, every=pd.Timedelta(0), runs=2, report=self.report,
+                         fetcher=fetcher)
+        records = self.read_report()
+        self.assertEqual([r.get('event') for r in records].count('run'), 2)
+        second = [r for r in records[5:-1] if r['status'] == 'ok']
+        # 第二轮只从最后日期前一天开始获取
+        self.assertEqual(len(second), 3)
+        self.assertTrue(all(r['rows'] < 300 for r in second))
+        incremental = [start for symbol, start in fetcher.calls if symbol == 'AAPL']
+        self.assertIsNone(incremental[0])
+        self.assertIsNotNone(incremental[-1])
+
+
+class TestLegacyImport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(main, 'DATA_DIR', self.tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_import_file_that_is_already_current(self):
+        # 旧格式的单个文件已经包含今天的数据：导入后不需要获取，但索引必须指向新数据集
+        dates = pd.date_range(end=pd.Timestamp(main.datetime.now().date()), periods=30, freq='D', tz='America/New_York')
+        legacy = pd.DataFrame({'date': dates, 'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0,
+                               'volume': 100.0, 'symbol': 'AAPL'})
+        path = os.path.join(self.tmp.name, 'STOCK_AAPL_1D_OHLCV_20200101_20200301.parquet')
+        legacy.to_parquet(path, index=False)
+        catalog = main.DataCatalog(self.tmp.name)
+        catalog.register(path)
+        fetcher = UniverseFetcher()
+
+        dataset = main.update_data('AAPL', 'STOCK', '1D', 'OHLCV', path, catalog, fetcher=fetcher)
+        self.assertEqual(fetcher.calls, [])
+        self.assertFalse(os.path.exists(path))
+        entries = main.DataCatalog(self.tmp.name).find('STOCK', 'AAPL', '1D', 'OHLCV')
+        self.assertEqual(len(entries), 1)
+        self.assertTrue(entries[0]['partitioned'])
+        self.assertEqual(entries[0]['rows'], 30)
+        self.assertEqual(main.find_existing_file('AAPL', 'STOCK', '1D', 'OHLCV', catalog), dataset)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.storage import PartitionedStore, read_manifest, snapshot_is_current
+from src.catalog import DataCatalog
+from helpers import bars
+
+
+class TestPartitionedStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PartitionedStore(self.tmp.name)
+        self.key = ('STOCK', 'AAPL', '1D', 'OHLCV')
+        self.path = self.store.write(*self.key, bars('2022-12-01', 60))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fragments(self):
+        return read_manifest(self.path)['fragments']
+
+    def test_partitions_by_year(self):
+        self.assertEqual([f['year'] for f in self.fragments()], [2022, 2023])
+        self.assertEqual(sum(f['rows'] for f in self.fragments()), 60)
+        self.assertEqual(self.store.last_timestamp(*self.key), bars('2022-12-01', 60)['date'].iloc[-1])
+
+    def test_incremental_update_leaves_history_untouched(self):
+        before = {f['file']: os.path.getmtime(os.path.join(self.path, f['file'])) for f in self.fragments()}
+        # 最后一天重新获取（收盘价变了），再追加 5 天
+        self.store.write(*self.key, bars('2023-01-29', 6, close=2.0))
+        files = [f['file'] for f in self.fragments()]
+        # 2022 分区原样保留，2023 分区被裁掉重叠的部分再写一个新碎片
+        self.assertIn(files[0], before)
+        self.assertEqual(os.path.getmtime(os.path.join(self.path, files[0])), before[files[0]])
+        self.assertEqual(len(files), 3)
+        self.assertTrue(all(os.path.exists(os.path.join(self.path, f)) for f in files))
+        self.assertFalse(any(os.path.exists(os.path.join(self.path, f)) for f in before if f not in files))
+
+        df = self.store.read(*self.key)
+        self.assertEqual(len(df), 65)
+        self.assertTrue(df['date'].is_monotonic_increasing)
+        self.assertEqual(df.loc[df['date'] >= '2023-01-29', 'close'].tolist(), [2.0] * 6)
+        self.assertEqual(df.loc[df['date'] < '2023-01-29', 'close'].unique().tolist(), [1.0])
+
+    def test_backfill_inside_history(self):
+        self.store.write(*self.key, bars('2023-01-10', 3, close=3.0))
+        df = self.store.read(*self.key)
+        self.assertEqual(len(df), 60)
+        self.assertTrue(df['date'].is_monotonic_increasing)
+        self.assertEqual(df['close'].tolist().count(3.0), 3)
+        starts = [pd.Timestamp(f['start']) for f in self.fragments()]
+        ends = [pd.Timestamp(f['end']) for f in self.fragments()]
+        self.assertTrue(all(e < s for e, s in zip(ends[:-1], starts[1:])))
+
+    def test_range_read(self):
+        df = self.store.read(*self.key, start='2023-01-05', end='2023-01-07')
+        self.assertEqual(len(df), 3)
+        self.assertEqual(df['date'].iloc[0].date(), pd.Timestamp('2023-01-05').date())
+
+    def compact_bars(self, start, periods, close=1.0):
+        # YahooProcessor 输出的紧凑类型
+        df = bars(start, periods, close=close)
+        df[['open', 'high', 'low', 'close']] = df[['open', 'high', 'low', 'close']].astype(np.float32)
+        df['volume'] = df['volume'].astype(np.int64)
+        df['symbol'] = df['symbol'].astype('category')
+        return df
+
+    def test_compact_schema_kept_per_dataset(self):
+        key = ('STOCK', 'MSFT', '1D', 'OHLCV')
+        path = self.store.write(*key, self.compact_bars('2022-12-01', 60))
+        self.assertEqual(read_manifest(path)['schema'],
+                         {'open': 'float32', 'high': 'float32', 'low': 'float32', 'close': 'float32',
+                          'volume': 'int64', 'symbol': 'category'})
+        # 之后按 float64 到达的批次转换成数据集的类型
+        self.store.write(*key, bars('2023-01-30', 3, 'MSFT', close=2.0))
+        fragments = read_manifest(path)['fragments']
+        schemas = [pq.read_schema(os.path.join(path, f['file'])).remove_metadata() for f in fragments]
+        self.assertEqual(len(schemas), 3)
+        self.assertTrue(all(schema.equals(schemas[0]) for schema in schemas))
+        self.assertEqual(schemas[0].field('close').type, pa.float32())
+        self.assertEqual(schemas[0].field('volume').type, pa.int64())
+        self.assertTrue(pa.types.is_dictionary(schemas[0].field('symbol').type))
+
+    def test_lossy_batch_widens_schema(self):
+        key = ('STOCK', 'MSFT', '1D', 'OHLCV')
+        path = self.store.write(*key, self.compact_bars('2022-12-01', 60))
+        self.store.publish(*key)
+        update = bars('2023-01-30', 3, 'MSFT', close=[0.1, 0.2, 0.3])
+        update['volume'] = [100.0, np.nan, 100.0]
+        self.store.write(*key, update)
+        schema = read_manifest(path)['schema']
+        self.assertEqual((schema['close'], schema['volume']), ('float64', 'float64'))
+        df = self.store.read(*key, start='2023-01-30')
+        self.assertEqual(df['close'].tolist(), [0.1, 0.2, 0.3])
+        self.assertTrue(np.isnan(df['volume'].iloc[1]))
+        # 重新发布后所有年份的快照使用同一个 schema
+        self.store.publish(*key)
+        manifest = read_manifest(path)
+        schemas = []
+        for entry in manifest['snapshots']:
+            with pa.memory_map(os.path.join(path, entry['file'])) as source:
+                schemas.append(pa.ipc.open_file(source).schema.remove_metadata())
+        self.assertEqual(len(schemas), 2)
+        self.assertTrue(schemas[0].equals(schemas[1]))
+        self.assertEqual(schemas[0].field('close').type, pa.float64())
+        files = {e['file'] for e in manifest['snapshots']}
+        on_disk = {f"year={y}/{name}" for y in (2022, 2023) for name in os.listdir(os.path.join(path, f'year={y}'))
+                   if name.endswith('.arrow')}
+        self.assertEqual(on_disk, files)
+
+    def test_compaction(self):
+        for i in range(4):
+            self.store.write(*self.key, bars(pd.Timestamp('2023-01-30') + pd.Timedelta(days=i), 1))
+        self.assertEqual(len(self.fragments()), 6)
+        self.assertEqual(self.store.compact(*self.key), 5)
+        self.assertEqual([f['year'] for f in self.fragments()], [2022, 2023])
+        self.assertEqual(len(self.store.read(*self.key)), 64)
+        self.assertEqual(len(os.listdir(os.path.join(self.path, 'year=2023'))), 1)
+
+    def test_automatic_compaction(self):
+        store = PartitionedStore(self.tmp.name, compact_threshold=3)
+        for i in range(4):
+            store.write(*self.key, bars(pd.Timestamp('2023-01-30') + pd.Timedelta(days=i), 1))
+        self.assertLessEqual(len([f for f in self.fragments() if f['year'] == 2023]), 3)
+        self.assertEqual(len(store.read(*self.key)), 64)
+
+    def test_catalog_registers_dataset(self):
+        catalog = DataCatalog(self.tmp.name)
+        entry = catalog.find(*self.key)[0]
+        self.assertTrue(entry['partitioned'])
+        self.assertEqual(entry['file'], 'STOCK_AAPL_1D_OHLCV')
+        self.assertEqual(entry['rows'], 60)
+        self.store.write(*self.key, bars('2023-01-30', 5))
+        catalog.refresh()
+        self.assertEqual(catalog.find(*self.key)[0]['rows'], 65)
+
+    def snapshots(self):
+        return {s['year']: s for s in read_manifest(self.path)['snapshots']}
+
+    def test_publish_snapshot(self):
+        self.store.publish(*self.key)
+        self.assertTrue(snapshot_is_current(self.path))
+        snapshots = self.snapshots()
+        self.assertEqual(sorted(snapshots), [2022, 2023])
+        with pa.memory_map(os.path.join(self.path, snapshots[2023]['file'])) as source:
+            table = pa.ipc.open_file(source).read_all()
+        self.assertEqual(table.num_rows, 29)
+        self.assertEqual(table.column('date').num_chunks, 1)
+        self.assertEqual(table.column_names, ['date', 'open', 'high', 'low', 'close', 'volume'])
+        # 之后的写入使快照过期，直到重新发布
+        self.store.write(*self.key, bars('2023-01-30', 5))
+        self.assertFalse(snapshot_is_current(self.path))
+        self.store.publish(*self.key)
+        self.assertTrue(snapshot_is_current(self.path))
+        # 只重写变化的年度分区，旧快照文件被删除
+        republished = self.snapshots()
+        self.assertEqual(republished[2022], snapshots[2022])
+        self.assertNotEqual(republished[2023]['file'], snapshots[2023]['file'])
+        self.assertEqual(republished[2023]['rows'], 34)
+        self.assertFalse(os.path.exists(os.path.join(self.path, snapshots[2023]['file'])))
+        # 数据没有变化时不重写任何文件
+        written = self.store.bytes_written
+        self.store.publish(*self.key)
+        self.assertEqual(self.store.bytes_written, written)
+        self.assertEqual(self.snapshots(), republished)
+        # 合并碎片不改变数据，快照改为指向合并后的碎片
+        self.store.compact(*self.key)
+        self.assertTrue(snapshot_is_current(self.path))
+        self.assertEqual(self.snapshots()[2023]['file'], republished[2023]['file'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from src.synthetic import generate_bars, trading_index, write_files, ChartServer
+from src.data_fetcher import YahooFetcher
+from src.catalog import DataCatalog
+from src.storage import snapshot_is_current
+from src.symbols import determine_asset_type
+
+
+class TestGenerator(unittest.TestCase):
+    def test_deterministic_per_seed_and_symbol(self):
+        a = generate_bars('AAPL', '1D', '2020-01-01', '2020-12-31', seed=1)
+        pd.testing.assert_frame_equal(a, generate_bars('AAPL', '1D', '2020-01-01', '2020-12-31', seed=1))
+        self.assertFalse(np.allclose(a['Close'], generate_bars('MSFT', '1D', '2020-01-01', '2020-12-31', seed=1)['Close']))
+        self.assertFalse(np.allclose(a['Close'], generate_bars('AAPL', '1D', '2020-01-01', '2020-12-31', seed=2)['Close']))
+
+    def test_bars_are_consistent(self):
+        bars = generate_bars('BTC-USD', '1H', '2020-01-01', '2020-03-01', 'CRYPTO', volatility=0.8,
+                             jump_intensity=50, jump_std=0.1)
+        self.assertTrue((bars['High'] >= bars[['Open', 'Close']].max(axis=1)).all())
+        self.assertTrue((bars['Low'] <= bars[['Open', 'Close']].min(axis=1)).all())
+        self.assertTrue((bars['Low'] > 0).all())
+        self.assertEqual(len(bars), 60 * 24 + 1)
+
+    def test_calendars(self):
+        daily = trading_index('2024-01-01', '2024-01-31', '1D', 'STOCK')
+        self.assertEqual(len(daily), 23)
+        self.assertTrue((daily.weekday < 5).all())
+        intraday = trading_index('2024-01-01', '2024-01-07 23:59', '5MIN', 'STOCK')
+        self.assertEqual(len(intraday), 5 * 78)
+        forex = trading_index('2024-01-01', '2024-01-08', '1H', 'FOREX')
+        # 周一 0 点到周五 17 点，再加周日 17 点之后的 7 个小时
+        self.assertEqual(len(forex), 4 * 24 + 17 + 7 + 1)
+
+
+class TestWriteFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_file_layout(self):
+        paths = write_files(['AAPL', 'MSFT'], '1D', '2020-01-01', '2020-12-31', data_dir=self.tmp.name, seed=3)
+        self.assertEqual(os.path.basename(paths[0]), 'STOCK_AAPL_1D_OHLCV_20200101_20201231.parquet')
+        df = pd.read_parquet(paths[0])
+        self.assertEqual(list(df.columns), ['date', 'open', 'high', 'low', 'close', 'volume', 'symbol'])
+        self.assertEqual(len(df), 262)
+        entry = DataCatalog(self.tmp.name).find('STOCK', 'MSFT', '1D', 'OHLCV')[0]
+        self.assertEqual(entry['rows'], 262)
+
+    def test_partitioned(self):
+        path = write_files(['EURUSD=X'], '1H', '2023-06-01', '2024-06-01', asset_type='FOREX',
+                           data_dir=self.tmp.name, partitioned=True)[0]
+        self.assertEqual(os.path.basename(path), 'FOREX_EURUSDX_1H_OHLCV')
+        self.assertTrue(snapshot_is_current(path))
+        self.assertTrue(DataCatalog(self.tmp.name).find('FOREX', 'EURUSDX', '1H', 'OHLCV')[0]['partitioned'])
+
+
+class TestChartServer(unittest.TestCase):
+    def setUp(self):
+        self.server = ChartServer(seed=5, end='2024-06-28 21:00').start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_fetcher_reads_synthetic_history(self):
+        fetcher = YahooFetcher(max_workers=4, rate_limit=None, base_url=self.server.base_url)
+        data = fetcher.fetch(['AAPL', 'BTC-USD', '^IRX'], '2024-01-01', '2024-02-01', '1D')
+        self.assertEqual(list(data), ['AAPL', 'BTC-USD', '^IRX'])
+        self.assertEqual(len(data['AAPL']), 23)
+        self.assertEqual(len(data['BTC-USD']), 31)
+        self.assertEqual(str(data['AAPL'].index.tz), 'America/New_York')
+        # 两次请求看到同一条路径
+        again = fetcher.fetch(['AAPL'], '2024-01-15', '2024-01-20', '1D')['AAPL']
+        pd.testing.assert_series_equal(again['Close'], data['AAPL']['Close'].loc[again.index])
+        full = fetcher.fetch(['MSFT'], None, None, '1D')['MSFT']
+        self.assertGreater(len(full), 6000)
+
+    def test_environment_hook_and_retries(self):
+        self.server.error_rate = 0.3
+        with mock.patch.dict(os.environ, {'YAHOO_BASE_URL': self.server.base_url}):
+            fetcher = YahooFetcher(max_workers=4, rate_limit=None, backoff=0.001, max_retries=10)
+        data = fetcher.fetch([f'S{i}' for i in range(20)], '2024-01-01', '2024-02-01', '1D')
+        self.assertEqual(len(data), 20)
+        self.assertGreater(self.server.requests, 20)
+
+    def test_calendar_follows_refresh_classification(self):
+        # 合成行情按更新流程的分类选择日历：CL=F 在 main 中是 FOREX，晚上也有 K 线
+        self.assertEqual(determine_asset_type('CL=F'), 'FOREX')
+        fetcher = YahooFetcher(max_workers=1, rate_limit=None, base_url=self.server.base_url)
+        bars = fetcher.fetch(['CL=F'], '2024-06-24', '2024-06-26', '5MIN')['CL=F']
+        self.assertTrue(bars.index.isin(trading_index('2024-06-23', '2024-06-27', '5MIN', 'FOREX')).all())
+        self.assertTrue((bars.index.hour >= 17).any())
+
+
+if __name__ == '__main__':
+    unittest.main()